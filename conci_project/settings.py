@@ -33,11 +33,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'main.middleware.RequestTimingMiddleware', # Server-Timing header and timing report; off unless REQUEST_TIMING_ENABLED
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'main.middleware.HotelContextMiddleware', # request.hotel / request.staff_member, cached per user
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -76,6 +78,53 @@ DATABASES = {
 }
 
 
+# Cache
+# Used for the staff dashboard's template fragments (see main/fragments.py). The local-memory
+# cache is per process; set REDIS_URL when running more than one worker so fragment
+# invalidations are seen by every worker.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'conci-default',
+        }
+    }
+# Whether every worker shares CACHES. Without it, the stamps that tell workers to reload their
+# in-memory snapshots (availability index, amenity catalog, FAQ index) are kept in the
+# database instead (see main/versions.py).
+SHARED_CACHE = bool(os.getenv('REDIS_URL'))
+
+# Seconds a cached dashboard fragment may live even if nothing invalidates it
+# (bounds staleness of time-dependent KPIs such as occupied rooms).
+DASHBOARD_FRAGMENT_CACHE_TIMEOUT = int(os.getenv('DASHBOARD_FRAGMENT_CACHE_TIMEOUT', '300'))
+
+# Default age in days after which closed guest requests move to the archive table
+# (`manage.py archive_requests`); Hotel.request_retention_days overrides it per hotel.
+GUEST_REQUEST_RETENTION_DAYS = int(os.getenv('GUEST_REQUEST_RETENTION_DAYS', '90'))
+
+# With a shared cache, sessions are read from it (written through to the database) and the
+# signed-in user's profile/hotel/staff membership is cached by
+# main.middleware.HotelContextMiddleware. A per-process cache would serve other workers'
+# logouts and profile changes stale, so without one both read the database.
+if SHARED_CACHE:
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+HOTEL_CONTEXT_CACHE_TIMEOUT = int(os.getenv('HOTEL_CONTEXT_CACHE_TIMEOUT', '3600'))
+
+# Per-request query/template/Gemini timing (main.middleware.RequestTimingMiddleware): a
+# Server-Timing header on every response, and a sample of requests kept in memory per
+# process for the admin-only report at /dashboard/timing/.
+REQUEST_TIMING_ENABLED = os.getenv('REQUEST_TIMING_ENABLED', 'False') == 'True'
+REQUEST_TIMING_SAMPLE_RATE = float(os.getenv('REQUEST_TIMING_SAMPLE_RATE', '1.0'))
+REQUEST_TIMING_BUFFER_SIZE = int(os.getenv('REQUEST_TIMING_BUFFER_SIZE', '1000'))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -1,7 +1,8 @@
 # main/admin.py
 
 from django.contrib import admin
-from .models import  Hotel, UserProfile, HotelConfiguration, Room, GuestRoomAssignment, GuestRequest, Amenity, StaffMember
+from .models import  Hotel, UserProfile, HotelConfiguration, Room, GuestRoomAssignment, GuestRequest, Amenity, StaffMember, HotelStats, ArchivedGuestRequest, AssignmentRule, Charge
+from .search import filter_requests_by_text
 
 # Register your models here.
 
@@ -51,6 +52,11 @@ class GuestRoomAssignmentAdmin(admin.ModelAdmin):
     )
     readonly_fields = ('created_at', 'updated_at', 'total_bill_amount') # total_bill_amount is calculated
 
+    def save_model(self, request, obj, form, change):
+        if 'room_number' in form.changed_data:
+            obj.room = None # Re-resolved from the new room_number on save
+        super().save_model(request, obj, form, change)
+
 @admin.register(GuestRequest)
 class GuestRequestAdmin(admin.ModelAdmin):
     list_display = ('room_number', 'raw_text', 'request_type', 'status', 'timestamp',
@@ -59,6 +65,18 @@ class GuestRequestAdmin(admin.ModelAdmin):
     search_fields = ('room_number', 'raw_text', 'staff_notes')
     date_hierarchy = 'timestamp'
     ordering = ('-timestamp',)
+
+    def get_search_results(self, request, queryset, search_term):
+        # Use the full-text index (main/search.py) instead of LIKE scans over search_fields.
+        if not search_term:
+            return queryset, False
+        return filter_requests_by_text(queryset, search_term), False
+
+    def save_model(self, request, obj, form, change):
+        if 'room_number' in form.changed_data:
+            obj.room = None # Re-resolved from the new room_number on save
+        super().save_model(request, obj, form, change)
+
     # Add fields to fieldsets for better organization in detail view
     fieldsets = (
         (None, {
@@ -99,9 +117,62 @@ class HotelConfigurationAdmin(admin.ModelAdmin):
 
 @admin.register(StaffMember)
 class StaffMemberAdmin(admin.ModelAdmin):
-    list_display = ('user', 'hotel', 'category')
-    list_filter = ('hotel', 'category')
+    list_display = ('user', 'hotel', 'category', 'accepts_auto_assignment', 'open_task_count')
+    list_filter = ('hotel', 'category', 'accepts_auto_assignment')
     search_fields = ('user__username', 'user__first_name', 'user__last_name')
     raw_id_fields = ('user',) # Allows searching for users by ID/username, useful for many users
-    list_editable = ('category',) # Allows quick category changes
+    list_editable = ('category', 'accepts_auto_assignment') # Allows quick category/shift changes
+    readonly_fields = ('open_task_count',) # Maintained by signals (main/routing.py)
+
+
+@admin.register(AssignmentRule)
+class AssignmentRuleAdmin(admin.ModelAdmin):
+    list_display = ('hotel', 'request_type', 'staff_category', 'priority', 'max_open_tasks')
+    list_filter = ('hotel', 'request_type', 'staff_category')
+    ordering = ('hotel', 'request_type', 'priority')
+
+
+
+@admin.register(HotelStats)
+class HotelStatsAdmin(admin.ModelAdmin):
+    list_display = ('hotel', 'day', 'occupied_rooms', 'reserved_rooms', 'not_ready_rooms',
+                    'check_ins_today_count', 'check_outs_today_count', 'updated_at')
+    list_filter = ('hotel',)
+    date_hierarchy = 'day'
+    readonly_fields = ('updated_at',) # Maintained by signals and reconcile_hotel_stats
+
+
+@admin.register(ArchivedGuestRequest)
+class ArchivedGuestRequestAdmin(admin.ModelAdmin):
+    list_display = ('id', 'room_number', 'raw_text', 'request_type', 'status', 'timestamp', 'archived_at')
+    list_filter = ('hotel', 'status', 'request_type')
+    date_hierarchy = 'timestamp'
+    ordering = ('-timestamp',)
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return filter_requests_by_text(queryset, search_term), False
+
+    def has_add_permission(self, request):
+        return False # Rows only arrive through `manage.py archive_requests`
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Charge)
+class ChargeAdmin(admin.ModelAdmin):
+    list_display = ('assignment', 'description', 'amount', 'guest_request_id', 'created_at')
+    list_select_related = ('assignment',)
+    date_hierarchy = 'created_at'
+    raw_id_fields = ('assignment',)
+
+    def has_add_permission(self, request):
+        return False # Rows arrive through main/billing.py, which also updates the stay's total
+
+    def has_change_permission(self, request, obj=None):
+        return False # Append-only
 
+    def has_delete_permission(self, request, obj=None):
+        return False
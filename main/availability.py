@@ -0,0 +1,192 @@
+# main/availability.py
+
+import copy
+import threading
+from datetime import timedelta
+
+import numpy as np
+
+from .models import GuestRoomAssignment, Room
+from .stats import local_day_start
+from .versions import bump_version, current_version
+
+# Per-hotel room availability answered from an in-process index instead of scanning stays.
+#
+# Every stay of a hotel is kept in one array sorted by (room, check-in), with its key packed
+# as room_position * ROOM_SHIFT + check-in seconds. A running maximum of the (equally packed)
+# check-outs then tells, for any room and instant, the latest check-out among that room's
+# stays starting before it; it never leaks across rooms because every key of a later room is
+# larger than every key of an earlier one. A [start, end) query for all rooms is therefore one
+# vectorized searchsorted, and a rooms x days occupancy matrix is one more.
+#
+# The index is cached per process and checked against a version stamp (main/versions.py: in
+# the shared cache, or the database without one). Commits in this process replace the cached
+# index with a patched copy; other processes see the new stamp and rebuild on their next query.
+
+ROOM_SHIFT = 1 << 34  # seconds, enough until the year 2514
+MAX_OCCUPANCY_DAYS = 366
+# Stays that never held the room: they neither block new bookings (the overlap rule in
+# main/bookings.py and the gra_no_room_overlap constraint skip them) nor count as occupancy.
+NON_OCCUPYING_STATUSES = ('cancelled', 'no_show')
+# Rooms that can't be offered whatever their bookings.
+UNBOOKABLE_ROOM_STATUSES = ('maintenance', 'out_of_service')
+
+_indexes = {}  # hotel_id -> (version stamp, AvailabilityIndex)
+_indexes_lock = threading.Lock()
+
+
+def _seconds(moment, ceil=False):
+    seconds = moment.timestamp()
+    return int(-(-seconds // 1)) if ceil else int(seconds // 1)
+
+
+class AvailabilityIndex:
+    """Sorted stay intervals for one hotel's rooms. Build with AvailabilityIndex.load(hotel_id)."""
+
+    def __init__(self, rooms, stays):
+        """
+        `rooms` is a list of dicts with id, room_number, room_type and status; `stays` an
+        iterable of (pk, room_id, check_in_time, check_out_time, status) tuples.
+        """
+        self.rooms = sorted(rooms, key=lambda room: room['id'])
+        self._positions = {room['id']: position for position, room in enumerate(self.rooms)}
+        self._room_positions = np.arange(len(self.rooms), dtype=np.int64)
+        rows = [self._row(*stay) for stay in stays if stay[1] in self._positions]
+        rows.sort()
+        columns = list(zip(*rows)) if rows else [(), (), (), ()]
+        self._keys = np.array(columns[0], dtype=np.int64)
+        self._ends = np.array(columns[1], dtype=np.int64)
+        self._pks = np.array(columns[2], dtype=np.int64)
+        self._occupying = np.array(columns[3], dtype=bool)
+        self._accumulate()
+
+    @classmethod
+    def load(cls, hotel_id):
+        rooms = list(Room.objects.filter(hotel_id=hotel_id).values('id', 'room_number', 'room_type', 'status'))
+        stays = GuestRoomAssignment.objects.filter(hotel_id=hotel_id, room__isnull=False).order_by().values_list(
+            'pk', 'room_id', 'check_in_time', 'check_out_time', 'status',
+        ).iterator(chunk_size=5000)
+        return cls(rooms, stays)
+
+    def _row(self, pk, room_id, check_in, check_out, status):
+        base = self._positions[room_id] * ROOM_SHIFT
+        return (base + _seconds(check_in), base + _seconds(check_out, ceil=True), pk,
+                status not in NON_OCCUPYING_STATUSES)
+
+    def _accumulate(self):
+        # Non-occupying stays contribute their room's base (an empty interval) to the occupancy maximum.
+        bases = (self._keys // ROOM_SHIFT) * ROOM_SHIFT
+        occupied_ends = np.where(self._occupying, self._ends, bases)
+        self._latest_occupied_end = np.maximum.accumulate(occupied_ends) if len(occupied_ends) else occupied_ends
+
+    def __len__(self):
+        return len(self._keys)
+
+    # --- Incremental maintenance ---
+    # Readers use a cached index outside any lock, so changes build a new index and the
+    # caller swaps it in; an index is never modified once published.
+
+    def _with_rows(self, keys, ends, pks, occupying):
+        index = copy.copy(self)  # rooms and positions are shared; they never change
+        index._keys, index._ends, index._pks, index._occupying = keys, ends, pks, occupying
+        index._accumulate()
+        return index
+
+    def without_stay(self, pk):
+        """This index without one stay (the index itself if it doesn't have it)."""
+        keep = self._pks != pk
+        if keep.all():
+            return self
+        return self._with_rows(self._keys[keep], self._ends[keep], self._pks[keep], self._occupying[keep])
+
+    def with_stay(self, pk, room_id, check_in, check_out, status):
+        """This index with one stay inserted or replaced, or None if its room isn't in the index (rebuild instead)."""
+        index = self.without_stay(pk)
+        if room_id is None:
+            return index
+        if room_id not in self._positions:
+            return None
+        key, end, pk, occupying = self._row(pk, room_id, check_in, check_out, status)
+        at = int(np.searchsorted(index._keys, key, side='right'))
+        return self._with_rows(
+            np.insert(index._keys, at, key), np.insert(index._ends, at, end),
+            np.insert(index._pks, at, pk), np.insert(index._occupying, at, occupying),
+        )
+
+    # --- Queries ---
+
+    def _overlapping(self, starts, ends, latest_end):
+        """
+        Vectorized "does room r have a stay overlapping [starts[..], ends[..])" for every room
+        position (first axis). `starts`/`ends` are seconds, broadcastable against room positions.
+        """
+        bases = self._room_positions.reshape((-1,) + (1,) * (np.ndim(starts))) * ROOM_SHIFT
+        if not len(self._keys):
+            return np.zeros(np.broadcast(bases, starts).shape, dtype=bool)
+        before = np.searchsorted(self._keys, bases + ends, side='left')
+        latest = latest_end[np.maximum(before - 1, 0)]
+        return (before > 0) & (latest > bases + starts)
+
+    def busy_rooms(self, check_in, check_out):
+        """Boolean array over self.rooms: True where an occupying stay overlaps [check_in, check_out)."""
+        return self._overlapping(
+            np.int64(_seconds(check_in)), np.int64(_seconds(check_out, ceil=True)), self._latest_occupied_end,
+        )
+
+    def free_rooms(self, check_in, check_out, room_type=None):
+        """The rooms (dicts, by id) that could be booked for [check_in, check_out)."""
+        busy = self.busy_rooms(check_in, check_out)
+        return [
+            room for room, is_busy in zip(self.rooms, busy)
+            if not is_busy and room['status'] not in UNBOOKABLE_ROOM_STATUSES
+            and (not room_type or room['room_type'] == room_type)
+        ]
+
+    def occupancy_matrix(self, first_day, days):
+        """
+        Returns (list of days, rooms x days boolean array). A room is occupied on a day if a
+        non-cancelled stay spans that night, i.e. covers the following local midnight.
+        """
+        day_list = [first_day + timedelta(days=offset) for offset in range(days)]
+        midnights = np.array([_seconds(local_day_start(day + timedelta(days=1))) for day in day_list], dtype=np.int64)
+        # A stay covers instant t if it overlaps [t, t + 1s).
+        return day_list, self._overlapping(midnights, midnights + 1, self._latest_occupied_end)
+
+
+def _version_key(hotel_id):
+    return f'availability_version:{hotel_id}'
+
+
+def availability_index(hotel_id):
+    """Returns the hotel's AvailabilityIndex, rebuilding it if another process changed its stays."""
+    version = current_version(_version_key(hotel_id))
+    with _indexes_lock:
+        cached = _indexes.get(hotel_id)
+        if cached and cached[0] == version:
+            return cached[1]
+    index = AvailabilityIndex.load(hotel_id)
+    with _indexes_lock:
+        _indexes[hotel_id] = (version, index)
+    return index
+
+
+def stay_changed(hotel_id, pk, values=None):
+    """
+    Records a committed stay save (`values` = (room_id, check_in, check_out, status)) or delete
+    (values=None): bumps the hotel's stamp and patches this process's index if it was current.
+    """
+    previous, new_version = bump_version(_version_key(hotel_id))
+    with _indexes_lock:
+        cached = _indexes.pop(hotel_id, None)
+        if not cached or previous is None or cached[0] != previous:
+            return
+        index = cached[1].with_stay(pk, *values) if values else cached[1].without_stay(pk)
+        if index is not None:
+            _indexes[hotel_id] = (new_version, index)
+
+
+def rooms_changed(hotel_id):
+    """Room rows (or many stays at once) changed: rebuild on the next query everywhere."""
+    bump_version(_version_key(hotel_id))
+    with _indexes_lock:
+        _indexes.pop(hotel_id, None)
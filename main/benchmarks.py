@@ -0,0 +1,239 @@
+# main/benchmarks.py
+
+import json
+import platform
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import timedelta
+from unittest import mock
+
+import django
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import views
+from .models import GuestRequest, GuestRoomAssignment, Room
+
+# Repeatable latency benchmarks of the dashboard pages and APIs (manage.py benchmark).
+# Each scenario is one request through the full middleware stack via the test Client, signed
+# in as a hotel admin or as an anonymous guest. After warm-up runs (which also fill the
+# fragment and hotel-context caches, so steady state is measured) every iteration is timed
+# and its queries counted; one more run under tracemalloc gives peak Python memory. Scenarios
+# that write are rolled back after each run, so the dataset stays the same, and Gemini is
+# replaced by a canned reply so only our own code is timed.
+
+BENCHMARK_ITERATIONS = 20
+WARMUP_ITERATIONS = 2
+# A scenario regresses when a latency percentile grows by more than this fraction and by at
+# least MIN_REGRESSION_MS, or when it makes more queries.
+REGRESSION_THRESHOLD = 0.2
+MIN_REGRESSION_MS = 1.0
+MIN_REGRESSION_MEMORY_KB = 64
+COMPARED_PERCENTILES = ('p50_ms', 'p90_ms')
+
+GUEST_MESSAGE = 'Please bring two towels to my room.'
+
+
+class BenchmarkError(Exception):
+    """Raised when a scenario can't run against a dataset (missing data or an error response)."""
+
+
+async def stub_gemini(prompt, available_amenities_data, hotel_facts=None):
+    """Stands in for call_gemini_api: asks for the first available amenity."""
+    name = available_amenities_data[0]['name'] if available_amenities_data else 'towel'
+    return {
+        'intent': 'amenity_request',
+        'entities': {'amenity_name': name, 'quantity': 2, 'query': prompt},
+        'conci_response': f"I'll send two {name} right away; the cost will be added to your bill.",
+    }
+
+
+def benchmark_context(hotel):
+    """The users and rows the scenarios request for `hotel`; raises BenchmarkError if it has none."""
+    admin = User.objects.filter(profile__hotel=hotel, staff_profile__isnull=True, is_active=True).order_by('pk').first()
+    latest_request = GuestRequest.objects.filter(hotel=hotel).order_by('-timestamp', '-pk').first()
+    room = Room.objects.filter(hotel=hotel).order_by('room_number').first()
+    if admin is None or latest_request is None or room is None:
+        raise BenchmarkError(f'Hotel {hotel.pk} needs an admin user (a profile without staff membership), rooms and requests.')
+    free_day = (
+        GuestRoomAssignment.objects.filter(hotel=hotel).order_by('-check_out_time').values_list('check_out_time', flat=True).first()
+        or timezone.now()
+    ) + timedelta(days=30)
+    return {
+        'hotel': hotel, 'admin': admin, 'request_id': latest_request.pk,
+        'guest_room': latest_request.room_number, 'room_number': room.room_number,
+        'free_day': timezone.localtime(free_day).date(),
+    }
+
+
+def _assignment_form(context):
+    day = context['free_day']
+    return {
+        'room_number_input': context['room_number'], 'guest_names': 'Benchmark Guest',
+        'check_in_date': day.isoformat(), 'check_in_time_input': '15:00',
+        'check_out_date': (day + timedelta(days=2)).isoformat(), 'check_out_time_input': '11:00',
+        'total_bill_amount': '240.00', 'amount_paid': '0.00', 'status': 'confirmed',
+    }
+
+
+# name -> (signed in as 'admin' or None, writes (rolled back), request builder returning (method, url, kwargs)).
+SCENARIOS = {
+    'dashboard_home': ('admin', False, lambda c: ('get', reverse('main:home_dashboard'), {})),
+    'dashboard_requests_active': ('admin', False, lambda c: ('get', reverse('main:active_requests'), {})),
+    'dashboard_requests_archive': ('admin', False, lambda c: ('get', reverse('main:archive_requests'), {})),
+    'dashboard_requests_all': ('admin', False, lambda c: ('get', reverse('main:all_requests'), {})),
+    'dashboard_guests': ('admin', False, lambda c: ('get', reverse('main:guest_management'), {})),
+    'dashboard_amenities': ('admin', False, lambda c: ('get', reverse('main:amenity_management'), {})),
+    'request_details_api': ('admin', False, lambda c: (
+        'get', reverse('main:request_details_api', args=[c['request_id']]), {})),
+    'check_new_requests': ('admin', False, lambda c: (
+        'get', reverse('main:check_new_requests'), {'data': {'last_check': (timezone.now() - timedelta(days=1)).isoformat()}})),
+    'check_for_new_updates': (None, False, lambda c: (
+        'get', reverse('main:check_for_new_updates', args=[c['hotel'].pk, c['guest_room']]), {'data': {'last_request_id': 0}})),
+    'process_guest_command': (None, True, lambda c: (
+        'post', reverse('main:process_guest_command'),
+        {'data': json.dumps({'message': GUEST_MESSAGE, 'hotel_id': c['hotel'].pk, 'room_number': c['guest_room']}),
+         'content_type': 'application/json'})),
+    'assignment_form_save': ('admin', True, lambda c: (
+        'post', reverse('main:guest_management'), {'data': _assignment_form(c)})),
+}
+
+
+@contextmanager
+def _rolled_back(writes):
+    if not writes:
+        yield
+        return
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def _summary(timings, query_counts, peak_bytes):
+    timings = np.array(timings) * 1000
+    return {
+        'iterations': len(timings),
+        'p50_ms': round(float(np.percentile(timings, 50)), 3),
+        'p90_ms': round(float(np.percentile(timings, 90)), 3),
+        'p99_ms': round(float(np.percentile(timings, 99)), 3),
+        'mean_ms': round(float(timings.mean()), 3),
+        'min_ms': round(float(timings.min()), 3),
+        'max_ms': round(float(timings.max()), 3),
+        'queries': int(np.median(query_counts)),
+        'max_queries': max(query_counts),
+        'peak_memory_kb': round(peak_bytes / 1024, 1),
+    }
+
+
+def run_scenario(client, context, name, iterations=BENCHMARK_ITERATIONS, warmup=WARMUP_ITERATIONS):
+    """Times one scenario; returns its summary dict (see _summary)."""
+    _role, writes, build = SCENARIOS[name]
+    method, url, kwargs = build(context)
+
+    def call():
+        with _rolled_back(writes):
+            response = getattr(client, method)(url, **kwargs)
+        if response.status_code >= 400 or (response.get('Content-Type', '').startswith('application/json')
+                                           and response.json().get('success') is False):
+            raise BenchmarkError(f'{name}: {method.upper()} {url} returned {response.status_code}: {response.content[:200]!r}')
+        return response
+
+    for _ in range(warmup):
+        call()
+    timings, query_counts = [], []
+    for _ in range(iterations):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            call()
+            timings.append(time.perf_counter() - started)
+        query_counts.append(len(queries.captured_queries))
+
+    tracemalloc.start()
+    try:
+        call()
+        _current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return _summary(timings, query_counts, peak)
+
+
+def benchmark_hotel(hotel, scenarios=None, iterations=BENCHMARK_ITERATIONS, warmup=WARMUP_ITERATIONS, log=None):
+    """Runs the scenarios (default: all) against one hotel's data. Returns {scenario: summary}."""
+    log = log or (lambda message: None)
+    context = benchmark_context(hotel)
+    clients = {None: Client(), 'admin': Client()}
+    clients['admin'].force_login(context['admin'])
+    results = {}
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']), \
+            mock.patch.object(views, 'call_gemini_api', stub_gemini):
+        for name in scenarios or SCENARIOS:
+            results[name] = run_scenario(clients[SCENARIOS[name][0]], context, name, iterations, warmup)
+            log(f"  {name}: p50 {results[name]['p50_ms']}ms, p90 {results[name]['p90_ms']}ms, "
+                f"{results[name]['queries']} queries, {results[name]['peak_memory_kb']}KB peak")
+    return results
+
+
+def dataset_info(hotel):
+    return {
+        'hotel_id': hotel.pk,
+        'requests': GuestRequest.objects.filter(hotel=hotel).count(),
+        'stays': GuestRoomAssignment.objects.filter(hotel=hotel).count(),
+        'rooms': Room.objects.filter(hotel=hotel).count(),
+    }
+
+
+def run_benchmarks(datasets, scenarios=None, iterations=BENCHMARK_ITERATIONS, warmup=WARMUP_ITERATIONS, log=None):
+    """
+    Benchmarks each (label, hotel) in `datasets`. Returns the JSON-serializable run:
+    {'created_at', 'environment', 'iterations', 'datasets': {label: {..., 'scenarios': {...}}}}.
+    """
+    log = log or (lambda message: None)
+    run = {
+        'created_at': timezone.now().isoformat(),
+        'environment': {
+            'python': platform.python_version(), 'django': django.get_version(),
+            'database': connection.vendor, 'machine': platform.machine(),
+        },
+        'iterations': iterations,
+        'datasets': {},
+    }
+    for label, hotel in datasets:
+        log(f'{label} (hotel {hotel.pk}):')
+        run['datasets'][label] = {
+            **dataset_info(hotel),
+            'scenarios': benchmark_hotel(hotel, scenarios, iterations, warmup, log),
+        }
+    return run
+
+
+def compare_runs(baseline, current, threshold=REGRESSION_THRESHOLD, min_ms=MIN_REGRESSION_MS):
+    """
+    Lists what got worse from `baseline` to `current` (two run_benchmarks results), for the
+    datasets and scenarios both contain: [{'dataset', 'scenario', 'metric', 'baseline', 'current'}].
+    """
+    regressions = []
+    for label, dataset in current['datasets'].items():
+        baseline_scenarios = baseline['datasets'].get(label, {}).get('scenarios', {})
+        for name, result in dataset['scenarios'].items():
+            before = baseline_scenarios.get(name)
+            if before is None:
+                continue
+            worse = [metric for metric in COMPARED_PERCENTILES
+                     if result[metric] > before[metric] * (1 + threshold) and result[metric] - before[metric] >= min_ms]
+            if result['queries'] > before['queries']:
+                worse.append('queries')
+            if (result['peak_memory_kb'] > before['peak_memory_kb'] * (1 + threshold)
+                    and result['peak_memory_kb'] - before['peak_memory_kb'] >= MIN_REGRESSION_MEMORY_KB):
+                worse.append('peak_memory_kb')
+            regressions.extend(
+                {'dataset': label, 'scenario': name, 'metric': metric, 'baseline': before[metric], 'current': result[metric]}
+                for metric in worse
+            )
+    return regressions
@@ -0,0 +1,64 @@
+# main/billing.py
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .locking import lock_sqlite_database
+from .models import Charge, GuestRequest, GuestRoomAssignment
+
+# Stay bills are an append-only Charge ledger plus GuestRoomAssignment.total_bill_amount, which
+# is only ever moved with a single `total = total + amount` UPDATE. Nothing reads the total and
+# writes it back, so concurrent charges to one stay can't overwrite each other, and the stay row
+# is held only for that one statement's transaction.
+
+
+def current_stay(guest_request, now=None):
+    """The checked-in stay of the request's room at `now`, or None."""
+    if not guest_request.room_id:
+        return None
+    now = now or timezone.now()
+    return GuestRoomAssignment.objects.filter(
+        room=guest_request.room_id, check_in_time__lte=now, check_out_time__gte=now, status='checked_in',
+    ).first()
+
+
+def add_charge(assignment, amount, description, guest_request_id=None):
+    """Appends a charge to a stay's bill and adds it to the stay's total. Returns the Charge."""
+    with transaction.atomic():
+        charge = Charge.objects.create(
+            assignment=assignment, amount=amount, description=description, guest_request_id=guest_request_id,
+        )
+        GuestRoomAssignment.objects.filter(pk=assignment.pk).update(
+            total_bill_amount=F('total_bill_amount') + amount, updated_at=timezone.now(),
+        )
+    return charge
+
+
+def bill_amenity_request(guest_request, now=None):
+    """
+    Bills a completed amenity request to its room's current stay, at most once: the request's
+    bill_added flag is flipped with a conditional UPDATE, so of several concurrent completions
+    only one charges, and the ledger's unique request id backs that up. Call it inside the
+    transaction that completes the request. Returns the Charge, or None if nothing was billed.
+    """
+    amenity = guest_request.amenity_requested
+    if guest_request.bill_added or not amenity or guest_request.amenity_quantity <= 0:
+        return None
+    amount = amenity.price * guest_request.amenity_quantity
+    try:
+        with transaction.atomic():
+            if connection.vendor != 'postgresql':
+                # SQLite can't upgrade concurrent readers to writers; take the write lock up front.
+                lock_sqlite_database(GuestRequest._meta.db_table)
+            stay = current_stay(guest_request, now)
+            if stay is None:
+                return None
+            claimed = GuestRequest.objects.filter(pk=guest_request.pk, bill_added=False).update(bill_added=True)
+            charge = add_charge(stay, amount, f'{guest_request.amenity_quantity}x {amenity.name}',
+                                guest_request_id=guest_request.pk) if claimed else None
+    except IntegrityError:
+        charge = None
+    # Billed now or by a concurrent completion; either way a later save() mustn't clear the flag.
+    guest_request.bill_added = True
+    return charge
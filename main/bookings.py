@@ -0,0 +1,296 @@
+# main/bookings.py
+
+import csv
+import io
+import json
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal, InvalidOperation
+
+import numpy as np
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .availability import NON_OCCUPYING_STATUSES, rooms_changed
+from .fragments import invalidate_fragments
+from .locking import lock_sqlite_database
+from .models import GuestRoomAssignment, Room
+from .rooms import link_room_rows
+from .search import index_assignments
+from .stats import refresh_hotel_stats
+
+# Bulk booking import (e.g. a channel manager export) without per-row queries.
+# GuestRoomAssignmentForm.clean does a Room get-or-create and an overlap exists() per booking;
+# here every row is validated in memory, overlaps within the file are found with a sorted
+# sweep per room, and overlaps with stored stays with one range query per batch of rooms.
+
+IMPORT_BATCH_SIZE = 500
+OVERLAP_ERROR_MESSAGE = 'This room is already assigned for the selected dates/times.'
+# PostgreSQL exclusion constraint (migration 0019): no two stays of a room may have
+# intersecting [check_in_time, check_out_time) ranges. Cancelled and no-show stays
+# (NON_OCCUPYING_STATUSES) don't hold the room, so they're exempt here and in every check below.
+OVERLAP_CONSTRAINT = 'gra_no_room_overlap'
+# Expected columns/keys: room_number, guest_names, check_in, check_out (ISO date-times, local
+# time if no offset), and optionally status (default confirmed), total_bill_amount, amount_paid.
+VALID_STATUSES = {value for value, _label in GuestRoomAssignment.STATUS_CHOICES}
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+class BookingFileError(ValueError):
+    """Raised when an import file can't be read at all (as opposed to individual bad rows)."""
+
+
+class BookingOverlapError(Exception):
+    """Raised by save_assignment when the stay overlaps another stay of the same room."""
+
+
+def save_assignment(assignment, update_fields=None):
+    """
+    Saves a stay (only `update_fields`, if given), raising BookingOverlapError if it overlaps
+    another stay of its room. On PostgreSQL the exclusion constraint decides, so there's no read-then-write window and
+    no extra query. SQLite has no exclusion constraints, so there the check runs under the
+    database write lock.
+    """
+    try:
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                assignment.save(update_fields=update_fields)
+                return assignment
+            lock_sqlite_database(GuestRoomAssignment._meta.db_table)
+            occupying = assignment.room_id and assignment.status not in NON_OCCUPYING_STATUSES
+            if occupying and GuestRoomAssignment.objects.filter(
+                room=assignment.room_id,
+                check_in_time__lt=assignment.check_out_time,
+                check_out_time__gt=assignment.check_in_time,
+            ).exclude(pk=assignment.pk).exclude(status__in=NON_OCCUPYING_STATUSES).exists():
+                raise BookingOverlapError(OVERLAP_ERROR_MESSAGE)
+            assignment.save(update_fields=update_fields)
+    except IntegrityError as e:
+        if OVERLAP_CONSTRAINT in str(e):
+            raise BookingOverlapError(OVERLAP_ERROR_MESSAGE) from e
+        raise
+    return assignment
+
+
+def read_booking_records(content, file_format):
+    """Parses CSV (with a header row) or a JSON list of objects into a list of dicts."""
+    if isinstance(content, bytes):
+        try:
+            content = content.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            raise BookingFileError('Import files must be UTF-8 encoded.')
+    if file_format == 'json':
+        try:
+            records = json.loads(content)
+        except ValueError as e:
+            raise BookingFileError(f'Invalid JSON: {e}')
+        if not isinstance(records, list) or not all(isinstance(record, dict) for record in records):
+            raise BookingFileError('JSON imports must be a list of booking objects.')
+        return records
+    if file_format == 'csv':
+        return list(csv.DictReader(io.StringIO(content)))
+    raise BookingFileError(f"Unknown import format '{file_format}'; use csv or json.")
+
+
+def _parse_moment(value):
+    moment = parse_datetime(str(value).strip()) if value else None
+    if moment is not None and timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def _parse_amount(value):
+    if value in (None, ''):
+        return Decimal('0.00')
+    return Decimal(str(value)).quantize(Decimal('0.01'))
+
+
+def clean_booking(record):
+    """
+    Validates one import record the way GuestRoomAssignmentForm would, without queries.
+    Returns (booking dict, list of error messages).
+    """
+    errors = []
+    room_number = str(record.get('room_number') or '').strip()
+    guest_names = str(record.get('guest_names') or '').strip()
+    if not room_number:
+        errors.append('Room number is required.')
+    elif len(room_number) > 50:
+        errors.append('Room number must be at most 50 characters.')
+    if not guest_names:
+        errors.append('Guest names are required.')
+
+    check_in = check_out = None
+    try:
+        check_in = _parse_moment(record.get('check_in'))
+        check_out = _parse_moment(record.get('check_out'))
+    except ValueError:
+        pass
+    if check_in is None:
+        errors.append('Check-in must be a date and time like 2025-06-01 14:00.')
+    if check_out is None:
+        errors.append('Check-out must be a date and time like 2025-06-03 11:00.')
+    if check_in and check_out and check_out <= check_in:
+        errors.append('Check-out time must be after check-in time.')
+
+    status = str(record.get('status') or 'confirmed').strip()
+    if status not in VALID_STATUSES:
+        errors.append(f"Unknown status '{status}'.")
+
+    amounts = {}
+    for field in ('total_bill_amount', 'amount_paid'):
+        try:
+            amounts[field] = _parse_amount(record.get(field))
+        except InvalidOperation:
+            errors.append(f'{field} must be a number.')
+
+    booking = {
+        'room_number': room_number, 'guest_names': guest_names, 'status': status,
+        'check_in_time': check_in, 'check_out_time': check_out, **amounts,
+    }
+    return booking, errors
+
+
+def _micros(moment):
+    return (moment - _EPOCH) // timedelta(microseconds=1)
+
+
+def find_file_overlaps(bookings):
+    """
+    Sweeps each room's bookings in check-in order and returns {row: overlapping row} for every
+    booking that overlaps an earlier accepted booking of the same room in the file.
+    `bookings` is a list of (row, booking) pairs.
+    """
+    by_room = defaultdict(list)
+    for row, booking in bookings:
+        if booking['status'] not in NON_OCCUPYING_STATUSES:
+            by_room[booking['room_number']].append((booking['check_in_time'], booking['check_out_time'], row))
+
+    conflicts = {}
+    for intervals in by_room.values():
+        intervals.sort()
+        latest_end, latest_row = None, None
+        for check_in, check_out, row in intervals:
+            if latest_end is not None and check_in < latest_end:
+                conflicts[row] = latest_row
+                continue
+            if latest_end is None or check_out > latest_end:
+                latest_end, latest_row = check_out, row
+    return conflicts
+
+
+def find_stored_overlaps(hotel, bookings, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Returns the set of rows whose stay overlaps a stored assignment of the same room.
+    Reads stored stays with one range query per batch of rooms, then checks every booking
+    of a room at once: with stored stays sorted by check-in and a running maximum of their
+    check-outs, a booking overlaps iff the latest check-out among stays starting before its
+    check-out is after its check-in.
+    """
+    by_room = defaultdict(list)
+    for row, booking in bookings:
+        if booking['status'] not in NON_OCCUPYING_STATUSES:
+            by_room[booking['room_number']].append((row, booking))
+
+    overlapping = set()
+    room_numbers = sorted(by_room)
+    for start in range(0, len(room_numbers), batch_size):
+        batch = room_numbers[start:start + batch_size]
+        batch_bookings = [booking for room in batch for _row, booking in by_room[room]]
+        stored = defaultdict(list)
+        for room_number, check_in, check_out in GuestRoomAssignment.objects.filter(
+            hotel=hotel, room_number__in=batch,
+            check_in_time__lt=max(b['check_out_time'] for b in batch_bookings),
+            check_out_time__gt=min(b['check_in_time'] for b in batch_bookings),
+        ).exclude(status__in=NON_OCCUPYING_STATUSES).order_by().values_list('room_number', 'check_in_time', 'check_out_time').iterator():
+            stored[room_number].append((_micros(check_in), _micros(check_out)))
+
+        for room_number, intervals in stored.items():
+            intervals.sort()
+            starts = np.array([s for s, _e in intervals], dtype=np.int64)
+            latest_ends = np.maximum.accumulate(np.array([e for _s, e in intervals], dtype=np.int64))
+            rows = [row for row, _booking in by_room[room_number]]
+            check_ins = np.array([_micros(b['check_in_time']) for _row, b in by_room[room_number]], dtype=np.int64)
+            check_outs = np.array([_micros(b['check_out_time']) for _row, b in by_room[room_number]], dtype=np.int64)
+
+            before = np.searchsorted(starts, check_outs, side='left')
+            hits = (before > 0) & (latest_ends[np.maximum(before - 1, 0)] > check_ins)
+            overlapping.update(row for row, hit in zip(rows, hits) if hit)
+    return overlapping
+
+
+def import_bookings(hotel, records, dry_run=False, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Validates and imports booking records for `hotel`. Rows with errors are skipped and
+    reported; all valid rows (and any missing rooms) are written with bulk_create in one
+    transaction. Row numbers are 1-based positions in `records`.
+
+    Returns a dict with 'created', 'rooms_created' and 'errors' ([{'row', 'errors'}, ...]).
+    Raises BookingOverlapError, and writes nothing, if a stay saved while the file was being
+    checked overlaps one of its bookings (PostgreSQL's exclusion constraint catches this).
+    """
+    errors = defaultdict(list)
+    valid = []
+    for row, record in enumerate(records, start=1):
+        booking, row_errors = clean_booking(record)
+        if row_errors:
+            errors[row].extend(row_errors)
+        else:
+            valid.append((row, booking))
+
+    # Stored stays first, so a row rejected against the database can't block other rows of the file.
+    for row in find_stored_overlaps(hotel, valid, batch_size=batch_size):
+        errors[row].append(OVERLAP_ERROR_MESSAGE)
+    valid = [(row, booking) for row, booking in valid if row not in errors]
+
+    for row, other_row in find_file_overlaps(valid).items():
+        errors[row].append(f'Overlaps row {other_row} for the same room.')
+    valid = [(row, booking) for row, booking in valid if row not in errors]
+
+    room_numbers = {booking['room_number'] for _row, booking in valid}
+    room_ids = {}
+    room_list = sorted(room_numbers)
+    for start in range(0, len(room_list), batch_size):
+        room_ids.update(Room.objects.filter(
+            hotel=hotel, room_number__in=room_list[start:start + batch_size],
+        ).values_list('room_number', 'pk'))
+    new_rooms = sorted(room_numbers - set(room_ids))
+
+    report = {
+        'created': len(valid),
+        'rooms_created': len(new_rooms),
+        'errors': [{'row': row, 'errors': errors[row]} for row in sorted(errors)],
+    }
+    if dry_run or not valid:
+        return report
+
+    try:
+        with transaction.atomic():
+            created_rooms = Room.objects.bulk_create(
+                [Room(hotel=hotel, room_number=room_number, status='available') for room_number in new_rooms],
+                batch_size=batch_size,
+            )
+            room_ids.update((room.room_number, room.pk) for room in created_rooms)
+            assignments = GuestRoomAssignment.objects.bulk_create(
+                [
+                    GuestRoomAssignment(hotel=hotel, room_id=room_ids[booking['room_number']], **booking)
+                    for _row, booking in valid
+                ],
+                batch_size=batch_size,
+            )
+            # bulk_create skips model signals, so do their work once for the whole import.
+            if new_rooms:
+                link_room_rows(hotel.pk, new_rooms)
+            index_assignments(assignments)
+            refresh_hotel_stats(hotel)
+            transaction.on_commit(lambda: invalidate_fragments(hotel.pk, 'grouped_requests', 'kpi_header'))
+            transaction.on_commit(lambda: rooms_changed(hotel.pk))
+    except IntegrityError as e:
+        if OVERLAP_CONSTRAINT in str(e):
+            raise BookingOverlapError(
+                'Another stay was saved for one of these rooms while the file was being imported; '
+                'nothing was imported. Try again.'
+            ) from e
+        raise
+    return report
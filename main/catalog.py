@@ -0,0 +1,55 @@
+# main/catalog.py
+
+import threading
+
+from .models import Amenity
+from .versions import bump_version, current_version
+
+# The amenity catalog (one for all hotels) held as an immutable snapshot in each process.
+# Every use checks a version stamp (main/versions.py: one shared-cache round trip, or one
+# primary-key read without a shared cache); saving or deleting an Amenity bumps the stamp after
+# commit (main/signals.py), so each worker reloads the catalog on its next use. The first use
+# in a process loads it.
+
+CATALOG_VERSION_KEY = 'amenity_catalog_version'
+
+_snapshot = None  # (version stamp, AmenityCatalog)
+_snapshot_lock = threading.Lock()
+
+
+class AmenityCatalog:
+    """All amenities by name, plus the lookups the guest message path needs. Treat as read-only."""
+
+    def __init__(self, amenities):
+        self.amenities = tuple(amenities)
+        self.available = tuple(amenity for amenity in self.amenities if amenity.is_available)
+        self._available_by_name = {amenity.name.lower(): amenity for amenity in self.available}
+
+    def prompt_data(self):
+        """[{'name', 'price'}] of the available amenities, as call_gemini_api expects."""
+        return [{'name': amenity.name, 'price': amenity.price} for amenity in self.available]
+
+    def find_available(self, name):
+        """The available amenity with this name (case-insensitive), or None."""
+        return self._available_by_name.get(name.strip().lower()) if name else None
+
+
+def amenity_catalog():
+    """Returns this process's AmenityCatalog, reloading it if any process changed an amenity."""
+    global _snapshot
+    version = current_version(CATALOG_VERSION_KEY)
+    with _snapshot_lock:
+        if _snapshot and _snapshot[0] == version:
+            return _snapshot[1]
+    catalog = AmenityCatalog(Amenity.objects.order_by('name'))
+    with _snapshot_lock:
+        _snapshot = (version, catalog)
+    return catalog
+
+
+def catalog_changed():
+    """An amenity was saved or deleted: reload on the next use everywhere."""
+    global _snapshot
+    bump_version(CATALOG_VERSION_KEY)
+    with _snapshot_lock:
+        _snapshot = None
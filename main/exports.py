@@ -0,0 +1,100 @@
+# main/exports.py
+
+import csv
+import heapq
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from django.utils import timezone
+
+# Rows are read with values_list(...).iterator(), so no model instances are built and only
+# one chunk is held in memory at a time (a server-side cursor on PostgreSQL).
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_FORMATS = ('csv', 'jsonl')
+
+# (column header, queryset field) pairs; related fields are joined in the same query.
+REQUEST_EXPORT_COLUMNS = [
+    ('id', 'id'),
+    ('room_number', 'room_number'),
+    ('request_type', 'request_type'),
+    ('status', 'status'),
+    ('raw_text', 'raw_text'),
+    ('staff_notes', 'staff_notes'),
+    ('conci_response_text', 'conci_response_text'),
+    ('assigned_staff', 'assigned_staff__user__username'),
+    ('amenity', 'amenity_requested__name'),
+    ('amenity_quantity', 'amenity_quantity'),
+    ('bill_added', 'bill_added'),
+    ('received_at', 'timestamp'),
+    ('updated_at', 'updated_at'),
+]
+
+ASSIGNMENT_EXPORT_COLUMNS = [
+    ('id', 'id'),
+    ('room_number', 'room_number'),
+    ('guest_names', 'guest_names'),
+    ('check_in_time', 'check_in_time'),
+    ('check_out_time', 'check_out_time'),
+    ('status', 'status'),
+    ('base_bill_amount', 'base_bill_amount'),
+    ('total_bill_amount', 'total_bill_amount'),
+    ('amount_paid', 'amount_paid'),
+    ('created_at', 'created_at'),
+    ('updated_at', 'updated_at'),
+]
+
+
+class Echo:
+    """A write-only file-like object for csv.writer that hands each line straight back."""
+
+    def write(self, value):
+        return value
+
+
+def _export_value(value):
+    if isinstance(value, datetime):
+        return timezone.localtime(value).isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def export_rows(queryset, columns, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yields one tuple per row, in primary-key order, for the given export columns. `queryset`
+    may also be a list of querysets with disjoint keys (live and archived requests); their
+    rows are merged by key.
+    """
+    querysets = queryset if isinstance(queryset, (list, tuple)) else [queryset]
+    fields = ['pk'] + [field for _header, field in columns]
+    streams = [qs.order_by('pk').values_list(*fields).iterator(chunk_size=chunk_size) for qs in querysets]
+    for row in heapq.merge(*streams, key=lambda row: row[0]):
+        yield tuple(_export_value(value) for value in row[1:])
+
+
+def csv_lines(rows, columns):
+    """Yields CSV text lines, starting with the header so the first byte is sent before any query runs."""
+    writer = csv.writer(Echo())
+    yield writer.writerow([header for header, _field in columns])
+    for row in rows:
+        yield writer.writerow(['' if value is None else value for value in row])
+
+
+def jsonl_lines(rows, columns):
+    """Yields one JSON object per line (JSON Lines)."""
+    headers = [header for header, _field in columns]
+    for row in rows:
+        yield json.dumps(dict(zip(headers, row)), ensure_ascii=False) + '\n'
+
+
+def export_lines(queryset, columns, export_format):
+    """Returns a lazy iterator of output lines for `queryset` in 'csv' or 'jsonl' format."""
+    rows = export_rows(queryset, columns)
+    if export_format == 'jsonl':
+        return jsonl_lines(rows, columns)
+    return csv_lines(rows, columns)
+
+
+def export_content_type(export_format):
+    return 'application/x-ndjson' if export_format == 'jsonl' else 'text/csv'
@@ -0,0 +1,160 @@
+# main/faq.py
+
+import re
+import threading
+from collections import defaultdict
+
+from .models import HotelConfiguration
+from .versions import bump_version, current_version
+
+# Answers guests' questions about hotel facts (HotelConfiguration rows such as wifi_password or
+# checkout_time) without a Gemini round trip. Each hotel's facts are indexed by keyword; a
+# message scores every fact by the keywords it contains, each weighted 1 / (number of the
+# hotel's facts sharing it), so "wifi password" picks wifi_password over wifi_name. A fact is
+# answered directly only when the message is plainly a question (not a request to staff), names
+# one of the fact's topic words and scores at least ANSWER_THRESHOLD; anything else goes to
+# Gemini, with the matching facts as context.
+#
+# Indexes are cached per process behind a per-hotel version stamp (main/versions.py), which
+# configuration saves/deletes bump (main/signals.py).
+
+ANSWER_THRESHOLD = 1.0
+MAX_ANSWERS = 3
+MAX_PROMPT_FACTS = 5
+
+# Well-known keys: (label, answer template, topic words, other keywords). A direct answer needs
+# one of the topic words; the other keywords only add to the score ("wifi password"). Other
+# keys are matched on the words of the key itself, all of them topic words, and answered as
+# "<Label>: <value>".
+FAQ_TOPICS = {
+    'wifi_password': ('Wi-Fi password', 'The Wi-Fi password is {value}.', ('wifi', 'internet', 'wireless'), ('password',)),
+    'wifi_name': ('Wi-Fi network', 'The Wi-Fi network is called {value}.', ('wifi', 'internet', 'wireless'), ('network', 'ssid')),
+    'checkout_time': ('Check-out time', 'Check-out is at {value}.', ('checkout',), ('depart', 'departure', 'leave')),
+    'checkin_time': ('Check-in time', 'Check-in is from {value}.', ('checkin',), ('arrive', 'arrival')),
+    'breakfast_hours': ('Breakfast hours', 'Breakfast is served {value}.', ('breakfast',), ()),
+    'restaurant_hours': ('Restaurant hours', 'The restaurant is open {value}.', ('restaurant',), ('dinner', 'lunch')),
+    'pool_hours': ('Pool hours', 'The pool is open {value}.', ('pool',), ('swim', 'swimming')),
+    'gym_hours': ('Gym hours', 'The gym is open {value}.', ('gym', 'fitness'), ('workout',)),
+    'spa_hours': ('Spa hours', 'The spa is open {value}.', ('spa',), ('massage',)),
+    'parking': ('Parking', 'Parking: {value}', ('parking', 'garage'), ('park', 'car')),
+    'front_desk_phone': ('Front desk phone', 'You can reach the front desk at {value}.', ('phone', 'reception', 'frontdesk'),
+                         ('call', 'desk')),
+}
+# Words of generic keys too common to identify a fact on their own.
+GENERIC_KEY_WORDS = {'time', 'hour', 'number', 'info', 'name', 'the', 'of', 'and'}
+# Only questions are answered directly: the message ends with '?' or opens with one of these.
+QUESTION_WORDS = {'what', 'whats', 'when', 'where', 'which', 'who', 'how', 'is', 'are', 'does', 'do'}
+# Messages asking staff to do something go to Gemini and the request flow even if they mention a
+# fact: action words and request phrasing anywhere, or a message opening like a request.
+ACTION_WORDS = {'bring', 'send', 'deliver', 'fix', 'broken', 'repair', 'leak', 'leaking', 'clean', 'order',
+                'book', 'cancel', 'extend', 'late', 'early', 'change'}
+REQUEST_PHRASES = ('please', 'can you', 'could you', 'would you', 'will you', 'for my room')
+REQUEST_OPENERS = ('i need', 'i want', 'i would like', 'i d like', 'id like', 'i forgot', 'give me', 'get me')
+
+_WORD_RE = re.compile(r'[a-z0-9]+')
+
+_indexes = {}  # hotel_id -> (version stamp, FaqIndex)
+_indexes_lock = threading.Lock()
+
+
+def _stem(word):
+    return word[:-1] if len(word) > 3 and word.endswith('s') and not word.endswith('ss') else word
+
+
+def _is_question(message):
+    words = _WORD_RE.findall(message.lower())
+    if not words:
+        return False
+    phrase = f" {' '.join(words)} "
+    if any(f' {request} ' in phrase for request in REQUEST_PHRASES):
+        return False
+    if any(phrase.startswith(f' {opener} ') for opener in REQUEST_OPENERS):
+        return False
+    return message.strip().endswith('?') or words[0] in QUESTION_WORDS
+
+
+def message_terms(text):
+    """Lowercased, lightly stemmed words plus joined neighbours ("check out" -> "checkout", "wi fi" -> "wifi")."""
+    words = [_stem(word) for word in _WORD_RE.findall(text.lower())]
+    return set(words) | {first + second for first, second in zip(words, words[1:])}
+
+
+class FaqIndex:
+    """Keyword index over one hotel's configuration facts. Build with FaqIndex.load(hotel_id)."""
+
+    def __init__(self, entries):
+        """`entries` is an iterable of (key, value) pairs."""
+        self.facts = {}  # key -> (label, value, answer text)
+        self._topics = {}  # key -> topic words
+        postings = defaultdict(list)  # keyword -> keys
+        for key, value in entries:
+            value = str(value).strip()
+            if not value:
+                continue
+            if key in FAQ_TOPICS:
+                label, template, topics, others = FAQ_TOPICS[key]
+            else:
+                label = key.replace('_', ' ').strip().capitalize()
+                template = f'{label}: {{value}}'
+                topics = [word for word in message_terms(key.replace('_', ' ')) if word not in GENERIC_KEY_WORDS]
+                others = ()
+            self.facts[key] = (label, value, template.format(value=value))
+            self._topics[key] = frozenset(topics)
+            for keyword in set(topics) | set(others):
+                postings[keyword].append(key)
+        self._postings = {
+            keyword: [(key, 1.0 / len(keys)) for key in keys] for keyword, keys in postings.items()
+        }
+
+    @classmethod
+    def load(cls, hotel_id):
+        return cls(HotelConfiguration.objects.filter(hotel_id=hotel_id).values_list('key', 'value'))
+
+    def __len__(self):
+        return len(self.facts)
+
+    def scores(self, terms):
+        scores = defaultdict(float)
+        for term in terms:
+            for key, weight in self._postings.get(term, ()):
+                scores[key] += weight
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+    def answer(self, message):
+        """The direct answer to a question about the hotel's facts, or None if Gemini should handle it."""
+        terms = message_terms(message)
+        if terms & ACTION_WORDS or not _is_question(message):
+            return None
+        answers = [
+            self.facts[key][2] for key, score in self.scores(terms)
+            if score >= ANSWER_THRESHOLD and terms & self._topics[key]
+        ]
+        return ' '.join(answers[:MAX_ANSWERS]) or None
+
+    def relevant_facts(self, message):
+        """(label, value) pairs of the facts a message touches, best first, for the Gemini prompt."""
+        return [self.facts[key][:2] for key, _score in self.scores(message_terms(message))[:MAX_PROMPT_FACTS]]
+
+
+def _version_key(hotel_id):
+    return f'faq_version:{hotel_id}'
+
+
+def faq_index(hotel_id):
+    """Returns the hotel's FaqIndex, rebuilding it if its configuration changed."""
+    version = current_version(_version_key(hotel_id))
+    with _indexes_lock:
+        cached = _indexes.get(hotel_id)
+        if cached and cached[0] == version:
+            return cached[1]
+    index = FaqIndex.load(hotel_id)
+    with _indexes_lock:
+        _indexes[hotel_id] = (version, index)
+    return index
+
+
+def configuration_changed(hotel_id):
+    """A configuration row of the hotel changed: rebuild on the next use everywhere."""
+    bump_version(_version_key(hotel_id))
+    with _indexes_lock:
+        _indexes.pop(hotel_id, None)
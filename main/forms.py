@@ -3,6 +3,7 @@
 from django import forms
 from .models import GuestRoomAssignment, Room, Amenity, GuestRequest, StaffMember # Import GuestRequest and StaffMember
 from django.core.exceptions import ValidationError
+from .bookings import BookingOverlapError, save_assignment
 from django.utils import timezone
 import json # Import json for JSONField handling in GuestRequestForm
 
@@ -65,6 +66,8 @@ class GuestRoomAssignmentForm(forms.ModelForm):
                 self.fields['room_number_input'].initial = ''
 
             self.fields['amount_paid'].initial = self.instance.amount_paid
+            # After creation the bill total only moves through charges (main/billing.py).
+            self.fields['total_bill_amount'].disabled = True
 
 
     def clean(self):
@@ -89,6 +92,7 @@ class GuestRoomAssignmentForm(forms.ModelForm):
                 )
                 self._new_room_created = True # <--- NEW: Set the flag instead of adding an error
             
+            self.instance.room = room_obj
             self.instance.room_number = room_obj.room_number
         else:
             self.add_error('room_number_input', "Room number is required.")
@@ -121,17 +125,7 @@ class GuestRoomAssignmentForm(forms.ModelForm):
            self.instance.check_in_time and self.instance.check_out_time:
             if self.instance.check_out_time <= self.instance.check_in_time:
                 self.add_error('check_out_time', 'Check-out time must be after check-in time.')
-            
-            if self.instance.room_number:
-                overlapping_assignments = GuestRoomAssignment.objects.filter(
-                    hotel=self.hotel,
-                    room_number=self.instance.room_number,
-                    check_in_time__lt=self.instance.check_out_time,
-                    check_out_time__gt=self.instance.check_in_time,
-                ).exclude(pk=self.instance.pk)
-
-                if overlapping_assignments.exists():
-                    self.add_error('room_number_input', 'This room is already assigned for the selected dates/times.')
+            # Overlapping stays are rejected in save(), atomically with the write.
 
         return cleaned_data
 
@@ -147,7 +141,23 @@ class GuestRoomAssignmentForm(forms.ModelForm):
             instance.hotel = self.hotel
         
         if commit:
-            instance.save()
+            # Edits leave the bill total out of the UPDATE: writing back the value read for this
+            # request would undo any charge added since with total = total + amount.
+            update_fields = None
+            if instance.pk:
+                update_fields = [
+                    field.name for field in instance._meta.concrete_fields
+                    if not field.primary_key and field.name != 'total_bill_amount'
+                ]
+            # The database (or SQLite's write lock) rejects double bookings; report them as the
+            # usual field error. Callers check form.errors after catching BookingOverlapError.
+            try:
+                save_assignment(instance, update_fields=update_fields)
+            except BookingOverlapError as e:
+                self.add_error('room_number_input', str(e))
+                raise
+            if update_fields:
+                instance.refresh_from_db(fields=['total_bill_amount'])
         return instance
 
 
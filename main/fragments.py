@@ -0,0 +1,36 @@
+# main/fragments.py
+
+from django.conf import settings
+
+from .versions import bump_version, current_versions
+
+# Fragments of staff_dashboard.html that are cached with {% cache %}. Each one is keyed by
+# hotel plus a version stamp (main/versions.py: in the shared cache, or the database without
+# one); bumping the stamp (from main/signals.py) orphans the old entry in every worker.
+DASHBOARD_FRAGMENTS = ('kpi_header', 'staff_list', 'amenity_table', 'grouped_requests')
+
+# Amenity has no hotel FK, so the amenity table is shared by every hotel.
+GLOBAL_FRAGMENTS = ('amenity_table',)
+
+DASHBOARD_FRAGMENT_CACHE_TIMEOUT = getattr(settings, 'DASHBOARD_FRAGMENT_CACHE_TIMEOUT', 300)
+
+
+def _version_key(name, hotel_id):
+    scope = 'all' if name in GLOBAL_FRAGMENTS else hotel_id
+    return f'dashboard_fragment_version:{name}:{scope}'
+
+
+def fragment_versions(hotel_id):
+    """
+    Returns {fragment_name: version_stamp} for a hotel in a single cache round trip, or one
+    query without a shared cache (main/versions.py), so every worker sees the others' bumps.
+    """
+    keys = {name: _version_key(name, hotel_id) for name in DASHBOARD_FRAGMENTS}
+    stored = current_versions(keys.values())
+    return {name: stored[key] for name, key in keys.items()}
+
+
+def invalidate_fragments(hotel_id, *names):
+    """Bumps the version stamp of the named fragments for one hotel (or all, for global ones)."""
+    for name in names:
+        bump_version(_version_key(name, hotel_id))
@@ -0,0 +1,28 @@
+# main/locking.py
+
+import time
+
+from django.db import OperationalError, connection, transaction
+
+# SQLite has no row locks (SELECT ... FOR UPDATE is a no-op there). Code that must read and
+# then write without another connection slipping in between takes the database write lock
+# first instead; concurrent writers back off and retry.
+SQLITE_LOCK_ATTEMPTS = 50
+SQLITE_LOCK_BACKOFF = 0.02
+
+
+def lock_sqlite_database(table):
+    """
+    Takes SQLite's database write lock as the first statement of the current transaction with
+    a no-op UPDATE of `table`, so the rest of the transaction can't interleave with another
+    writer. Retries while another connection holds the lock.
+    """
+    for attempt in range(SQLITE_LOCK_ATTEMPTS):
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(f'UPDATE {table} SET rowid = rowid WHERE 0')
+            return
+        except OperationalError as e:
+            if 'locked' not in str(e) or attempt == SQLITE_LOCK_ATTEMPTS - 1:
+                raise
+            time.sleep(SQLITE_LOCK_BACKOFF * (attempt + 1))
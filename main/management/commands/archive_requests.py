@@ -0,0 +1,39 @@
+# main/management/commands/archive_requests.py
+from django.core.management.base import BaseCommand
+
+from main.archive import ARCHIVE_BATCH_SIZE, archivable_requests, archive_requests, retention_days
+from main.models import Hotel
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves closed guest requests older than each hotel's retention period into the archive "
+        "table, in bounded batches. Run daily (e.g. from cron) to keep the live request table small."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hotel', type=int, action='append', dest='hotel_ids',
+                            help='Only archive this hotel ID (can be given more than once).')
+        parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE,
+                            help='Requests moved per transaction.')
+        parser.add_argument('--max-batches', type=int, default=None,
+                            help='Stop each hotel after this many batches (spreads a large backlog over several runs).')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many requests would move.')
+
+    def handle(self, *args, **options):
+        hotels = Hotel.objects.order_by('pk')
+        if options['hotel_ids']:
+            hotels = hotels.filter(pk__in=options['hotel_ids'])
+
+        total = 0
+        for hotel in hotels.iterator():
+            if options['dry_run']:
+                moved = archivable_requests(hotel).count()
+            else:
+                moved = archive_requests(hotel, batch_size=options['batch_size'], max_batches=options['max_batches'])
+            total += moved
+            if moved:
+                self.stdout.write(f'{hotel.name}: {moved} request(s) older than {retention_days(hotel)} days')
+
+        verb = 'Would archive' if options['dry_run'] else 'Archived'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {total} request(s).'))
@@ -0,0 +1,103 @@
+# main/management/commands/benchmark.py
+import json
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from main.benchmarks import (
+    BENCHMARK_ITERATIONS, REGRESSION_THRESHOLD, SCENARIOS, WARMUP_ITERATIONS, BenchmarkError, compare_runs,
+    run_benchmarks,
+)
+from main.models import Hotel
+from main.seeding import seed_benchmark_data
+
+
+class Command(BaseCommand):
+    help = (
+        "Times the staff dashboard tabs and the main APIs (latency percentiles, query counts and "
+        "peak memory) against hotels of several sizes, saves the results as JSON and flags "
+        "regressions against a baseline run. --sizes seeds one synthetic hotel per size first, "
+        "in a transaction that is rolled back when the run ends, so nothing is left behind."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', help='Comma-separated guest request counts; seeds one hotel per size.')
+        parser.add_argument('--hotel', type=int, action='append', dest='hotel_ids',
+                            help='Benchmark this existing hotel ID (can be given more than once).')
+        parser.add_argument('--scenario', action='append', dest='scenarios', choices=sorted(SCENARIOS),
+                            help='Only run this scenario (can be given more than once).')
+        parser.add_argument('--iterations', type=int, default=BENCHMARK_ITERATIONS,
+                            help=f'Timed runs per scenario (default: {BENCHMARK_ITERATIONS}).')
+        parser.add_argument('--warmup', type=int, default=WARMUP_ITERATIONS,
+                            help=f'Untimed runs per scenario first (default: {WARMUP_ITERATIONS}).')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for --sizes (default: 0).')
+        parser.add_argument('--output', help='Write the results to this JSON file.')
+        parser.add_argument('--baseline', help='Compare with the results in this JSON file; fails on regressions.')
+        parser.add_argument('--results', help='Compare this saved JSON run with --baseline instead of running.')
+        parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                            help=f'Allowed slowdown as a fraction (default: {REGRESSION_THRESHOLD}).')
+
+    def _load(self, path):
+        try:
+            with open(path) as source:
+                return json.load(source)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Could not read {path}: {e}')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be at least 1.')
+        if options['results']:
+            if not options['baseline']:
+                raise CommandError('--results needs --baseline to compare with.')
+            run = self._load(options['results'])
+        else:
+            run = self._run(options)
+            if options['output']:
+                with open(options['output'], 'w') as target:
+                    json.dump(run, target, indent=2)
+                self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}."))
+
+        if options['baseline']:
+            regressions = compare_runs(self._load(options['baseline']), run, threshold=options['threshold'])
+            for regression in regressions:
+                self.stdout.write(self.style.ERROR(
+                    f"{regression['dataset']} / {regression['scenario']}: {regression['metric']} "
+                    f"{regression['baseline']} -> {regression['current']}"
+                ))
+            if regressions:
+                raise CommandError(f'{len(regressions)} regression(s) against {options["baseline"]}.')
+            self.stdout.write(self.style.SUCCESS(f"No regressions against {options['baseline']}."))
+
+    def _run(self, options):
+        # Seeded hotels only exist inside this transaction: the run sees them, the database never keeps them.
+        with transaction.atomic() if options['sizes'] else nullcontext():
+            run = self._run_datasets(options)
+            if options['sizes']:
+                transaction.set_rollback(True)
+        return run
+
+    def _run_datasets(self, options):
+        datasets = []
+        if options['sizes']:
+            try:
+                sizes = [int(size) for size in options['sizes'].split(',')]
+            except ValueError:
+                raise CommandError('--sizes must be comma-separated integers.')
+            for size in sizes:
+                [(hotel, _counts)] = seed_benchmark_data(requests=size, seed=options['seed'])
+                datasets.append((f'{size}_requests', hotel))
+        for hotel_id in options['hotel_ids'] or ():
+            try:
+                datasets.append((f'hotel_{hotel_id}', Hotel.objects.get(pk=hotel_id)))
+            except Hotel.DoesNotExist:
+                raise CommandError(f'Hotel {hotel_id} does not exist.')
+        if not datasets:
+            raise CommandError('Pass --sizes to seed datasets or --hotel to benchmark existing hotels.')
+
+        try:
+            return run_benchmarks(datasets, options['scenarios'], options['iterations'], options['warmup'],
+                                  log=self.stdout.write)
+        except BenchmarkError as e:
+            raise CommandError(str(e))
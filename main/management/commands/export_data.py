@@ -0,0 +1,54 @@
+# main/management/commands/export_data.py
+from django.core.management.base import BaseCommand, CommandError
+
+from main.exports import ASSIGNMENT_EXPORT_COLUMNS, EXPORT_FORMATS, REQUEST_EXPORT_COLUMNS, export_lines
+from main.models import ArchivedGuestRequest, GuestRequest, GuestRoomAssignment, Hotel
+from main.views import filter_assignments, filter_requests
+
+
+class Command(BaseCommand):
+    help = (
+        "Streams a hotel's guest requests or guest assignments as CSV or JSON Lines. "
+        "Filters use the dashboard's query parameter names, e.g. "
+        "--filter status=completed --filter date_from=2025-01-01."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=['requests', 'assignments'])
+        parser.add_argument('--hotel', type=int, required=True, help='Hotel ID to export.')
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv', dest='export_format')
+        parser.add_argument('--output', help='File to write (default: stdout).')
+        parser.add_argument('--filter', action='append', default=[], dest='filters', metavar='NAME=VALUE',
+                            help='A dashboard filter parameter (can be given more than once).')
+
+    def handle(self, *args, **options):
+        try:
+            hotel = Hotel.objects.get(pk=options['hotel'])
+        except Hotel.DoesNotExist:
+            raise CommandError(f"Hotel {options['hotel']} does not exist.")
+
+        params = {}
+        for item in options['filters']:
+            name, sep, value = item.partition('=')
+            if not sep:
+                raise CommandError(f"Filters must look like NAME=VALUE, got '{item}'.")
+            params[name] = value
+
+        if options['dataset'] == 'requests':
+            # Live and archived requests, merged by id.
+            queryset = [
+                filter_requests(model.objects.filter(hotel=hotel), params)[0]
+                for model in (GuestRequest, ArchivedGuestRequest)
+            ]
+            columns = REQUEST_EXPORT_COLUMNS
+        else:
+            queryset, _applied = filter_assignments(GuestRoomAssignment.objects.filter(hotel=hotel), params)
+            columns = ASSIGNMENT_EXPORT_COLUMNS
+
+        lines = export_lines(queryset, columns, options['export_format'])
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                output.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
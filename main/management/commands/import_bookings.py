@@ -0,0 +1,46 @@
+# main/management/commands/import_bookings.py
+from django.core.management.base import BaseCommand, CommandError
+
+from main.bookings import BookingFileError, BookingOverlapError, import_bookings, read_booking_records
+from main.models import Hotel
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-imports guest room assignments from a CSV or JSON file (e.g. a channel manager "
+        "export). Overlaps are checked in memory; valid rows are created with bulk_create and "
+        "every rejected row is reported."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV (with header row) or JSON file of bookings.')
+        parser.add_argument('--hotel', type=int, required=True, help='Hotel ID to import into.')
+        parser.add_argument('--format', choices=['csv', 'json'], dest='file_format',
+                            help='File format (default: from the file extension).')
+        parser.add_argument('--dry-run', action='store_true', help='Validate only; write nothing.')
+
+    def handle(self, *args, **options):
+        try:
+            hotel = Hotel.objects.get(pk=options['hotel'])
+        except Hotel.DoesNotExist:
+            raise CommandError(f"Hotel {options['hotel']} does not exist.")
+
+        file_format = options['file_format'] or ('json' if options['path'].lower().endswith('.json') else 'csv')
+        try:
+            with open(options['path'], 'rb') as source:
+                records = read_booking_records(source.read(), file_format)
+        except (OSError, BookingFileError) as e:
+            raise CommandError(str(e))
+
+        try:
+            report = import_bookings(hotel, records, dry_run=options['dry_run'])
+        except BookingOverlapError as e:
+            raise CommandError(str(e))
+        for error in report['errors']:
+            self.stdout.write(self.style.WARNING(f"Row {error['row']}: {' '.join(error['errors'])}"))
+
+        verb = 'Would create' if options['dry_run'] else 'Created'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {report['created']} assignment(s) and {report['rooms_created']} room(s); "
+            f"{len(report['errors'])} row(s) rejected."
+        ))
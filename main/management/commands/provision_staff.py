@@ -0,0 +1,47 @@
+# main/management/commands/provision_staff.py
+from django.core.management.base import BaseCommand, CommandError
+
+from main.models import Hotel
+from main.provisioning import StaffConflictError, StaffFileError, provision_staff, read_staff_records
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-creates staff accounts (user, profile and staff member) for a hotel from a CSV or "
+        "JSON file with username, password, email, first_name, last_name and category columns. "
+        "Passwords are hashed in a process pool and rows are written with bulk_create; every "
+        "rejected row is reported."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV (with header row) or JSON file of staff.')
+        parser.add_argument('--hotel', type=int, required=True, help='Hotel ID the staff work at.')
+        parser.add_argument('--format', choices=['csv', 'json'], dest='file_format',
+                            help='File format (default: from the file extension).')
+        parser.add_argument('--workers', type=int, help='Password hashing processes (default: CPU count).')
+        parser.add_argument('--dry-run', action='store_true', help='Validate only; write nothing.')
+
+    def handle(self, *args, **options):
+        try:
+            hotel = Hotel.objects.get(pk=options['hotel'])
+        except Hotel.DoesNotExist:
+            raise CommandError(f"Hotel {options['hotel']} does not exist.")
+
+        file_format = options['file_format'] or ('json' if options['path'].lower().endswith('.json') else 'csv')
+        try:
+            with open(options['path'], 'rb') as source:
+                records = read_staff_records(source.read(), file_format)
+        except (OSError, StaffFileError) as e:
+            raise CommandError(str(e))
+
+        try:
+            report = provision_staff(hotel, records, dry_run=options['dry_run'], workers=options['workers'])
+        except StaffConflictError as e:
+            raise CommandError(str(e))
+        for error in report['errors']:
+            self.stdout.write(self.style.WARNING(f"Row {error['row']}: {' '.join(error['errors'])}"))
+
+        verb = 'Would create' if options['dry_run'] else 'Created'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {report['created']} staff account(s); {len(report['errors'])} row(s) rejected."
+        ))
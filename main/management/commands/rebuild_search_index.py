@@ -0,0 +1,34 @@
+# main/management/commands/rebuild_search_index.py
+from django.core.management.base import BaseCommand
+
+from main.search import rebuild_assignment_index, rebuild_request_index, search_backend
+
+INDEXES = {
+    'assignments': ('guest assignment', rebuild_assignment_index),
+    'requests': ('guest request', rebuild_request_index),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuilds the full-text search indexes used by guest management and request search. "
+        "Needed on SQLite after bulk writes that skip model signals; PostgreSQL "
+        "maintains its own trigram/tsvector indexes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--index', choices=sorted(INDEXES), action='append', dest='indexes',
+                            help='Only rebuild this index (can be given more than once).')
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help='Rows read per batch while rebuilding (default 2000).')
+
+    def handle(self, *args, **options):
+        backend = search_backend()
+        if backend != 'fts5':
+            self.stdout.write(f'Search backend is {backend or "plain LIKE"}; nothing to rebuild.')
+            return
+
+        for name in options['indexes'] or sorted(INDEXES):
+            label, rebuild = INDEXES[name]
+            indexed = rebuild(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} {label}(s).'))
@@ -0,0 +1,41 @@
+# main/management/commands/reconcile_hotel_stats.py
+from django.core.management.base import BaseCommand
+
+from main.models import Hotel
+from main.routing import recount_staff_load
+from main.stats import refresh_hotel_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuilds today's HotelStats rows from the raw tables and reports any drift. "
+        "Run periodically (e.g. every 15 minutes) so time-based counters such as occupied "
+        "rooms stay current between the incremental signal updates. Also recounts each staff "
+        "member's open tasks used for automatic assignment."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hotel', type=int, action='append', dest='hotel_ids',
+                            help='Only reconcile this hotel ID (can be given more than once).')
+
+    def handle(self, *args, **options):
+        hotels = Hotel.objects.order_by('pk')
+        if options['hotel_ids']:
+            hotels = hotels.filter(pk__in=options['hotel_ids'])
+
+        repaired = staff_repaired = 0
+        for hotel in hotels.iterator():
+            for staff_id, (stored, actual) in recount_staff_load(hotel).items():
+                staff_repaired += 1
+                self.stdout.write(self.style.WARNING(f'Repaired open tasks of staff member {staff_id}: {stored} -> {actual}'))
+            stats, drift = refresh_hotel_stats(hotel)
+            if drift:
+                repaired += 1
+                changes = ', '.join(f'{field}: {stored} -> {actual}' for field, (stored, actual) in drift.items()
+                                    if field != 'reservations_chart_data')
+                if 'reservations_chart_data' in drift:
+                    changes = ', '.join(filter(None, [changes, 'reservations_chart_data']))
+                self.stdout.write(self.style.WARNING(f'Repaired {hotel.name} ({stats.day}): {changes}'))
+
+        self.stdout.write(self.style.SUCCESS(f'Reconciled hotel stats; {repaired} row(s) needed repair.'))
+        self.stdout.write(self.style.SUCCESS(f'Reconciled staff load; {staff_repaired} staff member(s) needed repair.'))
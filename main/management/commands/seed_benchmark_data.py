@@ -0,0 +1,60 @@
+# main/management/commands/seed_benchmark_data.py
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from main.seeding import seed_benchmark_data
+
+
+class Command(BaseCommand):
+    help = (
+        "Generates synthetic hotels (rooms, staff, years of stays and guest requests with chat "
+        "histories) for benchmarking the dashboards. The same --seed and --as-of always produce "
+        "the same data. Adds to the database; use a scratch database. Runs only with DEBUG on "
+        "unless --force is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hotels', type=int, default=1, help='Number of hotels (default: 1).')
+        parser.add_argument('--rooms', type=int, default=200, help='Rooms per hotel (default: 200).')
+        parser.add_argument('--staff', type=int, default=40, help='Staff members per hotel (default: 40).')
+        parser.add_argument('--years', type=float, default=2.0, help='Years of stay history per hotel (default: 2).')
+        parser.add_argument('--requests', type=int, default=100000, help='Guest requests per hotel (default: 100000).')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0).')
+        parser.add_argument('--as-of', help='Date the history runs up to, YYYY-MM-DD (default: today).')
+        parser.add_argument('--password',
+                            help='Password of the generated accounts (default: none; they cannot log in).')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per INSERT (default: 1000).')
+        parser.add_argument('--force', action='store_true',
+                            help='Seed even with DEBUG off (the configured database must be a scratch one).')
+
+    def handle(self, *args, **options):
+        if not (settings.DEBUG or options['force']):
+            raise CommandError(
+                'DEBUG is off, so this may be a production database. Point the settings at a scratch '
+                'database and pass --force to seed it.'
+            )
+        as_of = None
+        if options['as_of']:
+            as_of = parse_date(options['as_of'])
+            if as_of is None:
+                raise CommandError(f"Invalid --as-of date '{options['as_of']}'; use YYYY-MM-DD.")
+        for name in ('hotels', 'rooms', 'staff', 'batch_size'):
+            if options[name] < 1:
+                raise CommandError(f"--{name.replace('_', '-')} must be at least 1.")
+        if options['requests'] < 0 or options['years'] <= 0:
+            raise CommandError('--requests must not be negative and --years must be positive.')
+
+        started = time.monotonic()
+        results = seed_benchmark_data(
+            hotels=options['hotels'], rooms=options['rooms'], staff=options['staff'], years=options['years'],
+            requests=options['requests'], seed=options['seed'], as_of=as_of, password=options['password'],
+            batch_size=options['batch_size'], log=self.stdout.write,
+        )
+        totals = {key: sum(counts[key] for _hotel, counts in results) for key in ('stays', 'requests')}
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(results)} hotel(s), {totals['stays']} stays and {totals['requests']} requests "
+            f"in {time.monotonic() - started:.1f}s."
+        ))
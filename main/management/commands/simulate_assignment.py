@@ -0,0 +1,51 @@
+# main/management/commands/simulate_assignment.py
+import json
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from main.models import Hotel
+from main.routing import history_rows, simulate_assignment
+
+
+class Command(BaseCommand):
+    help = (
+        "Replays each hotel's historical guest requests through the automatic assignment engine "
+        "(current rules and staff) and compares time-to-assignment and staff load with what "
+        "actually happened."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hotel', type=int, action='append', dest='hotel_ids',
+                            help='Only simulate this hotel ID (can be given more than once).')
+        parser.add_argument('--days', type=int, default=None,
+                            help='Only replay requests received in the last N days.')
+        parser.add_argument('--json', action='store_true', help='Print one JSON object per hotel.')
+
+    def handle(self, *args, **options):
+        hotels = Hotel.objects.order_by('pk')
+        if options['hotel_ids']:
+            hotels = hotels.filter(pk__in=options['hotel_ids'])
+        since = timezone.now() - timedelta(days=options['days']) if options['days'] else None
+
+        for hotel in hotels.iterator():
+            result = simulate_assignment(hotel, history_rows(hotel, since=since))
+            if options['json']:
+                self.stdout.write(json.dumps({'hotel': hotel.pk, **result}))
+                continue
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{hotel.name}: {result['requests']} request(s)"))
+            for label in ('historical', 'simulated'):
+                summary = result[label]
+                self.stdout.write(
+                    f"  {label:<10} assigned {summary['assigned']}, unassigned {summary['unassigned']}, "
+                    f"median {_duration(summary['median_seconds_to_assignment'])}, "
+                    f"p90 {_duration(summary['p90_seconds_to_assignment'])} to assignment, "
+                    f"peak {summary['peak_open_tasks_per_staff']} open task(s) per staff member"
+                )
+
+
+def _duration(seconds):
+    if seconds is None:
+        return '-'
+    return str(timedelta(seconds=round(seconds)))
@@ -0,0 +1,133 @@
+# main/middleware.py
+
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from .models import StaffMember, UserProfile
+from .timing import install_template_timer, record_queries, record_sample, request_timing, should_sample
+from .versions import shared_cache
+
+# The signed-in user's profile (with its hotel) and staff membership, resolved in one query
+# and, when there is a shared cache (SHARED_CACHE), kept there, so views reading request.hotel / request.staff_member (or the primed
+# request.user.profile.hotel) don't query for them. main/signals.py drops a user's entry when
+# their profile, staff membership or hotel changes; the timeout bounds staleness from writes
+# that skip signals (queryset.update()).
+HOTEL_CONTEXT_CACHE_TIMEOUT = getattr(settings, 'HOTEL_CONTEXT_CACHE_TIMEOUT', 3600)
+
+
+def _context_key(user_id):
+    return f'hotel_context:{user_id}'
+
+
+def _load_hotel_context(user_id):
+    """Returns (profile, staff_profile) for a user in one query; either may be None."""
+    user = get_user_model().objects.select_related('profile__hotel', 'staff_profile__hotel').filter(
+        pk=user_id,
+    ).first()
+    profile = getattr(user, 'profile', None)
+    staff_profile = getattr(user, 'staff_profile', None)
+    # Cache the rows without the user; the request's own user is attached on the way out.
+    for instance in (profile, staff_profile):
+        if instance is not None:
+            instance._state.fields_cache.pop('user', None)
+    return profile, staff_profile
+
+
+def hotel_context(user_id):
+    """Returns the cached (profile, staff_profile) pair for a user, loading it on a miss."""
+    if not shared_cache():
+        return _load_hotel_context(user_id)
+    key = _context_key(user_id)
+    context = cache.get(key)
+    if context is None:
+        context = _load_hotel_context(user_id)
+        cache.set(key, context, timeout=HOTEL_CONTEXT_CACHE_TIMEOUT)
+    return context
+
+
+def invalidate_hotel_context(*user_ids):
+    cache.delete_many([_context_key(user_id) for user_id in user_ids])
+
+
+def attach_hotel_context(request):
+    """
+    Sets request.user_profile, request.hotel and request.staff_member (the user's StaffMember
+    at their profile's hotel, if any), and primes request.user.profile / .staff_profile so
+    existing lookups through them are free too.
+    """
+    user = request.user
+    profile, staff_profile = hotel_context(user.pk)
+    for instance, field in ((profile, UserProfile.user.field), (staff_profile, StaffMember.user.field)):
+        field.remote_field.set_cached_value(user, instance)
+        if instance is not None:
+            field.set_cached_value(instance, user)
+
+    request.user_profile = profile
+    request.hotel = profile.hotel if profile else None
+    request.staff_member = (
+        staff_profile if staff_profile and request.hotel and staff_profile.hotel_id == request.hotel.pk else None
+    )
+
+
+class HotelContextMiddleware:
+    """Resolves the hotel context of authenticated users. Goes after AuthenticationMiddleware."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.user_profile = request.hotel = request.staff_member = None
+        if request.user.is_authenticated:
+            attach_hotel_context(request)
+        return self.get_response(request)
+
+
+class RequestTimingMiddleware:
+    """
+    Opt-in (REQUEST_TIMING_ENABLED) per-request instrumentation: query count, total and slowest
+    SQL time with the calling line, template render time and time in timed() spans such as
+    Gemini calls, sent as a Server-Timing header and sampled for the admin timing report
+    (see main/timing.py). Goes first so it covers the other middleware. Removes itself when off.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_TIMING_ENABLED', False):
+            raise MiddlewareNotUsed
+        install_template_timer()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with request_timing() as timing, ExitStack() as stack:
+            self._record_queries(stack)
+            response = self.get_response(request)
+        total = time.perf_counter() - timing.started
+        # Query locations are source paths: only staff (who can see the report anyway) get them.
+        user = getattr(request, 'user', None)
+        response['Server-Timing'] = timing.server_timing(total, include_location=bool(user and user.is_staff))
+        if response.streaming and not response.is_async:
+            # Streamed bodies (exports) run their queries after the headers are sent, so the
+            # header covers the time to the first byte; the sample waits for the whole body.
+            response.streaming_content = self._timed_stream(request, response, timing, response.streaming_content)
+        elif should_sample():
+            record_sample(request, response, timing, total)
+        return response
+
+    @staticmethod
+    def _record_queries(stack):
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(record_queries))
+
+    def _timed_stream(self, request, response, timing, content):
+        try:
+            with request_timing(timing), ExitStack() as stack:
+                self._record_queries(stack)
+                yield from content
+        finally:
+            if should_sample():
+                record_sample(request, response, timing, time.perf_counter() - timing.started)
@@ -12,6 +12,11 @@ def reapply_staff_and_assigned_staff_sql(apps, schema_editor):
     respective foreign key constraints.
     Uses IF NOT EXISTS and DO $$ BEGIN ... EXCEPTION blocks for idempotency.
     """
+    # The DO $$ blocks below are PostgreSQL-only. On other backends (e.g. the SQLite
+    # database used for local runs and tests) migration 0011 already created everything.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
     # Get the actual model classes from the 'apps' registry
     User = apps.get_model(settings.AUTH_USER_MODEL.split('.')[0], settings.AUTH_USER_MODEL.split('.')[1])
     Hotel = apps.get_model('main', 'Hotel') # Assuming Hotel is in 'main' app
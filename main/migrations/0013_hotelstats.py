@@ -0,0 +1,37 @@
+# Generated by Django 5.1.7 on 2026-10-19 10:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0012_reapply_staff_and_assigned_staff'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HotelStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(help_text='Local date these statistics describe.')),
+                ('occupied_rooms', models.IntegerField(default=0)),
+                ('reserved_rooms', models.IntegerField(default=0)),
+                ('not_ready_rooms', models.IntegerField(default=0)),
+                ('new_bookings_count', models.IntegerField(default=0)),
+                ('check_ins_today_count', models.IntegerField(default=0)),
+                ('check_outs_today_count', models.IntegerField(default=0)),
+                ('total_requests_count', models.IntegerField(default=0)),
+                ('reservations_chart_data', models.JSONField(blank=True, default=list, help_text='Booked/cancelled counts for the 7 days ending on this day.')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('hotel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='main.hotel')),
+            ],
+            options={
+                'verbose_name': 'Hotel Stats',
+                'verbose_name_plural': 'Hotel Stats',
+                'ordering': ['-day'],
+                'unique_together': {('hotel', 'day')},
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.1.7 on 2026-10-19 10:00
+
+from django.db import migrations
+
+# Frozen copies of the definitions in main/search.py.
+ASSIGNMENT_FTS_TABLE = 'main_guestroomassignment_search'
+
+POSTGRES_INDEXES = [
+    ('main_gra_guest_names_trgm', 'USING gin (UPPER(guest_names::text) gin_trgm_ops)'),
+    ('main_gra_room_number_trgm', 'USING gin (UPPER(room_number::text) gin_trgm_ops)'),
+    ('main_gra_search_tsv', "USING gin (to_tsvector('simple', guest_names || ' ' || room_number))"),
+]
+
+
+def create_search_index(apps, schema_editor):
+    """
+    Creates the text indexes behind main/search.py: an FTS5 table filled from the existing
+    rows on SQLite, or trigram/tsvector GIN indexes on PostgreSQL.
+    """
+    vendor = schema_editor.connection.vendor
+    with schema_editor.connection.cursor() as cursor:
+        if vendor == 'sqlite':
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {ASSIGNMENT_FTS_TABLE} USING fts5('
+                f'hotel_id UNINDEXED, guest_names, room_number, '
+                f"tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+            )
+            cursor.execute(
+                f'INSERT INTO {ASSIGNMENT_FTS_TABLE} (rowid, hotel_id, guest_names, room_number) '
+                f'SELECT id, hotel_id, guest_names, room_number FROM main_guestroomassignment'
+            )
+        elif vendor == 'postgresql':
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            for name, definition in POSTGRES_INDEXES:
+                cursor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON main_guestroomassignment {definition}')
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    with schema_editor.connection.cursor() as cursor:
+        if vendor == 'sqlite':
+            cursor.execute(f'DROP TABLE IF EXISTS {ASSIGNMENT_FTS_TABLE}')
+        elif vendor == 'postgresql':
+            for name, _definition in POSTGRES_INDEXES:
+                cursor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0013_hotelstats'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
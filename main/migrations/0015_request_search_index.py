@@ -0,0 +1,82 @@
+# Generated by Django 5.1.7 on 2026-10-19 10:00
+
+import json
+
+from django.db import migrations
+
+# Frozen copies of the definitions in main/search.py.
+REQUEST_FTS_TABLE = 'main_guestrequest_search'
+REQUEST_SEARCH_FIELDS = ('room_number', 'raw_text', 'staff_notes', 'conci_response_text', 'chat_text')
+REQUEST_TSVECTOR_SQL = (
+    "to_tsvector('simple', room_number || ' ' || coalesce(raw_text, '') || ' ' || coalesce(staff_notes, '') || ' ' || "
+    "coalesce(conci_response_text, '') || ' ' || coalesce(chat_history #>> '{}', ''))"
+)
+
+
+def chat_history_text(chat_history):
+    if isinstance(chat_history, str):
+        try:
+            chat_history = json.loads(chat_history)
+        except ValueError:
+            return chat_history
+    if isinstance(chat_history, dict):
+        chat_history = [chat_history]
+    if not isinstance(chat_history, list):
+        return ''
+    texts = []
+    for message in chat_history:
+        if isinstance(message, dict):
+            texts.extend(part.get('text', '') for part in message.get('parts', []) if isinstance(part, dict))
+    return '\n'.join(text for text in texts if text)
+
+
+def create_search_index(apps, schema_editor):
+    """
+    Creates the request text index behind main/search.py: an FTS5 table filled from the
+    existing rows on SQLite, or a GIN tsvector index on PostgreSQL.
+    """
+    GuestRequest = apps.get_model('main', 'GuestRequest')
+    vendor = schema_editor.connection.vendor
+    with schema_editor.connection.cursor() as cursor:
+        if vendor == 'sqlite':
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {REQUEST_FTS_TABLE} USING fts5('
+                f'hotel_id UNINDEXED, {", ".join(REQUEST_SEARCH_FIELDS)}, '
+                f"tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+            )
+            rows = GuestRequest.objects.order_by('pk').values_list(
+                'pk', 'hotel_id', 'room_number', 'raw_text', 'staff_notes', 'conci_response_text', 'chat_history',
+            )
+            cursor.executemany(
+                f'INSERT INTO {REQUEST_FTS_TABLE} (rowid, hotel_id, {", ".join(REQUEST_SEARCH_FIELDS)}) '
+                f'VALUES (%s, %s, %s, %s, %s, %s, %s)',
+                [
+                    (pk, hotel_id, room_number, raw_text or '', staff_notes or '', response or '', chat_history_text(chat))
+                    for pk, hotel_id, room_number, raw_text, staff_notes, response, chat in rows.iterator()
+                ],
+            )
+        elif vendor == 'postgresql':
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS main_guestrequest_search_tsv ON main_guestrequest '
+                f'USING gin ({REQUEST_TSVECTOR_SQL})'
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    with schema_editor.connection.cursor() as cursor:
+        if vendor == 'sqlite':
+            cursor.execute(f'DROP TABLE IF EXISTS {REQUEST_FTS_TABLE}')
+        elif vendor == 'postgresql':
+            cursor.execute('DROP INDEX IF EXISTS main_guestrequest_search_tsv')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0014_assignment_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
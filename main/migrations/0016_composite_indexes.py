@@ -0,0 +1,53 @@
+# Generated by Django 5.1.7 on 2026-10-19 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0015_request_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='guestrequest',
+            index=models.Index(fields=['hotel', 'room_number', '-timestamp'], name='guestreq_hotel_room_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='guestrequest',
+            index=models.Index(fields=['hotel', 'status', '-timestamp'], name='guestreq_hotel_status_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='guestrequest',
+            index=models.Index(fields=['hotel', '-timestamp'], name='guestreq_hotel_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='guestrequest',
+            index=models.Index(fields=['assigned_staff', 'status'], name='guestreq_staff_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='guestrequest',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['hotel', 'timestamp'], name='guestreq_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='guestroomassignment',
+            index=models.Index(fields=['hotel', 'room_number', 'check_in_time', 'check_out_time'], name='gra_hotel_room_stay_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='guestroomassignment',
+            index=models.Index(fields=['hotel', 'status', 'check_in_time'], name='gra_hotel_status_checkin_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='guestroomassignment',
+            index=models.Index(fields=['hotel', '-check_in_time'], name='gra_hotel_checkin_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='guestroomassignment',
+            index=models.Index(fields=['hotel', 'created_at'], name='gra_hotel_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='guestroomassignment',
+            index=models.Index(fields=['hotel', 'check_out_time'], name='gra_hotel_checkout_idx'),
+        ),
+    ]
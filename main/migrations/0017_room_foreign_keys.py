@@ -0,0 +1,32 @@
+# Generated by Django 5.1.7 on 2026-10-19 10:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0016_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='guestrequest',
+            name='room',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='guest_requests', to='main.room'),
+        ),
+        migrations.AddField(
+            model_name='guestroomassignment',
+            name='room',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='assignments', to='main.room'),
+        ),
+        migrations.AddIndex(
+            model_name='guestrequest',
+            index=models.Index(fields=['room', '-timestamp'], name='guestreq_room_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='guestroomassignment',
+            index=models.Index(fields=['room', 'check_in_time', 'check_out_time'], name='gra_room_stay_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.1.7 on 2026-10-19 10:00
+
+from django.db import migrations
+from django.db.models import Exists, Max, OuterRef, Subquery
+
+BACKFILL_CHUNK_SIZE = 5000
+
+
+def _backfill(model, room_model):
+    """Sets room_id from (hotel_id, room_number) in primary-key ranges, one UPDATE per chunk."""
+    matching_room = Subquery(
+        room_model.objects.filter(hotel=OuterRef('hotel'), room_number=OuterRef('room_number')).values('pk')[:1]
+    )
+    last_pk = model.objects.aggregate(last=Max('pk'))['last'] or 0
+    for start in range(0, last_pk + 1, BACKFILL_CHUNK_SIZE):
+        model.objects.filter(
+            pk__gte=start, pk__lt=start + BACKFILL_CHUNK_SIZE, room__isnull=True,
+        ).update(room=matching_room)
+
+
+def backfill_rooms(apps, schema_editor):
+    """
+    Resolves the existing room_number strings to Room rows. Stays whose room was never
+    created (rows older than the assignment form's get-or-create) get their Room first, as
+    the form would have; requests for unknown rooms are left unlinked.
+    """
+    Room = apps.get_model('main', 'Room')
+    GuestRoomAssignment = apps.get_model('main', 'GuestRoomAssignment')
+    GuestRequest = apps.get_model('main', 'GuestRequest')
+
+    missing = (
+        GuestRoomAssignment.objects.filter(
+            ~Exists(Room.objects.filter(hotel=OuterRef('hotel'), room_number=OuterRef('room_number'))),
+        ).order_by().values_list('hotel_id', 'room_number').distinct()
+    )
+    Room.objects.bulk_create(
+        [Room(hotel_id=hotel_id, room_number=room_number, status='available') for hotel_id, room_number in missing],
+        batch_size=BACKFILL_CHUNK_SIZE, ignore_conflicts=True,
+    )
+    _backfill(GuestRoomAssignment, Room)
+    _backfill(GuestRequest, Room)
+
+
+class Migration(migrations.Migration):
+    # Each chunk's UPDATE commits on its own, so PostgreSQL doesn't hold row locks on every
+    # stay and request until the end. Safe to re-run: chunks only touch rows without a room.
+    atomic = False
+
+    dependencies = [
+        ('main', '0017_room_foreign_keys'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_rooms, migrations.RunPython.noop),
+    ]
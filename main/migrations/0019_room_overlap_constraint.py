@@ -0,0 +1,82 @@
+# Generated by Django 5.1.7 on 2026-10-19 10:00
+
+from django.db import migrations
+from django.db.models import Exists, OuterRef
+
+# Frozen copies of main/bookings.py:OVERLAP_CONSTRAINT and main/availability.py:NON_OCCUPYING_STATUSES.
+OVERLAP_CONSTRAINT = 'gra_no_room_overlap'
+NON_OCCUPYING_STATUSES = ('cancelled', 'no_show')
+
+
+def detach_overlapping_stays(apps, schema_editor):
+    """
+    Stays saved before overlaps were enforced may already double-book a room, and the
+    constraint can't be added while any do. For each such room, stays are kept in the order
+    they were created, and each one that overlaps a stay already kept is unlinked from its
+    Room (room_id set to NULL). Its room_number, guests and bill are untouched. Unlinked stays
+    no longer hold the room; they're listed in the migrate output so staff can rebook them.
+    """
+    GuestRoomAssignment = apps.get_model('main', 'GuestRoomAssignment')
+    occupying = GuestRoomAssignment.objects.filter(room__isnull=False).exclude(status__in=NON_OCCUPYING_STATUSES)
+    clashing_rooms = occupying.filter(Exists(
+        occupying.filter(
+            room=OuterRef('room'),
+            check_in_time__lt=OuterRef('check_out_time'),
+            check_out_time__gt=OuterRef('check_in_time'),
+        ).exclude(pk=OuterRef('pk'))
+    )).order_by().values_list('room_id', flat=True).distinct()
+
+    detached = []
+    for room_id in list(clashing_rooms):
+        kept = []
+        for stay in occupying.filter(room_id=room_id).order_by('pk'):
+            if any(stay.check_in_time < check_out and check_in < stay.check_out_time for check_in, check_out in kept):
+                detached.append(stay)
+            else:
+                kept.append((stay.check_in_time, stay.check_out_time))
+    if not detached:
+        return
+
+    GuestRoomAssignment.objects.filter(pk__in=[stay.pk for stay in detached]).update(room=None)
+    print(f"\n  Unlinked {len(detached)} overlapping stay(s) from their room; rebook them:")
+    for stay in detached:
+        print(f"    stay {stay.pk} (hotel {stay.hotel_id}, room {stay.room_number}, "
+              f"{stay.check_in_time.isoformat()} to {stay.check_out_time.isoformat()}, {stay.guest_names})")
+
+
+def add_overlap_constraint(apps, schema_editor):
+    """
+    PostgreSQL only: rejects any two occupying stays of the same room whose [check-in,
+    check-out) ranges intersect. Cancelled and no-show stays don't hold the room, so they're
+    left out of the constraint. btree_gist lets the GiST index compare room_id with '='.
+    SQLite has no equivalent; main/bookings.py:save_assignment serializes bookings there instead.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    statuses = ', '.join(f"'{status}'" for status in NON_OCCUPYING_STATUSES)
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+        cursor.execute(
+            f'ALTER TABLE main_guestroomassignment ADD CONSTRAINT {OVERLAP_CONSTRAINT} '
+            f"EXCLUDE USING gist (room_id WITH =, tstzrange(check_in_time, check_out_time, '[)') WITH &&) "
+            f'WHERE (status NOT IN ({statuses}))'
+        )
+
+
+def drop_overlap_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE main_guestroomassignment DROP CONSTRAINT IF EXISTS {OVERLAP_CONSTRAINT}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0018_backfill_room_foreign_keys'),
+    ]
+
+    operations = [
+        migrations.RunPython(detach_overlapping_stays, migrations.RunPython.noop),
+        migrations.RunPython(add_overlap_constraint, drop_overlap_constraint),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.1.7 on 2026-10-19 10:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Frozen copy of main/search.py:REQUEST_TSVECTOR_SQL.
+REQUEST_TSVECTOR_SQL = (
+    "to_tsvector('simple', room_number || ' ' || coalesce(raw_text, '') || ' ' || coalesce(staff_notes, '') || ' ' || "
+    "coalesce(conci_response_text, '') || ' ' || coalesce(chat_history #>> '{}', ''))"
+)
+
+
+def create_archive_search_index(apps, schema_editor):
+    """
+    PostgreSQL only: the same tsvector GIN index as main_guestrequest_search_tsv, so text
+    filters on the archive tab stay indexed. On SQLite archived rows keep their FTS5 entries.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE INDEX IF NOT EXISTS main_archreq_search_tsv ON main_archivedguestrequest '
+            f'USING gin ({REQUEST_TSVECTOR_SQL})'
+        )
+
+
+def drop_archive_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('DROP INDEX IF EXISTS main_archreq_search_tsv')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0019_room_overlap_constraint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hotel',
+            name='request_retention_days',
+            field=models.PositiveIntegerField(blank=True, help_text='Closed guest requests older than this many days are moved to the archive table (blank: the GUEST_REQUEST_RETENTION_DAYS setting).', null=True),
+        ),
+        migrations.CreateModel(
+            name='ArchivedGuestRequest',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('room_number', models.CharField(max_length=10)),
+                ('raw_text', models.TextField()),
+                ('ai_intent', models.CharField(blank=True, max_length=255, null=True)),
+                ('ai_entities', models.JSONField(blank=True, null=True)),
+                ('conci_response_text', models.TextField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('in_progress', 'In Progress'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('request_type', models.CharField(choices=[('maintenance', 'Maintenance'), ('repairs', 'Repairs'), ('housekeeping', 'Housekeeping'), ('room_service', 'Room Service'), ('concierge', 'Concierge'), ('amenity_request', 'Amenity Request'), ('general_inquiry', 'General Inquiry'), ('casual_chat', 'Casual Chat')], max_length=50)),
+                ('staff_notes', models.TextField(blank=True, null=True)),
+                ('timestamp', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('amenity_quantity', models.IntegerField(default=1)),
+                ('bill_added', models.BooleanField(default=False)),
+                ('chat_history', models.JSONField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('amenity_requested', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_requests', to='main.amenity')),
+                ('assigned_staff', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_requests', to='main.staffmember')),
+                ('hotel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_requests', to='main.hotel')),
+                ('room', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_requests', to='main.room')),
+            ],
+            options={
+                'ordering': ['-timestamp'],
+                'indexes': [models.Index(fields=['hotel', '-timestamp'], name='archreq_hotel_ts_idx')],
+            },
+        ),
+        migrations.RunPython(create_archive_search_index, drop_archive_search_index),
+    ]
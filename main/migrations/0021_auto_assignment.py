@@ -0,0 +1,61 @@
+# Generated by Django 5.1.7 on 2026-10-19 10:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+# Frozen copy of main/routing.py:OPEN_STATUSES.
+OPEN_STATUSES = ('pending', 'in_progress')
+
+
+def count_open_tasks(apps, schema_editor):
+    """Seeds StaffMember.open_task_count from the requests currently assigned and open."""
+    GuestRequest = apps.get_model('main', 'GuestRequest')
+    StaffMember = apps.get_model('main', 'StaffMember')
+    counts = (
+        GuestRequest.objects.filter(status__in=OPEN_STATUSES, assigned_staff__isnull=False)
+        .order_by().values_list('assigned_staff').annotate(n=Count('pk'))
+    )
+    for staff_id, count in counts:
+        StaffMember.objects.filter(pk=staff_id).update(open_task_count=count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0020_guest_request_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hotel',
+            name='auto_assign_requests',
+            field=models.BooleanField(default=True, help_text='Assign new actionable guest requests to the least-loaded matching staff member (main/routing.py).'),
+        ),
+        migrations.AddField(
+            model_name='staffmember',
+            name='accepts_auto_assignment',
+            field=models.BooleanField(default=True, help_text='Untick for staff off shift; they keep their tasks but get no new ones.'),
+        ),
+        migrations.AddField(
+            model_name='staffmember',
+            name='open_task_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='AssignmentRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('request_type', models.CharField(choices=[('maintenance', 'Maintenance'), ('repairs', 'Repairs'), ('housekeeping', 'Housekeeping'), ('room_service', 'Room Service'), ('concierge', 'Concierge'), ('amenity_request', 'Amenity Request'), ('general_inquiry', 'General Inquiry'), ('casual_chat', 'Casual Chat')], max_length=50)),
+                ('staff_category', models.CharField(choices=[('housekeeping', 'Housekeeping'), ('maintenance', 'Maintenance'), ('concierge', 'Concierge'), ('front_desk', 'Front Desk'), ('room_service', 'Room Service'), ('general_inquiry', 'General Inquiry'), ('amenity_request', 'Amenity Request'), ('general', 'General/All')], max_length=50)),
+                ('priority', models.PositiveSmallIntegerField(default=0, help_text='Lower priorities are tried first.')),
+                ('max_open_tasks', models.PositiveIntegerField(blank=True, help_text='Skip staff already holding this many open tasks (blank: no limit).', null=True)),
+                ('hotel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='assignment_rules', to='main.hotel')),
+            ],
+            options={
+                'ordering': ['hotel', 'request_type', 'priority'],
+                'unique_together': {('hotel', 'request_type', 'staff_category')},
+            },
+        ),
+        migrations.RunPython(count_open_tasks, migrations.RunPython.noop),
+    ]
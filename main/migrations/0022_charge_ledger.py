@@ -0,0 +1,30 @@
+# Generated by Django 5.1.7 on 2026-10-19 10:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0021_auto_assignment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Charge',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('guest_request_id', models.BigIntegerField(blank=True, null=True)),
+                ('description', models.CharField(max_length=255)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('assignment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='charges', to='main.guestroomassignment')),
+            ],
+            options={
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['assignment', 'created_at'], name='charge_assignment_ts_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('guest_request_id__isnull', False)), fields=('guest_request_id',), name='charge_once_per_request')],
+            },
+        ),
+    ]
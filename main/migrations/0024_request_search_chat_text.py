@@ -0,0 +1,85 @@
+# Generated by Django 5.1.7 on 2026-10-19 12:00
+
+from django.db import migrations
+
+# Frozen copies of the definitions in main/search.py. chat_history holds a JSON-encoded string
+# (or a list) of {"role", "parts": [{"text"}]} messages; indexing its JSON text made every
+# request match "user", "text", "parts"... on PostgreSQL. Index only the message texts.
+CHAT_HISTORY_TEXT_FUNCTION = r"""
+CREATE OR REPLACE FUNCTION main_chat_history_text(history jsonb) RETURNS text
+LANGUAGE plpgsql IMMUTABLE PARALLEL SAFE AS $$
+DECLARE
+    doc jsonb := history;
+BEGIN
+    IF jsonb_typeof(doc) = 'string' THEN
+        BEGIN
+            doc := (history #>> '{}')::jsonb;
+        EXCEPTION WHEN invalid_text_representation THEN
+            -- Not JSON: plain text, indexed as is.
+            RETURN history #>> '{}';
+        END;
+    END IF;
+    IF jsonb_typeof(doc) = 'object' THEN
+        doc := jsonb_build_array(doc);
+    END IF;
+    IF jsonb_typeof(doc) IS DISTINCT FROM 'array' THEN
+        RETURN '';
+    END IF;
+    RETURN coalesce((
+        SELECT string_agg(part ->> 'text', E'\n')
+        FROM jsonb_array_elements(doc) AS message,
+             jsonb_array_elements(
+                 CASE WHEN jsonb_typeof(message -> 'parts') = 'array' THEN message -> 'parts' ELSE '[]'::jsonb END
+             ) AS part
+        WHERE jsonb_typeof(part) = 'object' AND part ->> 'text' <> ''
+    ), '');
+END;
+$$
+"""
+REQUEST_TSVECTOR_SQL = (
+    "to_tsvector('simple', room_number || ' ' || coalesce(raw_text, '') || ' ' || coalesce(staff_notes, '') || ' ' || "
+    "coalesce(conci_response_text, '') || ' ' || main_chat_history_text(chat_history))"
+)
+# The expression of migrations 0015/0020, for reversing.
+OLD_REQUEST_TSVECTOR_SQL = (
+    "to_tsvector('simple', room_number || ' ' || coalesce(raw_text, '') || ' ' || coalesce(staff_notes, '') || ' ' || "
+    "coalesce(conci_response_text, '') || ' ' || coalesce(chat_history #>> '{}', ''))"
+)
+SEARCH_INDEXES = (
+    ('main_guestrequest_search_tsv', 'main_guestrequest'),
+    ('main_archreq_search_tsv', 'main_archivedguestrequest'),
+)
+
+
+def _recreate_indexes(cursor, tsvector_sql):
+    for index, table in SEARCH_INDEXES:
+        cursor.execute(f'DROP INDEX IF EXISTS {index}')
+        cursor.execute(f'CREATE INDEX {index} ON {table} USING gin ({tsvector_sql})')
+
+
+def index_chat_text(apps, schema_editor):
+    """PostgreSQL only; the SQLite FTS5 tables already hold the flattened chat text."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(CHAT_HISTORY_TEXT_FUNCTION)
+        _recreate_indexes(cursor, REQUEST_TSVECTOR_SQL)
+
+
+def index_chat_json(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        _recreate_indexes(cursor, OLD_REQUEST_TSVECTOR_SQL)
+        cursor.execute('DROP FUNCTION IF EXISTS main_chat_history_text(jsonb)')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0023_version_stamps'),
+    ]
+
+    operations = [
+        migrations.RunPython(index_chat_text, index_chat_json),
+    ]
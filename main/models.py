@@ -8,6 +8,13 @@ import json # Import json for JSONField handling
 class Hotel(models.Model):
     name = models.CharField(max_length=255)
     total_rooms = models.IntegerField(default=0)
+    request_retention_days = models.PositiveIntegerField(
+        null=True, blank=True,
+        help_text="Closed guest requests older than this many days are moved to the archive table "
+                  "(blank: the GUEST_REQUEST_RETENTION_DAYS setting).")
+    auto_assign_requests = models.BooleanField(
+        default=True,
+        help_text="Assign new actionable guest requests to the least-loaded matching staff member (main/routing.py).")
     # Add other hotel-specific settings as needed
 
     def __str__(self):
@@ -41,6 +48,10 @@ class StaffMember(models.Model):
     ]
     category = models.CharField(max_length=50, choices=CATEGORY_CHOICES, default='general',
                                 help_text="Category of staff member, defines types of requests they can handle.")
+    accepts_auto_assignment = models.BooleanField(default=True,
+                                                  help_text="Untick for staff off shift; they keep their tasks but get no new ones.")
+    # Pending/in-progress requests assigned to this staff member, kept current by main/signals.py.
+    open_task_count = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
         verbose_name = "Staff Member"
@@ -109,7 +120,11 @@ class GuestRoomAssignment(models.Model):
         ('no_show', 'No Show'),
     ]
     hotel = models.ForeignKey(Hotel, on_delete=models.CASCADE, related_name='guest_assignments')
-    room_number = models.CharField(max_length=1000) # Denormalized for easy lookup, should match a Room object
+    room_number = models.CharField(max_length=1000) # Denormalized for display and search, mirrors room.room_number
+    # Joins to the room (and from requests to their room's stays) go through this FK, not the string.
+    # db_index is off because gra_room_stay_idx starts with room_id.
+    room = models.ForeignKey(Room, on_delete=models.SET_NULL, null=True, blank=True, db_index=False,
+                             related_name='assignments')
     guest_names = models.TextField(help_text="Full names of guests, separated by commas if more than one.")
     check_in_time = models.DateTimeField()
     check_out_time = models.DateTimeField()
@@ -122,6 +137,45 @@ class GuestRoomAssignment(models.Model):
 
     class Meta:
         ordering = ['check_in_time']
+        indexes = [
+            # Room lookups, the overlap check and "current stay" billing lookups.
+            models.Index(fields=['hotel', 'room_number', 'check_in_time', 'check_out_time'], name='gra_hotel_room_stay_idx'),
+            # Guest management tab: status filter and newest-first keyset paging.
+            models.Index(fields=['hotel', 'status', 'check_in_time'], name='gra_hotel_status_checkin_idx'),
+            models.Index(fields=['hotel', '-check_in_time'], name='gra_hotel_checkin_idx'),
+            # Home tab KPIs only read rows created or checking out inside the chart window.
+            models.Index(fields=['hotel', 'created_at'], name='gra_hotel_created_idx'),
+            models.Index(fields=['hotel', 'check_out_time'], name='gra_hotel_checkout_idx'),
+            # Overlap checks, current stay and the first stay of a request's room, by room FK.
+            models.Index(fields=['room', 'check_in_time', 'check_out_time'], name='gra_room_stay_idx'),
+        ]
+
+class Charge(models.Model):
+    """
+    One line of a stay's bill (append-only). main/billing.py inserts a row and bumps
+    GuestRoomAssignment.total_bill_amount in the same transaction as the change that caused it.
+    """
+    assignment = models.ForeignKey(GuestRoomAssignment, on_delete=models.CASCADE, related_name='charges')
+    # The billed GuestRequest's id; not a foreign key so billed requests can still be archived.
+    guest_request_id = models.BigIntegerField(null=True, blank=True)
+    description = models.CharField(max_length=255)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['assignment', 'created_at'], name='charge_assignment_ts_idx'),
+        ]
+        constraints = [
+            # A request is billed at most once, however many completions race.
+            models.UniqueConstraint(fields=['guest_request_id'], condition=models.Q(guest_request_id__isnull=False),
+                                    name='charge_once_per_request'),
+        ]
+
+    def __str__(self):
+        return f"{self.description}: {self.amount}"
+
 
 class GuestRequest(models.Model):
     STATUS_CHOICES = [
@@ -144,6 +198,9 @@ class GuestRequest(models.Model):
 
     hotel = models.ForeignKey(Hotel, on_delete=models.CASCADE, related_name='guest_requests')
     room_number = models.CharField(max_length=10) # Denormalized
+    # Null when the guest URL's room has no Room row yet; linked when that Room is created.
+    room = models.ForeignKey(Room, on_delete=models.SET_NULL, null=True, blank=True, db_index=False,
+                             related_name='guest_requests')
     raw_text = models.TextField(help_text="The original raw text message from the guest.")
     ai_intent = models.CharField(max_length=255, blank=True, null=True,
                                  help_text="AI's determined intent of the request.")
@@ -181,7 +238,125 @@ class GuestRequest(models.Model):
 
     class Meta:
         ordering = ['-timestamp'] # Order by newest first
+        indexes = [
+            # Latest request for a room (guest chat and update polling).
+            models.Index(fields=['hotel', 'room_number', '-timestamp'], name='guestreq_hotel_room_ts_idx'),
+            models.Index(fields=['room', '-timestamp'], name='guestreq_room_ts_idx'),
+            # Active/archive tabs and exports filtered by status, newest first.
+            models.Index(fields=['hotel', 'status', '-timestamp'], name='guestreq_hotel_status_ts_idx'),
+            # "All" tab and date-range filters.
+            models.Index(fields=['hotel', '-timestamp'], name='guestreq_hotel_ts_idx'),
+            # Employee dashboard: a staff member's open tasks.
+            models.Index(fields=['assigned_staff', 'status'], name='guestreq_staff_status_idx'),
+            # New-request polling only ever counts pending rows.
+            models.Index(fields=['hotel', 'timestamp'], condition=models.Q(status='pending'), name='guestreq_pending_idx'),
+        ]
 
     def __str__(self):
         # type: ignore comment is for my internal linter, you can remove it if your setup doesn't need it
         return f"Request from Room {self.room_number} - {self.raw_text[:50]}... ({self.get_status_display()})" # type: ignore
+
+
+class AssignmentRule(models.Model):
+    """
+    Routes a hotel's new requests of one type to staff of one category. A hotel's rules for a
+    type are tried by priority; without any, requests go to the category named like the type.
+    General staff are always the last resort.
+    """
+    hotel = models.ForeignKey(Hotel, on_delete=models.CASCADE, related_name='assignment_rules')
+    request_type = models.CharField(max_length=50, choices=GuestRequest.REQUEST_TYPE_CHOICES)
+    staff_category = models.CharField(max_length=50, choices=StaffMember.CATEGORY_CHOICES)
+    priority = models.PositiveSmallIntegerField(default=0, help_text="Lower priorities are tried first.")
+    max_open_tasks = models.PositiveIntegerField(
+        null=True, blank=True,
+        help_text="Skip staff already holding this many open tasks (blank: no limit).")
+
+    class Meta:
+        unique_together = ('hotel', 'request_type', 'staff_category')
+        ordering = ['hotel', 'request_type', 'priority']
+
+    def __str__(self):
+        return f"{self.hotel.name}: {self.get_request_type_display()} -> {self.get_staff_category_display()}" # type: ignore
+
+
+class ArchivedGuestRequest(models.Model):
+    """
+    Closed GuestRequest rows moved out of the hot table by main/archive.py once they pass the
+    hotel's retention period. Same columns and ids as GuestRequest, so archived requests can
+    be listed, searched and opened alongside live ones.
+    """
+    STATUS_CHOICES = GuestRequest.STATUS_CHOICES
+    REQUEST_TYPE_CHOICES = GuestRequest.REQUEST_TYPE_CHOICES
+
+    id = models.BigIntegerField(primary_key=True) # The GuestRequest id, kept
+    hotel = models.ForeignKey(Hotel, on_delete=models.CASCADE, related_name='archived_requests')
+    room_number = models.CharField(max_length=10)
+    room = models.ForeignKey(Room, on_delete=models.SET_NULL, null=True, blank=True, related_name='archived_requests')
+    raw_text = models.TextField()
+    ai_intent = models.CharField(max_length=255, blank=True, null=True)
+    ai_entities = models.JSONField(blank=True, null=True)
+    conci_response_text = models.TextField(blank=True, null=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES)
+    request_type = models.CharField(max_length=50, choices=REQUEST_TYPE_CHOICES)
+    staff_notes = models.TextField(blank=True, null=True)
+    timestamp = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    assigned_staff = models.ForeignKey(StaffMember, on_delete=models.SET_NULL, null=True, blank=True,
+                                       related_name='archived_requests')
+    amenity_requested = models.ForeignKey(Amenity, on_delete=models.SET_NULL, null=True, blank=True,
+                                          related_name='archived_requests')
+    amenity_quantity = models.IntegerField(default=1)
+    bill_added = models.BooleanField(default=False)
+    chat_history = models.JSONField(blank=True, null=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-timestamp']
+        indexes = [
+            # The archive tab pages through a hotel's history newest first.
+            models.Index(fields=['hotel', '-timestamp'], name='archreq_hotel_ts_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived request from Room {self.room_number} - {self.raw_text[:50]}..."
+
+
+class HotelStats(models.Model):
+    """
+    Materialized home-tab KPIs for one hotel on one local day.
+    Today's row is maintained incrementally by the signals in main/signals.py and
+    rebuilt from scratch by `manage.py reconcile_hotel_stats` to repair any drift.
+    """
+    hotel = models.ForeignKey(Hotel, on_delete=models.CASCADE, related_name='daily_stats')
+    day = models.DateField(help_text="Local date these statistics describe.")
+    occupied_rooms = models.IntegerField(default=0)
+    reserved_rooms = models.IntegerField(default=0)
+    not_ready_rooms = models.IntegerField(default=0)
+    new_bookings_count = models.IntegerField(default=0)
+    check_ins_today_count = models.IntegerField(default=0)
+    check_outs_today_count = models.IntegerField(default=0)
+    total_requests_count = models.IntegerField(default=0)
+    reservations_chart_data = models.JSONField(default=list, blank=True,
+                                               help_text="Booked/cancelled counts for the 7 days ending on this day.")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('hotel', 'day')
+        verbose_name = "Hotel Stats"
+        verbose_name_plural = "Hotel Stats"
+        ordering = ['-day']
+
+    def __str__(self):
+        return f"{self.hotel.name} stats for {self.day}"
+
+
+class VersionStamp(models.Model):
+    """
+    Version stamps of the per-process snapshots (availability index, amenity catalog, ...)
+    when there is no shared cache to keep them in; see main/versions.py.
+    """
+    key = models.CharField(max_length=100, primary_key=True)
+    version = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.key} = {self.version}"
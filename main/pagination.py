@@ -0,0 +1,145 @@
+# main/pagination.py
+
+import base64
+import binascii
+import json
+from urllib.parse import urlencode
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 50
+
+# Keyset orderings used by the dashboard lists. Each entry is (field_name, descending).
+# The last field must be unique (the primary key) so every row has a distinct position.
+REQUEST_PAGE_ORDERING = [('timestamp', True), ('id', False)]
+ASSIGNMENT_PAGE_ORDERING = [('check_in_time', True), ('id', False)]
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded for the given ordering."""
+
+
+def _cursor_value(value):
+    # Full isoformat keeps microseconds; DjangoJSONEncoder would round them to milliseconds
+    # and the seek would then skip rows sharing the truncated timestamp.
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def encode_cursor(values):
+    """
+    Encodes the ordering values of the last row on a page into an opaque, URL-safe token.
+    """
+    payload = json.dumps([_cursor_value(v) for v in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, model, ordering):
+    """
+    Decodes a cursor produced by encode_cursor back into typed field values.
+    Raises InvalidCursor if the token is malformed or does not match the ordering
+    (wrong length, nulls, or values the fields can't hold).
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    except (binascii.Error, UnicodeError, ValueError) as e:
+        raise InvalidCursor(f"Malformed cursor: {e}")
+
+    if not isinstance(values, list) or len(values) != len(ordering):
+        raise InvalidCursor("Cursor does not match the list ordering.")
+
+    decoded = []
+    for (field_name, _descending), value in zip(ordering, values):
+        field = model._meta.get_field(field_name)
+        try:
+            value = field.to_python(value)
+            if value is None:
+                raise InvalidCursor("Cursor values can't be null.")
+            # Range validators, e.g. so an id too big for the column isn't sent to the database.
+            field.run_validators(value)
+        except (ValidationError, TypeError, ValueError) as e:
+            raise InvalidCursor(f"Invalid cursor value: {e}")
+        decoded.append(value)
+    return decoded
+
+
+def _seek_filter(ordering, values):
+    """
+    Builds the Q object selecting rows strictly after `values` in `ordering`, i.e.
+    (a < a0) OR (a = a0 AND b > b0) ... with the comparison flipped for descending fields.
+    """
+    seek = Q()
+    equal_prefix = {}
+    for (field_name, descending), value in zip(ordering, values):
+        lookup = f"{field_name}__{'lt' if descending else 'gt'}"
+        seek |= Q(**equal_prefix, **{lookup: value})
+        equal_prefix[field_name] = value
+    return seek
+
+
+def keyset_paginate(queryset, ordering, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Returns one page of `queryset` using seek pagination instead of OFFSET.
+
+    Args:
+        queryset (QuerySet): The already-filtered queryset to page through.
+        ordering (list): (field_name, descending) pairs, ending with a unique field.
+        cursor (str): Opaque cursor from a previous page, or None for the first page.
+        page_size (int): Maximum number of rows to return.
+    Returns:
+        tuple: (list of model instances, next cursor string or None if this is the last page).
+    Raises InvalidCursor for a cursor that doesn't decode for `ordering`; views answer 400.
+    """
+    if cursor:
+        values = decode_cursor(cursor, queryset.model, ordering)
+        queryset = queryset.filter(_seek_filter(ordering, values))
+
+    order_by = [f"-{name}" if descending else name for name, descending in ordering]
+    # Fetch one extra row to find out whether there is a next page without a COUNT(*).
+    rows = list(queryset.order_by(*order_by)[:page_size + 1])
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, name) for name, _descending in ordering)
+    return rows, next_cursor
+
+
+def keyset_paginate_tiers(querysets, ordering, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    keyset_paginate over several querysets with the same ordering fields and disjoint unique
+    keys (e.g. live and archived guest requests), returning one merged page.
+    Each queryset contributes at most page_size + 1 rows from the same cursor position.
+    """
+    values = decode_cursor(cursor, querysets[0].model, ordering) if cursor else None
+
+    order_by = [f"-{name}" if descending else name for name, descending in ordering]
+    rows = []
+    for queryset in querysets:
+        if values is not None:
+            queryset = queryset.filter(_seek_filter(ordering, values))
+        rows.extend(queryset.order_by(*order_by)[:page_size + 1])
+    # Stable sorts from the last ordering field to the first give the combined order.
+    for name, descending in reversed(ordering):
+        rows.sort(key=lambda row: getattr(row, name), reverse=descending)
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, name) for name, _descending in ordering)
+    return rows, next_cursor
+
+
+def page_querystring(filter_params, cursor):
+    """
+    Builds the query string for a page link, keeping the active filters alongside the cursor.
+    """
+    params = dict(filter_params or {})
+    if cursor:
+        params['cursor'] = cursor
+    return urlencode(params)
@@ -0,0 +1,185 @@
+# main/provisioning.py
+
+import csv
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+
+from .fragments import invalidate_fragments
+from .models import StaffMember, UserProfile
+
+# Bulk staff onboarding. Creating staff one at a time runs create_or_update_user_profile per
+# user (a Hotel query, prints, and a profile linked to whichever hotel comes first) and hashes
+# each password in turn. Here rows are validated in memory, passwords are hashed in a process
+# pool (PBKDF2 is deliberately slow and holds the GIL), and users, profiles and staff members
+# are written with bulk_create in one transaction, so no model signals run; the cache
+# invalidation they would have done is done once at the end.
+
+PROVISION_BATCH_SIZE = 500
+# Below this many passwords, starting worker processes costs more than it saves.
+HASH_POOL_THRESHOLD = 8
+# Expected columns/keys: username, password, and optionally email, first_name, last_name,
+# category (default general) and accepts_auto_assignment (default true). Rows without a
+# password get an unusable one, to be set through a password reset.
+VALID_CATEGORIES = {value for value, _label in StaffMember.CATEGORY_CHOICES}
+FALSE_VALUES = {'0', 'false', 'no', 'n', 'off'}
+
+
+class StaffFileError(ValueError):
+    """Raised when a staff file can't be read at all (as opposed to individual bad rows)."""
+
+
+class StaffConflictError(Exception):
+    """Raised by provision_staff when a username was taken while the file was being provisioned."""
+
+
+def read_staff_records(content, file_format):
+    """Parses CSV (with a header row) or a JSON list of objects into a list of dicts."""
+    if isinstance(content, bytes):
+        try:
+            content = content.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            raise StaffFileError('Staff files must be UTF-8 encoded.')
+    if file_format == 'json':
+        try:
+            records = json.loads(content)
+        except ValueError as e:
+            raise StaffFileError(f'Invalid JSON: {e}')
+        if not isinstance(records, list) or not all(isinstance(record, dict) for record in records):
+            raise StaffFileError('JSON staff files must be a list of staff objects.')
+        return records
+    if file_format == 'csv':
+        return list(csv.DictReader(io.StringIO(content)))
+    raise StaffFileError(f"Unknown staff file format '{file_format}'; use csv or json.")
+
+
+def clean_staff_record(record):
+    """
+    Validates one staff record the way the user and staff admin forms would, without queries.
+    Returns (staff dict, list of error messages).
+    """
+    errors = []
+    username = str(record.get('username') or '').strip()
+    user_fields = {
+        'username': username,
+        'email': str(record.get('email') or '').strip(),
+        'first_name': str(record.get('first_name') or '').strip(),
+        'last_name': str(record.get('last_name') or '').strip(),
+    }
+    for field_name, value in user_fields.items():
+        field = User._meta.get_field(field_name)
+        try:
+            field.clean(value, None)
+        except ValidationError as e:
+            errors.extend(f'{field_name}: {message}' for message in e.messages)
+
+    password = str(record.get('password') or '')
+    if password:
+        try:
+            validate_password(password, user=User(**user_fields))
+        except ValidationError as e:
+            errors.extend(f'password: {message}' for message in e.messages)
+
+    category = str(record.get('category') or 'general').strip()
+    if category not in VALID_CATEGORIES:
+        errors.append(f"Unknown category '{category}'.")
+    accepts = str(record.get('accepts_auto_assignment', '')).strip().lower() not in FALSE_VALUES
+
+    staff = {
+        'user': user_fields, 'password': password,
+        'category': category, 'accepts_auto_assignment': accepts,
+    }
+    return staff, errors
+
+
+def hash_passwords(passwords, workers=None):
+    """make_password for each password, in a process pool when there are enough of them."""
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers < 2 or len(passwords) < HASH_POOL_THRESHOLD:
+        return [make_password(password or None) for password in passwords]
+    # Workers run django.setup() so the hasher settings load under the spawn start method too.
+    with ProcessPoolExecutor(max_workers=min(workers, len(passwords)), initializer=django.setup) as pool:
+        return list(pool.map(make_password, [password or None for password in passwords],
+                             chunksize=max(1, len(passwords) // (workers * 4))))
+
+
+def provision_staff(hotel, records, dry_run=False, workers=None, batch_size=PROVISION_BATCH_SIZE):
+    """
+    Validates and creates staff accounts (User, UserProfile and StaffMember) for `hotel`.
+    Rows with errors, including usernames already taken in the file or the database, are
+    skipped and reported; all valid rows are written with bulk_create in one transaction.
+    Row numbers are 1-based positions in `records`. Raises StaffConflictError, creating
+    nothing, if another process takes one of the usernames after the check.
+
+    Returns a dict with 'created' and 'errors' ([{'row', 'errors'}, ...]).
+    """
+    errors = {}
+    valid = []
+    seen = {}
+    for row, record in enumerate(records, start=1):
+        staff, row_errors = clean_staff_record(record)
+        username = staff['user']['username']
+        if username and username in seen:
+            row_errors.append(f"Duplicate of row {seen[username]}.")
+        seen.setdefault(username, row)
+        if row_errors:
+            errors[row] = row_errors
+        else:
+            valid.append((row, staff))
+
+    usernames = [staff['user']['username'] for _row, staff in valid]
+    taken = set()
+    for start in range(0, len(usernames), batch_size):
+        taken.update(User.objects.filter(
+            username__in=usernames[start:start + batch_size],
+        ).values_list('username', flat=True))
+    for row, staff in valid:
+        if staff['user']['username'] in taken:
+            errors[row] = ['A user with that username already exists.']
+    valid = [(row, staff) for row, staff in valid if row not in errors]
+
+    report = {
+        'created': len(valid),
+        'errors': [{'row': row, 'errors': errors[row]} for row in sorted(errors)],
+    }
+    if dry_run or not valid:
+        return report
+
+    hashes = hash_passwords([staff['password'] for _row, staff in valid], workers=workers)
+    try:
+        with transaction.atomic():
+            users = User.objects.bulk_create(
+                [User(password=hashed, **staff['user']) for (_row, staff), hashed in zip(valid, hashes)],
+                batch_size=batch_size,
+            )
+            UserProfile.objects.bulk_create(
+                [UserProfile(user=user, hotel=hotel) for user in users], batch_size=batch_size,
+            )
+            StaffMember.objects.bulk_create(
+                [
+                    StaffMember(user=user, hotel=hotel, category=staff['category'],
+                                accepts_auto_assignment=staff['accepts_auto_assignment'])
+                    for user, (_row, staff) in zip(users, valid)
+                ],
+                batch_size=batch_size,
+            )
+            # bulk_create skips model signals; new users have no cached hotel context yet, so only
+            # the staff dropdowns and request cards need refreshing.
+            transaction.on_commit(lambda: invalidate_fragments(hotel.pk, 'staff_list', 'grouped_requests'))
+    except IntegrityError as e:
+        # The username check above is a plain read; a concurrent signup can still win the race.
+        if 'username' in str(e):
+            raise StaffConflictError(
+                'A username in this file was taken while it was being provisioned; nothing was created. Try again.'
+            ) from e
+        raise
+    return report
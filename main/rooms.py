@@ -0,0 +1,59 @@
+# main/rooms.py
+
+from django.db.models import OuterRef, Subquery
+
+from .models import GuestRequest, GuestRoomAssignment, Room
+
+# GuestRoomAssignment and GuestRequest keep their room_number string for display, search
+# and exports, but every join goes through the integer `room` FK.
+
+
+def matching_room_id():
+    """A subquery resolving an outer row's (hotel, room_number) to its Room id, for .update()."""
+    return Subquery(
+        Room.objects.filter(hotel=OuterRef('hotel'), room_number=OuterRef('room_number')).values('pk')[:1]
+    )
+
+
+def link_room_rows(hotel_id, room_numbers):
+    """
+    Points unlinked assignments and requests of the given room numbers at their Room. Called
+    when rooms are created, since guests can message from a room before it has a Room row.
+    """
+    for model in (GuestRoomAssignment, GuestRequest):
+        model.objects.filter(
+            hotel_id=hotel_id, room_number__in=list(room_numbers), room__isnull=True,
+        ).update(room=matching_room_id())
+
+
+def resolve_room(instance):
+    """Sets instance.room from its hotel and room_number (None if that room doesn't exist yet)."""
+    instance.room_id = Room.objects.filter(
+        hotel_id=instance.hotel_id, room_number=instance.room_number,
+    ).values_list('pk', flat=True).first()
+
+
+def room_filter(hotel, room_number):
+    """
+    Filter kwargs selecting a guest URL's rows: the Room FK when the room exists, otherwise
+    the hotel and room_number string (rows of unknown rooms have no room yet).
+    """
+    room = Room.objects.filter(hotel=hotel, room_number=room_number).only('pk').first()
+    if room:
+        return {'room': room}
+    return {'hotel': hotel, 'room_number': room_number}
+
+
+def first_assignments_by_room(room_ids):
+    """
+    Returns {room_id: earliest-check-in assignment} for the given rooms: the assignment the
+    request cards show. Two queries however many rooms, both on gra_room_stay_idx.
+    """
+    room_ids = {room_id for room_id in room_ids if room_id}
+    if not room_ids:
+        return {}
+    first_ids = Room.objects.filter(pk__in=room_ids).annotate(first_assignment_id=Subquery(
+        GuestRoomAssignment.objects.filter(room=OuterRef('pk')).order_by('check_in_time', 'pk').values('pk')[:1]
+    )).values_list('first_assignment_id', flat=True)
+    assignments = GuestRoomAssignment.objects.in_bulk([pk for pk in first_ids if pk])
+    return {assignment.room_id: assignment for assignment in assignments.values()}
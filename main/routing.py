@@ -0,0 +1,245 @@
+# main/routing.py
+
+import heapq
+from collections import defaultdict
+
+import numpy as np
+from django.db import connection, transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import Greatest
+
+from .locking import lock_sqlite_database
+from .models import ArchivedGuestRequest, AssignmentRule, GuestRequest, StaffMember
+
+# Automatic assignment of new guest requests. Each request type maps to an ordered route of
+# staff categories (the hotel's AssignmentRule rows, or else the category named like the type),
+# always ending with general staff; the request goes to the least-loaded staff member of the
+# first category that has one under its cap. Loads are StaffMember.open_task_count, which
+# main/signals.py keeps current with per-save deltas, so picking never counts requests.
+# `manage.py reconcile_hotel_stats` repairs drift from writes that skip signals.
+
+OPEN_STATUSES = ('pending', 'in_progress')
+FALLBACK_CATEGORY = 'general'
+# Request types whose staff category has a different name.
+DEFAULT_CATEGORIES = {'repairs': 'maintenance'}
+UNROUTED_REQUEST_TYPES = ('casual_chat',)
+
+
+def hotel_routes(hotel_id, request_type=None):
+    """Returns {request_type: [(staff_category, max_open_tasks), ...]} from a hotel's rules."""
+    rules = AssignmentRule.objects.filter(hotel_id=hotel_id)
+    if request_type:
+        rules = rules.filter(request_type=request_type)
+    routes = defaultdict(list)
+    for rule_type, category, cap in rules.order_by('priority', 'pk').values_list(
+        'request_type', 'staff_category', 'max_open_tasks',
+    ):
+        routes[rule_type].append((category, cap))
+    return routes
+
+
+def route_for(routes, request_type):
+    """The (staff_category, max_open_tasks) route for a request type, with general staff last."""
+    route = list(routes.get(request_type) or [(DEFAULT_CATEGORIES.get(request_type, request_type), None)])
+    if all(category != FALLBACK_CATEGORY for category, _cap in route):
+        route.append((FALLBACK_CATEGORY, None))
+    return route
+
+
+def pick_staff(route, staff_by_category, loads):
+    """
+    Returns the id of the least-loaded staff member (lowest id on ties) in the first category
+    of `route` with anyone under its cap, or None. `staff_by_category` maps category -> staff
+    ids and `loads` maps staff id -> open tasks.
+    """
+    for category, cap in route:
+        eligible = [staff_id for staff_id in staff_by_category.get(category, ())
+                    if cap is None or loads[staff_id] < cap]
+        if eligible:
+            return min(eligible, key=lambda staff_id: (loads[staff_id], staff_id))
+    return None
+
+
+def choose_staff(hotel, request_type):
+    """Picks the StaffMember a new request of `request_type` should go to, or None. Two queries."""
+    if not hotel.auto_assign_requests or request_type in UNROUTED_REQUEST_TYPES:
+        return None
+    route = route_for(hotel_routes(hotel.pk, request_type), request_type)
+    candidates = {
+        staff.pk: staff for staff in StaffMember.objects.filter(
+            hotel=hotel, accepts_auto_assignment=True, category__in=[category for category, _cap in route],
+        ).order_by().only('pk', 'hotel_id', 'category', 'open_task_count')
+    }
+    staff_by_category = defaultdict(list)
+    for staff in candidates.values():
+        staff_by_category[staff.category].append(staff.pk)
+    loads = {staff.pk: staff.open_task_count for staff in candidates.values()}
+    staff_id = pick_staff(route, staff_by_category, loads)
+    return candidates[staff_id] if staff_id is not None else None
+
+
+# --- Work queue ---
+
+def claimable_request_types(hotel_id, category):
+    """The request types whose route includes `category`, or None (any type) for general staff."""
+    if category == FALLBACK_CATEGORY:
+        return None
+    routes = hotel_routes(hotel_id)
+    return [
+        request_type for request_type, _label in GuestRequest.REQUEST_TYPE_CHOICES
+        if request_type not in UNROUTED_REQUEST_TYPES
+        and any(route_category == category for route_category, _cap in route_for(routes, request_type))
+    ]
+
+
+def claim_next_request(staff_member):
+    """
+    Atomically takes the staff member's next job and marks it in progress: the oldest pending
+    request already assigned to them, or else the oldest unassigned pending one their category
+    handles. Returns the GuestRequest, or None if there's nothing to do.
+
+    On PostgreSQL, rows another claimer has locked are skipped (FOR UPDATE SKIP LOCKED), so
+    concurrent claims neither wait on each other nor take the same request. SQLite has no row
+    locks, so there claims are serialized by the database write lock.
+    """
+    eligible = Q(assigned_staff__isnull=True)
+    request_types = claimable_request_types(staff_member.hotel_id, staff_member.category)
+    if request_types is not None:
+        eligible &= Q(request_type__in=request_types)
+    else:
+        eligible &= ~Q(request_type__in=UNROUTED_REQUEST_TYPES)
+    pending = GuestRequest.objects.filter(hotel_id=staff_member.hotel_id, status='pending')
+
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            pending = pending.select_for_update(skip_locked=True)
+        else:
+            lock_sqlite_database(GuestRequest._meta.db_table)
+        guest_request = (
+            pending.filter(assigned_staff=staff_member).order_by('timestamp', 'pk').first()
+            or pending.filter(eligible).order_by('timestamp', 'pk').first()
+        )
+        if guest_request is None:
+            return None
+        guest_request.assigned_staff = staff_member
+        guest_request.status = 'in_progress'
+        guest_request.save()
+    return guest_request
+
+
+# --- Load counters ---
+
+def load_holder(assigned_staff_id, status):
+    """The staff member a request counts against, or None if it's unassigned or closed."""
+    return assigned_staff_id if status in OPEN_STATUSES else None
+
+
+def adjust_staff_load(staff_id, delta):
+    if staff_id is not None and delta:
+        StaffMember.objects.filter(pk=staff_id).update(open_task_count=Greatest(F('open_task_count') + delta, 0))
+
+
+def recount_staff_load(hotel):
+    """Recounts every staff member's open tasks at `hotel`. Returns {staff_id: (stored, actual)} for the ones that drifted."""
+    actual = dict(
+        GuestRequest.objects.filter(hotel=hotel, status__in=OPEN_STATUSES, assigned_staff__isnull=False)
+        .order_by().values_list('assigned_staff').annotate(n=Count('pk'))
+    )
+    drift = {}
+    for staff_id, stored in StaffMember.objects.filter(hotel=hotel).order_by().values_list('pk', 'open_task_count'):
+        if stored != actual.get(staff_id, 0):
+            drift[staff_id] = (stored, actual.get(staff_id, 0))
+    for staff_id, (_stored, count) in drift.items():
+        StaffMember.objects.filter(pk=staff_id).update(open_task_count=count)
+    return drift
+
+
+# --- Simulation ---
+
+def history_rows(hotel, since=None):
+    """
+    The hotel's routable requests, live and archived, oldest first, as
+    (request_type, status, timestamp, updated_at, assigned_staff_id) tuples.
+    """
+    rows = []
+    for model in (GuestRequest, ArchivedGuestRequest):
+        queryset = model.objects.filter(hotel=hotel).exclude(request_type__in=UNROUTED_REQUEST_TYPES)
+        if since is not None:
+            queryset = queryset.filter(timestamp__gte=since)
+        rows.extend(queryset.order_by().values_list(
+            'request_type', 'status', 'timestamp', 'updated_at', 'assigned_staff_id',
+        ).iterator(chunk_size=5000))
+    rows.sort(key=lambda row: row[2])
+    return rows
+
+
+def _replay(rows, assign):
+    """
+    Replays `rows` in arrival order. `assign(request_type, timestamp, updated_at, staff_id, loads)`
+    returns (staff id or None, seconds until assigned). A closed task stops counting against its
+    staff member at its last update, the nearest thing to a completion time the history has.
+    """
+    loads = defaultdict(int)
+    releases = []  # heap of (released_at, row position, staff id)
+    totals = defaultdict(int)
+    waits = []
+    peak = 0
+    for position, (request_type, status, timestamp, updated_at, staff_id) in enumerate(rows):
+        while releases and releases[0][0] <= timestamp:
+            _released_at, _position, released = heapq.heappop(releases)
+            loads[released] -= 1
+        chosen, wait = assign(request_type, timestamp, updated_at, staff_id, loads)
+        if chosen is None:
+            continue
+        waits.append(wait)
+        totals[chosen] += 1
+        loads[chosen] += 1
+        peak = max(peak, loads[chosen])
+        if status not in OPEN_STATUSES:
+            heapq.heappush(releases, (max(updated_at, timestamp), position, chosen))
+
+    waits = np.array(waits, dtype=float)
+    return {
+        'assigned': len(waits),
+        'unassigned': len(rows) - len(waits),
+        'median_seconds_to_assignment': float(np.percentile(waits, 50)) if len(waits) else None,
+        'p90_seconds_to_assignment': float(np.percentile(waits, 90)) if len(waits) else None,
+        'peak_open_tasks_per_staff': peak,
+        'most_tasks_per_staff': max(totals.values(), default=0),
+        'staff_used': len(totals),
+    }
+
+
+def simulate_assignment(hotel, rows, routes=None, staff=None):
+    """
+    Compares what happened to `rows` (see history_rows) with what the routing engine would have
+    done, using the hotel's current rules and auto-assignable staff unless `routes` /
+    `staff` ([(staff_id, category), ...]) are given.
+
+    Historical time-to-assignment is approximated by the request's last update (an upper bound,
+    as no assignment time is stored); routed requests are assigned on arrival.
+    """
+    if routes is None:
+        routes = hotel_routes(hotel.pk)
+    if staff is None:
+        staff = StaffMember.objects.filter(hotel=hotel, accepts_auto_assignment=True).order_by().values_list('pk', 'category')
+    staff_by_category = defaultdict(list)
+    for staff_id, category in staff:
+        staff_by_category[category].append(staff_id)
+    route_cache = {}
+
+    def historical(request_type, timestamp, updated_at, staff_id, loads):
+        if staff_id is None:
+            return None, None
+        return staff_id, max((updated_at - timestamp).total_seconds(), 0.0)
+
+    def routed(request_type, timestamp, updated_at, staff_id, loads):
+        if request_type not in route_cache:
+            route_cache[request_type] = route_for(routes, request_type)
+        return pick_staff(route_cache[request_type], staff_by_category, loads), 0.0
+
+    return {
+        'requests': len(rows),
+        'historical': _replay(rows, historical),
+        'simulated': _replay(rows, routed),
+    }
@@ -0,0 +1,345 @@
+# main/search.py
+
+import json
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+
+from .models import ArchivedGuestRequest, GuestRequest, GuestRoomAssignment
+
+# Indexed text search over guest assignments and guest requests.
+#
+# SQLite: one FTS5 table per searchable model (rowid = model id) kept in sync from
+# main/signals.py on every save/delete, and rebuilt by `manage.py rebuild_search_index`.
+# PostgreSQL: the database maintains the indexes itself (created in migrations 0014/0015/0020/0024):
+#   - pg_trgm GIN indexes on UPPER(guest_names) / UPPER(room_number), which serve the
+#     icontains filters of the guest management tab;
+#   - GIN indexes on 'simple' tsvectors for ranked prefix search and request search.
+# Any other backend falls back to plain (unindexed) icontains.
+
+ASSIGNMENT_FTS_TABLE = 'main_guestroomassignment_search'
+ASSIGNMENT_SEARCH_FIELDS = ('guest_names', 'room_number')
+# Must match the expression of the main_gra_search_tsv index exactly, or PostgreSQL won't use it.
+ASSIGNMENT_TSVECTOR_SQL = "to_tsvector('simple', guest_names || ' ' || room_number)"
+
+REQUEST_FTS_TABLE = 'main_guestrequest_search'
+REQUEST_SEARCH_FIELDS = ('room_number', 'raw_text', 'staff_notes', 'conci_response_text', 'chat_text')
+# The searchable text of a request on PostgreSQL. Only the message texts of chat_history are
+# included, through main_chat_history_text() (migration 0024: the SQL twin of chat_history_text()
+# below), so both backends match the same words.
+REQUEST_DOCUMENT_SQL = (
+    "room_number || ' ' || coalesce(raw_text, '') || ' ' || coalesce(staff_notes, '') || ' ' || "
+    "coalesce(conci_response_text, '') || ' ' || main_chat_history_text(chat_history)"
+)
+# Must match the expression of the main_guestrequest_search_tsv index exactly.
+REQUEST_TSVECTOR_SQL = f"to_tsvector('simple', {REQUEST_DOCUMENT_SQL})"
+
+DEFAULT_SEARCH_LIMIT = 20
+SNIPPET_TOKENS = 12
+# Highlight markers used inside the database; they can't occur in escaped text, so snippets
+# are HTML-escaped first and the markers swapped for <mark> tags afterwards.
+HIGHLIGHT_START, HIGHLIGHT_END = '\x02', '\x03'
+
+
+def search_backend():
+    """Returns 'fts5', 'postgres' or None (no text index) for the default database."""
+    if connection.vendor == 'sqlite':
+        return 'fts5'
+    if connection.vendor == 'postgresql':
+        return 'postgres'
+    return None
+
+
+def search_terms(text):
+    """Splits user input into lowercase word tokens; punctuation can't reach the query syntax."""
+    return re.findall(r'\w+', (text or '').lower())
+
+
+def fts5_query(terms, column=None):
+    """Builds an FTS5 MATCH expression requiring every term as a prefix, optionally in one column."""
+    expression = ' '.join(f'"{term}"*' for term in terms)
+    return f'{column} : ({expression})' if column else expression
+
+
+def tsquery(terms):
+    """Builds a to_tsquery() string requiring every term as a prefix."""
+    return ' & '.join(f'{term}:*' for term in terms)
+
+
+def highlight_html(snippet):
+    """Escapes a database snippet and turns its highlight markers into <mark> tags."""
+    return escape(snippet).replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_END, '</mark>')
+
+
+def chat_history_text(chat_history):
+    """
+    Flattens GuestRequest.chat_history into plain message text. The field holds either a
+    list of {"role", "parts": [{"text"}]} messages or that list serialized as a JSON string.
+    Keep in sync with the main_chat_history_text() SQL function (migration 0024).
+    """
+    if isinstance(chat_history, str):
+        try:
+            chat_history = json.loads(chat_history)
+        except ValueError:
+            return chat_history
+    if isinstance(chat_history, dict):
+        chat_history = [chat_history]
+    if not isinstance(chat_history, list):
+        return ''
+    texts = []
+    for message in chat_history:
+        if isinstance(message, dict):
+            texts.extend(part.get('text', '') for part in message.get('parts', []) if isinstance(part, dict))
+    return '\n'.join(text for text in texts if text)
+
+
+# --- Index maintenance (SQLite only; PostgreSQL indexes are maintained by the database) ---
+
+def create_assignment_index(cursor):
+    cursor.execute(
+        f'CREATE VIRTUAL TABLE IF NOT EXISTS {ASSIGNMENT_FTS_TABLE} USING fts5('
+        f'hotel_id UNINDEXED, guest_names, room_number, '
+        f"tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+
+
+def create_request_index(cursor):
+    cursor.execute(
+        f'CREATE VIRTUAL TABLE IF NOT EXISTS {REQUEST_FTS_TABLE} USING fts5('
+        f'hotel_id UNINDEXED, {", ".join(REQUEST_SEARCH_FIELDS)}, '
+        f"tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+
+
+def _insert_sql(table, fields):
+    columns = ', '.join(('rowid', 'hotel_id') + tuple(fields))
+    placeholders = ', '.join(['%s'] * (len(fields) + 2))
+    return f'INSERT INTO {table} ({columns}) VALUES ({placeholders})'
+
+
+def _replace_index_row(table, fields, pk, values):
+    if search_backend() != 'fts5':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE rowid = %s', [pk])
+        cursor.execute(_insert_sql(table, fields), [pk, *values])
+
+
+def _delete_index_row(table, pk):
+    if search_backend() != 'fts5':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE rowid = %s', [pk])
+
+
+def _rebuild_index(table, fields, create_index, querysets, value_fields, to_row, batch_size):
+    """Refills an FTS5 table from `querysets` in primary-key batches; returns the row count."""
+    if search_backend() != 'fts5':
+        return 0
+    indexed = 0
+    with connection.cursor() as cursor:
+        create_index(cursor)
+        cursor.execute(f'DELETE FROM {table}')
+        for queryset in querysets:
+            last_pk = 0
+            while True:
+                rows = list(
+                    queryset.filter(pk__gt=last_pk).order_by('pk').values_list('pk', 'hotel_id', *value_fields)[:batch_size]
+                )
+                if not rows:
+                    break
+                cursor.executemany(_insert_sql(table, fields), [to_row(row) for row in rows])
+                indexed += len(rows)
+                last_pk = rows[-1][0]
+        cursor.execute(f"INSERT INTO {table} ({table}) VALUES ('optimize')")
+    return indexed
+
+
+def index_assignment(assignment):
+    """Replaces the index entry of one assignment with its current field values."""
+    _replace_index_row(ASSIGNMENT_FTS_TABLE, ASSIGNMENT_SEARCH_FIELDS, assignment.pk,
+                       [assignment.hotel_id, assignment.guest_names, assignment.room_number])
+
+
+def index_assignments(assignments):
+    """Adds freshly bulk-created assignments (which skip signals) to the index in one statement."""
+    if search_backend() != 'fts5' or not assignments:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(_insert_sql(ASSIGNMENT_FTS_TABLE, ASSIGNMENT_SEARCH_FIELDS), [
+            [assignment.pk, assignment.hotel_id, assignment.guest_names, assignment.room_number]
+            for assignment in assignments
+        ])
+
+
+def unindex_assignment(assignment_id):
+    _delete_index_row(ASSIGNMENT_FTS_TABLE, assignment_id)
+
+
+def rebuild_assignment_index(batch_size=5000):
+    """
+    Rebuilds the assignment index from GuestRoomAssignment in primary-key batches.
+    Returns the number of rows indexed (0 when the backend maintains its own indexes).
+    """
+    return _rebuild_index(
+        ASSIGNMENT_FTS_TABLE, ASSIGNMENT_SEARCH_FIELDS, create_assignment_index,
+        [GuestRoomAssignment.objects.all()], ASSIGNMENT_SEARCH_FIELDS, lambda row: row, batch_size,
+    )
+
+
+def _request_index_values(room_number, raw_text, staff_notes, conci_response_text, chat_history):
+    return [room_number, raw_text or '', staff_notes or '', conci_response_text or '', chat_history_text(chat_history)]
+
+
+def index_request(guest_request):
+    """Replaces the index entry of one guest request with its current text and chat transcript."""
+    _replace_index_row(REQUEST_FTS_TABLE, REQUEST_SEARCH_FIELDS, guest_request.pk, [
+        guest_request.hotel_id,
+        *_request_index_values(guest_request.room_number, guest_request.raw_text, guest_request.staff_notes,
+                               guest_request.conci_response_text, guest_request.chat_history),
+    ])
+
+
+def index_requests(guest_requests):
+    """Adds freshly bulk-created guest requests (which skip signals) to the index in one statement."""
+    if search_backend() != 'fts5' or not guest_requests:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(_insert_sql(REQUEST_FTS_TABLE, REQUEST_SEARCH_FIELDS), [
+            [guest_request.pk, guest_request.hotel_id,
+             *_request_index_values(guest_request.room_number, guest_request.raw_text, guest_request.staff_notes,
+                                    guest_request.conci_response_text, guest_request.chat_history)]
+            for guest_request in guest_requests
+        ])
+
+
+def unindex_request(request_id):
+    _delete_index_row(REQUEST_FTS_TABLE, request_id)
+
+
+def rebuild_request_index(batch_size=2000):
+    """
+    Rebuilds the guest request index (live and archived requests, which share ids) in
+    primary-key batches; returns the number of rows indexed.
+    """
+    return _rebuild_index(
+        REQUEST_FTS_TABLE, REQUEST_SEARCH_FIELDS, create_request_index,
+        [GuestRequest.objects.all(), ArchivedGuestRequest.objects.all()],
+        ('room_number', 'raw_text', 'staff_notes', 'conci_response_text', 'chat_history'),
+        lambda row: [row[0], row[1], *_request_index_values(*row[2:])], batch_size,
+    )
+
+
+# --- Queries ---
+
+def filter_assignments_by_text(queryset, field, text):
+    """
+    Restricts an assignment queryset to rows whose `field` (guest_names or room_number)
+    contains every word of `text` as a word prefix (FTS5), or as a substring elsewhere.
+    """
+    terms = search_terms(text)
+    if not terms:
+        return queryset
+    backend = search_backend()
+    if backend == 'fts5':
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {ASSIGNMENT_FTS_TABLE} WHERE {ASSIGNMENT_FTS_TABLE} MATCH %s',
+            [fts5_query(terms, column=field)],
+        ))
+    # PostgreSQL serves icontains from the trigram index on UPPER(field).
+    return queryset.filter(**{f'{field}__icontains': text})
+
+
+def search_assignments(hotel, text, limit=DEFAULT_SEARCH_LIMIT):
+    """
+    Ranked prefix search over guest names and room numbers for one hotel.
+    Returns a list of GuestRoomAssignment objects, best match first.
+    """
+    terms = search_terms(text)
+    if not terms:
+        return []
+
+    backend = search_backend()
+    if backend is None:
+        matches = Q()
+        for term in terms:
+            matches &= Q(guest_names__icontains=term) | Q(room_number__icontains=term)
+        return list(GuestRoomAssignment.objects.filter(matches, hotel=hotel).order_by('-check_in_time')[:limit])
+
+    with connection.cursor() as cursor:
+        if backend == 'fts5':
+            cursor.execute(
+                f'SELECT rowid FROM {ASSIGNMENT_FTS_TABLE} '
+                f'WHERE {ASSIGNMENT_FTS_TABLE} MATCH %s AND hotel_id = %s ORDER BY rank LIMIT %s',
+                [fts5_query(terms), hotel.pk, limit],
+            )
+        else:
+            cursor.execute(
+                f'SELECT id FROM main_guestroomassignment '
+                f"WHERE hotel_id = %s AND {ASSIGNMENT_TSVECTOR_SQL} @@ to_tsquery('simple', %s) "
+                f"ORDER BY ts_rank({ASSIGNMENT_TSVECTOR_SQL}, to_tsquery('simple', %s)) DESC, check_in_time DESC "
+                f'LIMIT %s',
+                [hotel.pk, tsquery(terms), tsquery(terms), limit],
+            )
+        ranked_ids = [row[0] for row in cursor.fetchall()]
+
+    assignments = GuestRoomAssignment.objects.in_bulk(ranked_ids)
+    return [assignments[pk] for pk in ranked_ids if pk in assignments]
+
+
+def filter_requests_by_text(queryset, text):
+    """
+    Restricts a GuestRequest (or ArchivedGuestRequest) queryset to requests whose room number,
+    text, staff notes, Conci response or chat transcript contain every word of `text` as a word prefix.
+    """
+    terms = search_terms(text)
+    if not terms:
+        return queryset
+    backend = search_backend()
+    if backend == 'fts5':
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {REQUEST_FTS_TABLE} WHERE {REQUEST_FTS_TABLE} MATCH %s', [fts5_query(terms)],
+        ))
+    if backend == 'postgres':
+        return queryset.filter(pk__in=RawSQL(
+            f"SELECT id FROM {queryset.model._meta.db_table} WHERE {REQUEST_TSVECTOR_SQL} @@ to_tsquery('simple', %s)",
+            [tsquery(terms)],
+        ))
+    matches = Q()
+    for term in terms:
+        matches &= (Q(room_number__icontains=term) | Q(raw_text__icontains=term) | Q(staff_notes__icontains=term)
+                    | Q(conci_response_text__icontains=term))
+    return queryset.filter(matches)
+
+
+def request_snippets(request_ids, text):
+    """
+    Returns {request_id: snippet_html} for the given matching requests, with the matched
+    words wrapped in <mark>. Only the ids of the current page are passed in.
+    """
+    terms = search_terms(text)
+    backend = search_backend()
+    if not terms or not request_ids or backend is None:
+        return {}
+
+    with connection.cursor() as cursor:
+        if backend == 'fts5':
+            placeholders = ', '.join(['%s'] * len(request_ids))
+            cursor.execute(
+                f"SELECT rowid, snippet({REQUEST_FTS_TABLE}, -1, %s, %s, '…', %s) FROM {REQUEST_FTS_TABLE} "
+                f'WHERE {REQUEST_FTS_TABLE} MATCH %s AND rowid IN ({placeholders})',
+                [HIGHLIGHT_START, HIGHLIGHT_END, SNIPPET_TOKENS, fts5_query(terms), *request_ids],
+            )
+        else:
+            # The page may mix live and archived requests (same ids and columns).
+            headline = f"SELECT id, ts_headline('simple', {REQUEST_DOCUMENT_SQL}, to_tsquery('simple', %s), %s) FROM"
+            options = f'StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_END}, MaxWords=24, MinWords=8'
+            cursor.execute(
+                f'{headline} main_guestrequest WHERE id = ANY(%s) '
+                f'UNION ALL {headline} main_archivedguestrequest WHERE id = ANY(%s)',
+                [tsquery(terms), options, list(request_ids)] * 2,
+            )
+        return {pk: highlight_html(snippet) for pk, snippet in cursor.fetchall()}
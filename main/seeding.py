@@ -0,0 +1,372 @@
+# main/seeding.py
+
+import json
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+import numpy as np
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from .catalog import catalog_changed
+from .models import (
+    Amenity, GuestRequest, GuestRoomAssignment, Hotel, HotelConfiguration, Room, StaffMember, UserProfile,
+)
+from .routing import DEFAULT_CATEGORIES, FALLBACK_CATEGORY, recount_staff_load
+from .search import index_assignments, index_requests
+from .stats import local_day_start, refresh_hotel_stats
+
+# Synthetic hotels for benchmarking (manage.py seed_benchmark_data). Every random draw comes
+# from a numpy generator seeded per hotel from one SeedSequence, and all times are offsets
+# from local midnight of `as_of`, so a seed and date always produce the same rows. Arrays are
+# drawn for a whole hotel at once; model rows are built and written in chunks with
+# bulk_create, which skips model signals, so their work (search index, staff load counters,
+# HotelStats) is done per chunk or once per hotel.
+
+SEED_CHUNK_SIZE = 20000
+BENCHMARK_HOTEL_PREFIX = 'Benchmark Hotel'
+
+STAFF_CATEGORY_WEIGHTS = {
+    'housekeeping': 0.35, 'maintenance': 0.15, 'room_service': 0.15, 'concierge': 0.1,
+    'front_desk': 0.1, 'amenity_request': 0.05, 'general': 0.1,
+}
+REQUEST_TYPE_WEIGHTS = {
+    'housekeeping': 0.22, 'amenity_request': 0.18, 'room_service': 0.15, 'maintenance': 0.12,
+    'general_inquiry': 0.12, 'casual_chat': 0.10, 'concierge': 0.08, 'repairs': 0.03,
+}
+# Status mix of requests from before / within the last OPEN_WINDOW_DAYS days.
+OPEN_WINDOW_DAYS = 2
+CLOSED_STATUS_WEIGHTS = {'completed': 0.92, 'cancelled': 0.08}
+RECENT_STATUS_WEIGHTS = {'pending': 0.35, 'in_progress': 0.25, 'completed': 0.35, 'cancelled': 0.05}
+ROOM_TYPE_WEIGHTS = {'Standard': 0.6, 'Deluxe': 0.3, 'Suite': 0.1}
+NIGHTLY_RATES = {'Standard': 120, 'Deluxe': 180, 'Suite': 320}
+IDLE_ROOM_STATUS_WEIGHTS = {'available': 0.85, 'cleaning': 0.08, 'maintenance': 0.04, 'out_of_service': 0.03}
+
+BENCHMARK_AMENITIES = [
+    ('Bath Towel', '4.00'), ('Bottled Water', '2.50'), ('Extra Pillow', '6.00'),
+    ('Toothbrush Kit', '3.00'), ('Coffee Pods', '5.00'), ('Bathrobe', '12.50'),
+]
+BENCHMARK_CONFIGURATION = {
+    'wifi_name': 'Benchmark-Guest', 'wifi_password': 'seed-1234', 'checkout_time': '11:00 AM',
+    'checkin_time': '3:00 PM', 'breakfast_hours': '7:00-10:30 AM',
+}
+FIRST_NAMES = ['Aarav', 'Priya', 'John', 'Maria', 'Wei', 'Fatima', 'Lucas', 'Emma', 'Kenji', 'Olivia',
+               'Rahul', 'Sofia', 'Noah', 'Ananya', 'Liam', 'Chloe', 'Omar', 'Isabella', 'Arjun', 'Mei']
+LAST_NAMES = ['Sharma', 'Smith', 'Garcia', 'Chen', 'Khan', 'Muller', 'Rossi', 'Tanaka', 'Iyer', 'Brown',
+              'Silva', 'Nguyen', 'Patel', 'Kowalski', 'Dubois', 'Reddy', 'Johnson', 'Lopez', 'Kim', 'Ali']
+# (guest message, Conci reply) pairs per request type; {amenity} is filled per amenity.
+MESSAGES = {
+    'housekeeping': [
+        ('Could someone clean my room please?', "Of course! I've asked housekeeping to clean your room shortly."),
+        ('We need fresh towels and more soap.', 'Housekeeping will bring fresh towels and soap right away.'),
+        ('Please change the bed sheets today.', "I've let housekeeping know you'd like new bedding today."),
+    ],
+    'amenity_request': [
+        ('Can I get two {amenity}?', "I'll have two {amenity} sent up; the cost will be added to your bill upon completion."),
+        ('Please bring a {amenity} to my room.', 'A {amenity} is on its way and will be added to your bill.'),
+        ('How much is a {amenity}?', 'A {amenity} is available at the listed price. Would you like one delivered?'),
+    ],
+    'room_service': [
+        ('Can I order breakfast to the room?', "Certainly, I've passed your breakfast order to room service."),
+        ('Please bring two coffees.', 'Room service will bring two coffees shortly.'),
+        ('Could I see the dinner menu?', "I've asked room service to send the menu up."),
+    ],
+    'maintenance': [
+        ('The AC is not working.', "Sorry about that! I've asked maintenance to check the AC right away."),
+        ('The bathroom light is broken.', "Maintenance has been notified about the bathroom light."),
+        ('The TV remote does not work.', "I've asked maintenance to replace the remote."),
+    ],
+    'repairs': [
+        ('The faucet in the bathroom is leaking.', "I've reported the leaking faucet; someone will repair it soon."),
+        ('The door lock is jammed.', 'Our maintenance team will fix the door lock shortly.'),
+    ],
+    'general_inquiry': [
+        ('What time is checkout?', 'Checkout is at 11:00 AM. Let me know if you need anything else.'),
+        ('Is there a gym in the hotel?', 'Yes, the gym is on the first floor and open from 6 AM to 10 PM.'),
+        ('Do you have parking?', 'Yes, guest parking is available in the basement.'),
+    ],
+    'concierge': [
+        ('Can you book a taxi to the airport at 6 AM?', "I've asked the concierge to arrange a taxi for 6 AM."),
+        ('Any good restaurants nearby?', 'The concierge will share a few recommendations with you shortly.'),
+    ],
+    'casual_chat': [
+        ('Hi!', 'Hello! How can I help you today?'),
+        ('Thank you so much!', "You're welcome! Enjoy your stay."),
+        ('Good morning', 'Good morning! Let me know if you need anything.'),
+    ],
+}
+MAX_CHAT_TURNS = 3
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+@contextmanager
+def stored_timestamps(*models):
+    """Makes bulk_create keep the given created/updated times instead of auto_now(_add) ones."""
+    fields = [field for model in models for field in model._meta.concrete_fields
+              if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _choice(rng, weights, size):
+    """Draws `size` keys of `weights` ({key: probability}); returns (keys, indices)."""
+    keys = list(weights)
+    probabilities = np.array([weights[key] for key in keys], dtype=float)
+    return keys, rng.choice(len(keys), size=size, p=probabilities / probabilities.sum())
+
+
+def _moments(seconds):
+    """Aware datetimes for an array of epoch seconds."""
+    return [_EPOCH + timedelta(seconds=int(value)) for value in seconds]
+
+
+def _chat_pool(amenities):
+    """
+    Every (request type, message, amenity) combination as ready-made rows:
+    {request_type: [(raw_text, conci_response, amenity or None, [chat_history JSON per turn count])]}.
+    Earlier turns are casual chat, as guests usually greet Conci first.
+    """
+    pool = {}
+    for request_type, templates in MESSAGES.items():
+        rows = []
+        for raw_text, reply in templates:
+            for amenity in (amenities if '{amenity}' in raw_text else [None]):
+                if amenity is not None:
+                    raw_text_filled, reply_filled = raw_text.format(amenity=amenity.name), reply.format(amenity=amenity.name)
+                else:
+                    raw_text_filled, reply_filled = raw_text, reply
+                histories = []
+                for turns in range(1, MAX_CHAT_TURNS + 1):
+                    history = []
+                    for earlier_text, earlier_reply in MESSAGES['casual_chat'][:turns - 1]:
+                        history += [{'role': 'user', 'parts': [{'text': earlier_text}]},
+                                    {'role': 'model', 'parts': [{'text': earlier_reply}]}]
+                    history += [{'role': 'user', 'parts': [{'text': raw_text_filled}]},
+                                {'role': 'model', 'parts': [{'text': reply_filled}]}]
+                    histories.append(json.dumps(history))
+                rows.append((raw_text_filled, reply_filled, amenity, histories))
+        pool[request_type] = rows
+    return pool
+
+
+def benchmark_amenities():
+    """The benchmark amenities, created if missing (existing prices are left alone)."""
+    amenities = []
+    for name, price in BENCHMARK_AMENITIES:
+        amenity, created = Amenity.objects.get_or_create(name=name, defaults={'price': Decimal(price)})
+        amenities.append(amenity)
+    transaction.on_commit(catalog_changed)
+    return amenities
+
+
+def seed_staff(rng, hotel, staff_count, password_hash, batch_size):
+    """Creates an admin user and `staff_count` staff members; returns {category: [staff ids]}."""
+    categories, picks = _choice(rng, STAFF_CATEGORY_WEIGHTS, staff_count)
+    usernames = [f'bench{hotel.pk}_admin'] + [
+        f'bench{hotel.pk}_{categories[pick]}_{i}' for i, pick in enumerate(picks)
+    ]
+    users = User.objects.bulk_create(
+        [User(username=username, password=password_hash) for username in usernames], batch_size=batch_size,
+    )
+    UserProfile.objects.bulk_create([UserProfile(user=user, hotel=hotel) for user in users], batch_size=batch_size)
+    staff = StaffMember.objects.bulk_create(
+        [StaffMember(user=user, hotel=hotel, category=categories[pick]) for user, pick in zip(users[1:], picks)],
+        batch_size=batch_size,
+    )
+    staff_by_category = {}
+    for member in staff:
+        staff_by_category.setdefault(member.category, []).append(member.pk)
+    return staff_by_category
+
+
+def seed_rooms(rng, hotel, room_count, batch_size):
+    """Creates the rooms (floors of up to 40); returns (rooms, nightly rate per room)."""
+    room_types, picks = _choice(rng, ROOM_TYPE_WEIGHTS, room_count)
+    rooms = Room.objects.bulk_create(
+        [
+            Room(hotel=hotel, room_number=str((i // 40 + 1) * 100 + i % 40 + 1), room_type=room_types[pick])
+            for i, pick in enumerate(picks)
+        ],
+        batch_size=batch_size,
+    )
+    rates = np.array([NIGHTLY_RATES[room_types[pick]] for pick in picks], dtype=np.int64)
+    return rooms, rates
+
+
+def stay_arrays(rng, room_count, start, end):
+    """
+    Back-to-back stays per room from `start` to `end` (epoch seconds): 15:00 check-in after a
+    gap of 0-4 nights, 1-7 (mostly short) nights, 11:00 check-out.
+    Returns (room index, check-in, check-out, nights) arrays ordered by room then check-in.
+    """
+    day = 86400
+    per_room = int((end - start) / day / 2.5) + 8  # more than the shortest average stay + gap allows
+    nights = np.minimum(rng.geometric(0.35, size=(room_count, per_room)), 7)
+    gaps = rng.integers(0, 5, size=(room_count, per_room))
+    # Day offset of each check-in: the gaps plus the nights of the stays before it.
+    check_in_days = np.cumsum(gaps + nights, axis=1) - nights
+    check_in = start + check_in_days * day + 15 * 3600
+    check_out = check_in + nights * day - 4 * 3600
+    keep = check_in < end
+    room_index = np.broadcast_to(np.arange(room_count)[:, None], keep.shape)
+    return room_index[keep], check_in[keep], check_out[keep], nights[keep]
+
+
+def seed_hotel(rng, index, options, amenities, chat_pool, password_hash, as_of, log):
+    """Creates one benchmark hotel with its rooms, staff, stays and requests."""
+    batch_size = options['batch_size']
+    now = int((local_day_start(as_of) - _EPOCH).total_seconds()) + 12 * 3600  # noon of as_of
+    history_start = now - int(options['years'] * 365 * 86400)
+    future_end = now + 60 * 86400
+
+    hotel = Hotel.objects.create(name=f'{BENCHMARK_HOTEL_PREFIX} {index + 1}', total_rooms=options['rooms'])
+    HotelConfiguration.objects.bulk_create(
+        [HotelConfiguration(hotel=hotel, key=key, value=value) for key, value in BENCHMARK_CONFIGURATION.items()]
+    )
+    staff_by_category = seed_staff(rng, hotel, options['staff'], password_hash, batch_size)
+    rooms, rates = seed_rooms(rng, hotel, options['rooms'], batch_size)
+
+    # --- Stays ---
+    room_index, check_in, check_out, nights = stay_arrays(rng, len(rooms), history_start, future_end)
+    past, current = check_out <= now, (check_in <= now) & (check_out > now)
+    outcome = rng.random(len(check_in))
+    statuses = np.where(past, 'checked_out', np.where(current, 'checked_in', 'confirmed')).astype(object)
+    statuses[past & (outcome < 0.05)] = 'cancelled'
+    statuses[past & (outcome >= 0.05) & (outcome < 0.08)] = 'no_show'
+    statuses[~past & ~current & (outcome < 0.05)] = 'cancelled'
+    # Booked 1-60 days ahead; stays that would be booked after `as_of` were booked in the month before it.
+    booked_at = check_in - rng.integers(1, 61, size=len(check_in)) * 86400
+    booked_at = np.where(booked_at > now, now - rng.integers(0, 30 * 86400, size=len(check_in)), booked_at)
+    bills = nights * rates[room_index]
+    paid = np.where(past, bills, np.where(current, bills // 2, 0))
+    first, last = rng.integers(0, len(FIRST_NAMES), size=len(check_in)), rng.integers(0, len(LAST_NAMES), size=len(check_in))
+    companions = rng.random(len(check_in)) < 0.4
+
+    stays = 0
+    with stored_timestamps(GuestRoomAssignment):
+        for begin in range(0, len(check_in), SEED_CHUNK_SIZE):
+            chunk = range(begin, min(begin + SEED_CHUNK_SIZE, len(check_in)))
+            created = GuestRoomAssignment.objects.bulk_create([
+                GuestRoomAssignment(
+                    hotel=hotel, room=rooms[room_index[i]], room_number=rooms[room_index[i]].room_number,
+                    guest_names=(f'{FIRST_NAMES[first[i]]} {LAST_NAMES[last[i]]}'
+                                 + (f', {FIRST_NAMES[(first[i] + 7) % len(FIRST_NAMES)]} {LAST_NAMES[last[i]]}'
+                                    if companions[i] else '')),
+                    check_in_time=stamp_in, check_out_time=stamp_out, status=statuses[i],
+                    base_bill_amount=Decimal(int(bills[i])), total_bill_amount=Decimal(int(bills[i])),
+                    amount_paid=Decimal(int(paid[i])), created_at=stamp_booked, updated_at=stamp_booked,
+                )
+                for i, stamp_in, stamp_out, stamp_booked in zip(
+                    chunk, _moments(check_in[chunk.start:chunk.stop]), _moments(check_out[chunk.start:chunk.stop]),
+                    _moments(booked_at[chunk.start:chunk.stop]),
+                )
+            ], batch_size=batch_size)
+            index_assignments(created)
+            stays += len(created)
+
+    occupied = np.zeros(len(rooms), dtype=bool)
+    occupied[room_index[statuses == 'checked_in']] = True
+    idle_statuses, idle_picks = _choice(rng, IDLE_ROOM_STATUS_WEIGHTS, len(rooms))
+    for room, is_occupied, pick in zip(rooms, occupied, idle_picks):
+        room.status = 'occupied' if is_occupied else idle_statuses[pick]
+    Room.objects.bulk_update(rooms, ['status'], batch_size=batch_size)
+
+    # --- Requests, raised during stays that happened (longer stays raise more) ---
+    lived = np.flatnonzero(np.isin(statuses, ['checked_out', 'checked_in']))
+    request_count = options['requests'] if len(lived) else 0
+    stay_span = np.minimum(check_out[lived], now) - check_in[lived]
+    stay_pick = lived[rng.choice(len(lived), size=request_count, p=stay_span / stay_span.sum())] if request_count else lived[:0]
+    raised_at = check_in[stay_pick] + (rng.random(request_count) * (np.minimum(check_out[stay_pick], now) - check_in[stay_pick])).astype(np.int64)
+    request_types, type_picks = _choice(rng, REQUEST_TYPE_WEIGHTS, request_count)
+    recent = raised_at > now - OPEN_WINDOW_DAYS * 86400
+    closed_statuses, closed_picks = _choice(rng, CLOSED_STATUS_WEIGHTS, request_count)
+    recent_statuses, recent_picks = _choice(rng, RECENT_STATUS_WEIGHTS, request_count)
+    handled_after = np.minimum(rng.exponential(45 * 60, size=request_count).astype(np.int64) + 60, 2 * 86400)
+    template_picks = rng.integers(0, 1 << 30, size=request_count)
+    turn_picks = rng.integers(0, MAX_CHAT_TURNS, size=request_count)
+    staff_picks = rng.integers(0, 1 << 30, size=request_count)
+    unassigned = rng.random(request_count) < 0.5
+    quantities = rng.integers(1, 4, size=request_count)
+
+    routes = {}
+    for request_type in REQUEST_TYPE_WEIGHTS:
+        category = DEFAULT_CATEGORIES.get(request_type, request_type)
+        routes[request_type] = staff_by_category.get(category) or staff_by_category.get(FALLBACK_CATEGORY) or []
+
+    requests = 0
+    with stored_timestamps(GuestRequest):
+        for begin in range(0, request_count, SEED_CHUNK_SIZE):
+            chunk = range(begin, min(begin + SEED_CHUNK_SIZE, request_count))
+            batch = []
+            for i, stamp, raised in zip(chunk, _moments(raised_at[chunk.start:chunk.stop]), raised_at[chunk.start:chunk.stop]):
+                request_type = request_types[type_picks[i]]
+                if request_type == 'casual_chat':
+                    status = 'completed'
+                elif recent[i]:
+                    status = recent_statuses[recent_picks[i]]
+                else:
+                    status = closed_statuses[closed_picks[i]]
+                raw_text, reply, amenity, histories = chat_pool[request_type][template_picks[i] % len(chat_pool[request_type])]
+                staff_ids = routes[request_type]
+                assigned = None
+                if staff_ids and request_type != 'casual_chat' and not (status == 'pending' and unassigned[i]):
+                    assigned = staff_ids[staff_picks[i] % len(staff_ids)]
+                updated = stamp if status == 'pending' else _EPOCH + timedelta(seconds=int(min(raised + handled_after[i], now)))
+                room = rooms[room_index[stay_pick[i]]]
+                batch.append(GuestRequest(
+                    hotel=hotel, room=room, room_number=room.room_number, raw_text=raw_text,
+                    ai_intent=request_type, ai_entities=json.dumps({'query': raw_text}),
+                    conci_response_text=reply, status=status, request_type=request_type,
+                    assigned_staff_id=assigned, amenity_requested=amenity,
+                    amenity_quantity=int(quantities[i]) if amenity else 1,
+                    bill_added=bool(amenity) and status == 'completed',
+                    chat_history=histories[turn_picks[i]], timestamp=stamp, updated_at=updated,
+                ))
+            created = GuestRequest.objects.bulk_create(batch, batch_size=batch_size)
+            index_requests(created)
+            requests += len(created)
+            log(f'  {hotel.name}: {requests}/{request_count} requests')
+
+    recount_staff_load(hotel)
+    refresh_hotel_stats(hotel)
+    return hotel, {'rooms': len(rooms), 'staff': sum(map(len, staff_by_category.values())), 'stays': stays, 'requests': requests}
+
+
+def seed_benchmark_data(hotels=1, rooms=100, staff=20, years=1.0, requests=10000, seed=0, as_of=None,
+                        password=None, batch_size=1000, log=None):
+    """
+    Creates `hotels` benchmark hotels, each with `rooms` rooms, `staff` staff members (plus a
+    bench<hotel id>_admin user; all log in with `password`, and without one their passwords
+    are unusable), back-to-back stays covering `years` years up to two months past `as_of`
+    (default today), and `requests` guest requests with chat histories. Each hotel is
+    written in its own transaction.
+    Returns [(hotel, counts dict), ...].
+    """
+    log = log or (lambda message: None)
+    as_of = as_of or timezone.localdate()
+    options = {'rooms': rooms, 'staff': staff, 'years': years, 'requests': requests, 'batch_size': batch_size}
+    # One hash for every benchmark account: hashing thousands of passwords would dominate the run.
+    password_hash = make_password(password or None)
+    with transaction.atomic():
+        amenities = benchmark_amenities()
+    chat_pool = _chat_pool(amenities)
+
+    results = []
+    for index, hotel_seed in enumerate(np.random.SeedSequence(seed).spawn(hotels)):
+        rng = np.random.default_rng(hotel_seed)
+        with transaction.atomic():
+            hotel, counts = seed_hotel(rng, index, options, amenities, chat_pool, password_hash, as_of, log)
+        log(f"{hotel.name} (id {hotel.pk}): {counts['rooms']} rooms, {counts['staff']} staff, "
+            f"{counts['stays']} stays, {counts['requests']} requests")
+        results.append((hotel, counts))
+    return results
@@ -1,9 +1,22 @@
 # main/signals.py
 
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, pre_save, post_delete, pre_delete
 from django.contrib.auth.models import User
+from django.db import transaction
 from django.dispatch import receiver
-from .models import UserProfile, Hotel # Ensure Hotel is imported
+from .models import UserProfile, Hotel, GuestRoomAssignment, Room, GuestRequest, StaffMember, Amenity, HotelStats, HotelConfiguration # Ensure Hotel is imported
+from .availability import rooms_changed, stay_changed
+from .catalog import catalog_changed
+from .faq import configuration_changed
+from .fragments import invalidate_fragments
+from .middleware import invalidate_hotel_context
+from .rooms import link_room_rows, resolve_room
+from .routing import adjust_staff_load, load_holder
+from .search import index_assignment, index_request, unindex_assignment, unindex_request
+from .stats import (
+    ASSIGNMENT_STATS_FIELDS, NOT_READY_ROOM_STATUSES,
+    apply_assignment_change, assignment_stats_snapshot, bump_hotel_stats,
+)
 
 @receiver(post_save, sender=User)
 def create_or_update_user_profile(sender, instance, created, **kwargs):
@@ -34,3 +47,237 @@ def create_or_update_user_profile(sender, instance, created, **kwargs):
     # Updates to existing UserProfiles should typically be done explicitly.
     # print(f"Signal: UserProfile for {instance.username} already exists, skipping creation.")
 
+
+
+# --- HotelStats maintenance ---
+# Today's HotelStats row is kept current by applying per-row deltas on every save/delete,
+# so the home tab never has to rescan GuestRoomAssignment/Room/GuestRequest.
+# `manage.py reconcile_hotel_stats` repairs anything these deltas can't see; counters that move
+# with the time of day (stats.TIME_DEPENDENT_FIELDS) are recounted on every read instead.
+
+@receiver(pre_save, sender=GuestRoomAssignment)
+def remember_assignment_stats_state(sender, instance, raw=False, **kwargs):
+    instance._stats_previous = None
+    if raw or not instance.pk:
+        return
+    instance._stats_previous = GuestRoomAssignment.objects.filter(pk=instance.pk).values(
+        'hotel_id', *ASSIGNMENT_STATS_FIELDS
+    ).first()
+
+
+@receiver(post_save, sender=GuestRoomAssignment)
+def update_stats_for_assignment(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_stats_previous', None)
+    if previous and previous['hotel_id'] != instance.hotel_id:
+        # Moved between hotels: remove from the old hotel, add to the new one.
+        apply_assignment_change(previous['hotel_id'], previous, None)
+        previous = None
+    apply_assignment_change(instance.hotel_id, previous, assignment_stats_snapshot(instance))
+
+
+@receiver(post_delete, sender=GuestRoomAssignment)
+def update_stats_for_deleted_assignment(sender, instance, **kwargs):
+    apply_assignment_change(instance.hotel_id, assignment_stats_snapshot(instance), None)
+
+
+@receiver(pre_save, sender=Room)
+def remember_room_status(sender, instance, raw=False, **kwargs):
+    instance._stats_previous = None
+    if raw or not instance.pk:
+        return
+    instance._stats_previous = Room.objects.filter(pk=instance.pk).values('hotel_id', 'status').first()
+
+
+@receiver(post_save, sender=Room)
+def update_stats_for_room(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_stats_previous', None)
+    was_not_ready = bool(previous) and previous['status'] in NOT_READY_ROOM_STATUSES
+    is_not_ready = instance.status in NOT_READY_ROOM_STATUSES
+    if previous and previous['hotel_id'] != instance.hotel_id:
+        bump_hotel_stats(previous['hotel_id'], 'not_ready_rooms', -int(was_not_ready))
+        bump_hotel_stats(instance.hotel_id, 'not_ready_rooms', int(is_not_ready))
+    else:
+        bump_hotel_stats(instance.hotel_id, 'not_ready_rooms', int(is_not_ready) - int(was_not_ready))
+
+
+@receiver(post_delete, sender=Room)
+def update_stats_for_deleted_room(sender, instance, **kwargs):
+    if instance.status in NOT_READY_ROOM_STATUSES:
+        bump_hotel_stats(instance.hotel_id, 'not_ready_rooms', -1)
+
+
+@receiver(post_save, sender=GuestRequest)
+def update_stats_for_new_request(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        bump_hotel_stats(instance.hotel_id, 'total_requests_count', 1)
+
+
+@receiver(post_delete, sender=GuestRequest)
+def update_stats_for_deleted_request(sender, instance, **kwargs):
+    bump_hotel_stats(instance.hotel_id, 'total_requests_count', -1)
+
+
+# --- Staff load counters ---
+# StaffMember.open_task_count follows every assignment/status change, so main/routing.py can
+# pick the least-loaded staff member without counting their requests.
+
+@receiver(pre_save, sender=GuestRequest)
+def remember_request_load_holder(sender, instance, raw=False, **kwargs):
+    instance._load_previous = None
+    if raw or not instance.pk:
+        return
+    previous = GuestRequest.objects.filter(pk=instance.pk).values_list('assigned_staff_id', 'status').first()
+    instance._load_previous = load_holder(*previous) if previous else None
+
+
+@receiver(post_save, sender=GuestRequest)
+def update_staff_load_for_request(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_load_previous', None)
+    current = load_holder(instance.assigned_staff_id, instance.status)
+    if previous != current:
+        adjust_staff_load(previous, -1)
+        adjust_staff_load(current, 1)
+
+
+@receiver(post_delete, sender=GuestRequest)
+def update_staff_load_for_deleted_request(sender, instance, **kwargs):
+    adjust_staff_load(load_holder(instance.assigned_staff_id, instance.status), -1)
+
+
+# --- Dashboard fragment invalidation ---
+# Each model only invalidates the fragments that render it. Bumps run after commit so a
+# concurrent render can't cache pre-commit data under the new version stamp.
+
+def _invalidate_on_commit(hotel_id, *fragments):
+    transaction.on_commit(lambda: invalidate_fragments(hotel_id, *fragments))
+
+
+@receiver([post_save, post_delete], sender=StaffMember)
+def invalidate_staff_fragments(sender, instance, **kwargs):
+    # Staff usernames are shown on grouped request cards as well as in the dropdowns.
+    _invalidate_on_commit(instance.hotel_id, 'staff_list', 'grouped_requests')
+
+
+@receiver([post_save, post_delete], sender=Amenity)
+def invalidate_amenity_fragments(sender, instance, **kwargs):
+    _invalidate_on_commit(None, 'amenity_table')
+    transaction.on_commit(catalog_changed)
+
+
+@receiver([post_save, post_delete], sender=HotelConfiguration)
+def invalidate_hotel_faq(sender, instance, **kwargs):
+    hotel_id = instance.hotel_id
+    transaction.on_commit(lambda: configuration_changed(hotel_id))
+
+
+@receiver([post_save, post_delete], sender=GuestRequest)
+def invalidate_request_fragments(sender, instance, **kwargs):
+    _invalidate_on_commit(instance.hotel_id, 'grouped_requests', 'kpi_header')
+
+
+@receiver([post_save, post_delete], sender=GuestRoomAssignment)
+def invalidate_assignment_fragments(sender, instance, **kwargs):
+    # Request cards show the guest names of the room's assignment.
+    _invalidate_on_commit(instance.hotel_id, 'grouped_requests', 'kpi_header')
+
+
+@receiver([post_save, post_delete], sender=Room)
+def invalidate_room_fragments(sender, instance, **kwargs):
+    _invalidate_on_commit(instance.hotel_id, 'kpi_header')
+
+
+@receiver(post_save, sender=HotelStats)
+def invalidate_stats_fragments(sender, instance, **kwargs):
+    _invalidate_on_commit(instance.hotel_id, 'kpi_header')
+
+
+# --- Search index maintenance ---
+# Keeps the FTS5 assignment and request indexes (SQLite) in step with every save/delete; PostgreSQL maintains
+# its own indexes. `manage.py rebuild_search_index` rebuilds it after bulk writes that skip signals.
+
+@receiver(post_save, sender=GuestRoomAssignment)
+def index_saved_assignment(sender, instance, **kwargs):
+    index_assignment(instance)
+
+
+@receiver(post_delete, sender=GuestRoomAssignment)
+def unindex_deleted_assignment(sender, instance, **kwargs):
+    unindex_assignment(instance.pk)
+
+
+@receiver(post_save, sender=GuestRequest)
+def index_saved_request(sender, instance, **kwargs):
+    index_request(instance)
+
+
+@receiver(post_delete, sender=GuestRequest)
+def unindex_deleted_request(sender, instance, **kwargs):
+    unindex_request(instance.pk)
+
+
+# --- Room links ---
+# Rows saved without a room (admin, older code paths) resolve it from room_number, and rows
+# whose room had no Room row yet (e.g. a guest messaging from it) are linked once it does.
+
+@receiver(pre_save, sender=GuestRoomAssignment)
+@receiver(pre_save, sender=GuestRequest)
+def resolve_missing_room(sender, instance, raw=False, **kwargs):
+    if not raw and instance.room_id is None and instance.room_number:
+        resolve_room(instance)
+
+
+@receiver(post_save, sender=Room)
+def link_rows_to_new_room(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        link_room_rows(instance.hotel_id, [instance.room_number])
+
+
+# --- Availability index ---
+# Patches this process's availability index after commit and tells other processes to rebuild.
+
+@receiver(post_save, sender=GuestRoomAssignment)
+def update_availability_for_assignment(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    values = (instance.room_id, instance.check_in_time, instance.check_out_time, instance.status)
+    transaction.on_commit(lambda: stay_changed(instance.hotel_id, instance.pk, values))
+
+
+@receiver(post_delete, sender=GuestRoomAssignment)
+def update_availability_for_deleted_assignment(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: stay_changed(instance.hotel_id, pk))
+
+
+@receiver([post_save, post_delete], sender=Room)
+def update_availability_for_room(sender, instance, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(lambda: rooms_changed(instance.hotel_id))
+
+
+# --- Hotel context cache ---
+# main/middleware.py caches each signed-in user's profile, hotel and staff membership.
+
+@receiver([post_save, post_delete], sender=UserProfile)
+@receiver([post_save, post_delete], sender=StaffMember)
+def invalidate_user_hotel_context(sender, instance, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(lambda: invalidate_hotel_context(instance.user_id))
+
+
+@receiver(post_save, sender=Hotel)
+@receiver(pre_delete, sender=Hotel)
+def invalidate_hotel_members_context(sender, instance, raw=False, **kwargs):
+    # Deleting a hotel clears its profiles with a bulk UPDATE (SET_NULL), which sends no signals.
+    if raw or kwargs.get('created'):
+        return
+    user_ids = set(UserProfile.objects.filter(hotel=instance).values_list('user_id', flat=True))
+    user_ids.update(StaffMember.objects.filter(hotel=instance).values_list('user_id', flat=True))
+    if user_ids:
+        transaction.on_commit(lambda: invalidate_hotel_context(*user_ids))
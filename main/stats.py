@@ -0,0 +1,269 @@
+# main/stats.py
+
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import ArchivedGuestRequest, GuestRequest, GuestRoomAssignment, Hotel, HotelStats, Room
+
+CHART_DAYS = 7
+NOT_READY_ROOM_STATUSES = ['cleaning', 'maintenance', 'out_of_service']
+BOOKED_STATUSES = ['confirmed', 'checked_in']
+
+# Counters stored directly on HotelStats (the chart is stored separately as JSON).
+STATS_COUNTER_FIELDS = [
+    'occupied_rooms', 'reserved_rooms', 'not_ready_rooms', 'new_bookings_count',
+    'check_ins_today_count', 'check_outs_today_count', 'total_requests_count',
+]
+# The subset of counters that depend on GuestRoomAssignment rows.
+ASSIGNMENT_COUNTER_FIELDS = [
+    'occupied_rooms', 'reserved_rooms', 'new_bookings_count',
+    'check_ins_today_count', 'check_outs_today_count',
+]
+# Counters that change with the time of day, not only with rows: the stored value is only
+# right at the moment it was written, so get_home_stats recomputes them on every read.
+TIME_DEPENDENT_FIELDS = ['occupied_rooms']
+# Fields whose values decide which counters an assignment contributes to.
+ASSIGNMENT_STATS_FIELDS = ['status', 'check_in_time', 'check_out_time', 'created_at']
+
+
+def local_day_start(day):
+    """
+    Returns the aware datetime at local midnight for `day`, so a date `d` maps to the
+    half-open range [local_day_start(d), local_day_start(d + 1 day)).
+    """
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _stats_windows(now):
+    """
+    Returns the time boundaries shared by the aggregate query and the incremental deltas:
+    (today_start, tomorrow_start, [(chart_day, day_start, day_end), ...]).
+    """
+    today = now.date()
+    chart_days = []
+    for i in range(CHART_DAYS):
+        day = today - timedelta(days=CHART_DAYS - 1 - i)
+        chart_days.append((day, local_day_start(day), local_day_start(day + timedelta(days=1))))
+    return local_day_start(today), local_day_start(today + timedelta(days=1)), chart_days
+
+
+def _occupied_at(now):
+    """Stays holding their room at `now`."""
+    return Q(status='checked_in', check_in_time__lte=now, check_out_time__gte=now)
+
+
+def _count_subquery(queryset):
+    """Wraps a per-hotel COUNT(*) as a scalar subquery correlated on the outer Hotel row."""
+    counts = queryset.order_by().values('hotel').annotate(c=Count('pk')).values('c')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+
+def compute_home_stats(hotel, now=None):
+    """
+    Computes the home tab KPIs and the 7-day reservations chart for a hotel.
+
+    Every assignment-based number comes from one conditional-aggregation query over
+    GuestRoomAssignment; room and request totals come from a second query on Hotel.
+    All date comparisons use half-open ranges on the raw datetime columns (local-day
+    boundaries), so the database can use indexes instead of evaluating __date per row.
+
+    Args:
+        hotel (Hotel): The hotel to compute statistics for.
+        now (datetime): Optional aware "current time", mainly for tests.
+    Returns:
+        dict: The dashboard context values, with 'reservations_chart_data' as a list.
+    """
+    now = timezone.localtime(now or timezone.now())
+    today_start, tomorrow_start, chart_days = _stats_windows(now)
+    window_start = chart_days[0][1]
+
+    aggregates = {
+        'occupied_rooms': Count('pk', filter=_occupied_at(now)),
+        'reserved_rooms': Count('pk', filter=Q(
+            status='confirmed', check_in_time__gte=tomorrow_start,
+        )),
+        'new_bookings_count': Count('pk', filter=Q(
+            created_at__gte=today_start, created_at__lt=tomorrow_start,
+        )),
+        'check_ins_today_count': Count('pk', filter=Q(
+            status='checked_in', check_in_time__gte=today_start, check_in_time__lt=tomorrow_start,
+        )),
+        'check_outs_today_count': Count('pk', filter=Q(
+            status='checked_out', check_out_time__gte=today_start, check_out_time__lt=tomorrow_start,
+        )),
+    }
+    for i, (_day, day_start, day_end) in enumerate(chart_days):
+        created_on_day = Q(created_at__gte=day_start, created_at__lt=day_end)
+        checked_in_on_day = Q(check_in_time__gte=day_start, check_in_time__lt=day_end)
+        aggregates[f'booked_{i}'] = Count('pk', filter=(
+            (created_on_day | checked_in_on_day) & Q(status__in=BOOKED_STATUSES)
+        ))
+        aggregates[f'cancelled_{i}'] = Count('pk', filter=created_on_day & Q(status='cancelled'))
+
+    # Every counted row was created, checks in or checks out on/after the chart window start
+    # (occupied rooms check out after `now`, reservations check in after today), so rows
+    # from older history never need to be read.
+    assignment_counts = GuestRoomAssignment.objects.filter(
+        Q(created_at__gte=window_start) | Q(check_in_time__gte=window_start) | Q(check_out_time__gte=window_start),
+        hotel=hotel,
+    ).aggregate(**aggregates)
+
+    hotel_counts = Hotel.objects.filter(pk=hotel.pk).values('total_rooms').annotate(
+        not_ready_rooms=_count_subquery(
+            Room.objects.filter(hotel=OuterRef('pk'), status__in=NOT_READY_ROOM_STATUSES)
+        ),
+        # Archiving moves requests between tables without changing the total.
+        total_requests_count=_count_subquery(GuestRequest.objects.filter(hotel=OuterRef('pk')))
+        + _count_subquery(ArchivedGuestRequest.objects.filter(hotel=OuterRef('pk'))),
+    ).get()
+
+    stats = {field: assignment_counts[field] for field in ASSIGNMENT_COUNTER_FIELDS}
+    stats.update({
+        'not_ready_rooms': hotel_counts['not_ready_rooms'],
+        'total_requests_count': hotel_counts['total_requests_count'],
+        'reservations_chart_data': [
+            {
+                "date": day.strftime("%b %d"),
+                "booked": assignment_counts[f'booked_{i}'],
+                "cancelled": assignment_counts[f'cancelled_{i}'],
+            }
+            for i, (day, _start, _end) in enumerate(chart_days)
+        ],
+    })
+    return _with_room_totals(stats, hotel_counts['total_rooms'])
+
+
+def _with_room_totals(stats, total_rooms):
+    """Adds total_rooms and the derived available_rooms to a stats dict."""
+    stats['total_rooms'] = total_rooms
+    stats['available_rooms'] = max(
+        total_rooms - stats['occupied_rooms'] - stats['reserved_rooms'] - stats['not_ready_rooms'], 0
+    )
+    return stats
+
+
+# --- Materialized HotelStats rows ---
+
+def refresh_hotel_stats(hotel, now=None):
+    """
+    Rebuilds the HotelStats row for `hotel` on the local day of `now` from the raw tables.
+    Returns a (stats, drift) tuple where drift maps each field that had to be corrected
+    to its (stored, actual) values; drift is empty when the row was freshly created.
+    """
+    now = timezone.localtime(now or timezone.now())
+    computed = compute_home_stats(hotel, now=now)
+    values = {field: computed[field] for field in STATS_COUNTER_FIELDS}
+    values['reservations_chart_data'] = computed['reservations_chart_data']
+
+    with transaction.atomic():
+        stats = HotelStats.objects.select_for_update().filter(hotel=hotel, day=now.date()).first()
+        if stats is None:
+            stats, created = HotelStats.objects.get_or_create(hotel=hotel, day=now.date(), defaults=values)
+            if created:
+                return stats, {}
+
+        drift = {
+            field: (getattr(stats, field), value)
+            for field, value in values.items()
+            if getattr(stats, field) != value
+        }
+        if drift:
+            for field, value in values.items():
+                setattr(stats, field, value)
+            stats.save()
+    return stats, drift
+
+
+def get_home_stats(hotel):
+    """
+    Returns the home tab context for `hotel` from today's HotelStats row (one indexed
+    lookup on hotel/day), building the row on the first dashboard load of the day.
+    The time-dependent counters are counted in the same query at the current time.
+    """
+    now = timezone.localtime(timezone.now())
+    stats = HotelStats.objects.filter(hotel=hotel, day=now.date()).annotate(
+        current_occupied_rooms=_count_subquery(
+            GuestRoomAssignment.objects.filter(_occupied_at(now), hotel=OuterRef('hotel'))
+        ),
+    ).first()
+    if stats is None:
+        stats, _drift = refresh_hotel_stats(hotel, now=now)
+    else:
+        for field in TIME_DEPENDENT_FIELDS:
+            setattr(stats, field, getattr(stats, f'current_{field}'))
+
+    values = {field: getattr(stats, field) for field in STATS_COUNTER_FIELDS}
+    values['reservations_chart_data'] = stats.reservations_chart_data
+    return _with_room_totals(values, hotel.total_rooms)
+
+
+def assignment_stats_snapshot(assignment):
+    """Captures the fields of an assignment that decide its contribution to HotelStats."""
+    return {field: getattr(assignment, field) for field in ASSIGNMENT_STATS_FIELDS}
+
+
+def assignment_contribution(snapshot, now):
+    """
+    Returns the counters a single assignment adds to the stats at `now`. This is the
+    per-row equivalent of the filters in compute_home_stats and must stay in sync with them.
+    """
+    contribution = {}
+    if not snapshot:
+        return contribution
+
+    status = snapshot['status']
+    check_in, check_out, created = snapshot['check_in_time'], snapshot['check_out_time'], snapshot['created_at']
+    today_start, tomorrow_start, chart_days = _stats_windows(now)
+
+    def within(value, start, end):
+        return value is not None and start <= value < end
+
+    contribution['occupied_rooms'] = int(status == 'checked_in' and check_in <= now <= check_out)
+    contribution['reserved_rooms'] = int(status == 'confirmed' and check_in >= tomorrow_start)
+    contribution['new_bookings_count'] = int(within(created, today_start, tomorrow_start))
+    contribution['check_ins_today_count'] = int(status == 'checked_in' and within(check_in, today_start, tomorrow_start))
+    contribution['check_outs_today_count'] = int(status == 'checked_out' and within(check_out, today_start, tomorrow_start))
+    for i, (_day, day_start, day_end) in enumerate(chart_days):
+        created_on_day = within(created, day_start, day_end)
+        checked_in_on_day = within(check_in, day_start, day_end)
+        contribution[f'booked_{i}'] = int((created_on_day or checked_in_on_day) and status in BOOKED_STATUSES)
+        contribution[f'cancelled_{i}'] = int(created_on_day and status == 'cancelled')
+    return contribution
+
+
+def apply_assignment_change(hotel_id, old_snapshot, new_snapshot):
+    """
+    Applies the difference between an assignment's old and new contribution to today's
+    HotelStats row. Does nothing if the row hasn't been built yet today; the next
+    dashboard load builds it from the raw tables anyway. TIME_DEPENDENT_FIELDS are patched
+    too, but only as of now; get_home_stats recounts them.
+    """
+    now = timezone.localtime(timezone.now())
+    old = assignment_contribution(old_snapshot, now)
+    new = assignment_contribution(new_snapshot, now)
+    delta = {key: new.get(key, 0) - old.get(key, 0) for key in set(old) | set(new)}
+    if not any(delta.values()):
+        return
+
+    with transaction.atomic():
+        stats = HotelStats.objects.select_for_update().filter(hotel_id=hotel_id, day=now.date()).first()
+        if stats is None:
+            return
+        for field in ASSIGNMENT_COUNTER_FIELDS:
+            setattr(stats, field, getattr(stats, field) + delta.get(field, 0))
+        for i, point in enumerate(stats.reservations_chart_data):
+            point['booked'] += delta.get(f'booked_{i}', 0)
+            point['cancelled'] += delta.get(f'cancelled_{i}', 0)
+        stats.save()
+
+
+def bump_hotel_stats(hotel_id, field, amount):
+    """Atomically adds `amount` to a single counter on today's HotelStats row, if it exists."""
+    if amount:
+        HotelStats.objects.filter(hotel_id=hotel_id, day=timezone.localdate()).update(
+            **{field: F(field) + amount, 'updated_at': timezone.now()}
+        )
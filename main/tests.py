@@ -1,3 +1,2271 @@
-from django.test import TestCase
+import csv
+import importlib
+import io
+import json
+import random
+import re
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from functools import partial
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .archive import archive_requests
+from .benchmarks import benchmark_context, compare_runs, run_benchmarks, stub_gemini
+from .models import Amenity, ArchivedGuestRequest, AssignmentRule, Charge, GuestRequest, GuestRoomAssignment, Hotel, HotelConfiguration, HotelStats, Room, StaffMember, UserProfile
+from .forms import GuestRoomAssignmentForm
+from .middleware import HotelContextMiddleware
+from .pagination import ASSIGNMENT_PAGE_ORDERING, DEFAULT_PAGE_SIZE, REQUEST_PAGE_ORDERING, encode_cursor, keyset_paginate
+from .routing import choose_staff, claim_next_request, history_rows, recount_staff_load, simulate_assignment
+from .availability import AvailabilityIndex, availability_index
+from .billing import add_charge, bill_amenity_request
+from .catalog import CATALOG_VERSION_KEY, amenity_catalog
+from .faq import FaqIndex, faq_index
+from .fragments import fragment_versions, invalidate_fragments
+from .provisioning import HASH_POOL_THRESHOLD, provision_staff
+from .seeding import seed_benchmark_data
+from .timing import clear_samples, recorded_samples
+from .versions import bump_version
+from .bookings import (
+    OVERLAP_ERROR_MESSAGE, BookingOverlapError, clean_booking, find_stored_overlaps, import_bookings, save_assignment,
+)
+from .search import (
+    filter_assignments_by_text, filter_requests_by_text, rebuild_assignment_index, rebuild_request_index,
+    search_assignments,
+)
+from .stats import compute_home_stats, get_home_stats, local_day_start, refresh_hotel_stats
+from .rooms import link_room_rows
+from .views import build_grouped_requests, filter_assignments, filter_requests, update_request_status, visible_requests
+
+
+def legacy_home_stats(hotel, now):
+    """
+    The per-count implementation the home tab used before main/stats.py, kept here as the
+    reference that compute_home_stats must match.
+    """
+    now = timezone.localtime(now)
+    today = now.date()
+
+    occupied_rooms = GuestRoomAssignment.objects.filter(
+        hotel=hotel, check_in_time__lte=now, check_out_time__gte=now, status='checked_in'
+    ).count()
+    reserved_rooms = GuestRoomAssignment.objects.filter(
+        hotel=hotel, check_in_time__date__gt=today, status='confirmed'
+    ).count()
+    not_ready_rooms = Room.objects.filter(
+        hotel=hotel, status__in=['cleaning', 'maintenance', 'out_of_service']
+    ).count()
+    available_rooms = max(hotel.total_rooms - occupied_rooms - reserved_rooms - not_ready_rooms, 0)
+
+    reservations_chart_data = []
+    for i in range(7):
+        chart_date = today - timedelta(days=6 - i)
+        reservations_chart_data.append({
+            "date": chart_date.strftime("%b %d"),
+            "booked": GuestRoomAssignment.objects.filter(
+                Q(created_at__date=chart_date) | Q(check_in_time__date=chart_date),
+                hotel=hotel, status__in=['confirmed', 'checked_in']
+            ).count(),
+            "cancelled": GuestRoomAssignment.objects.filter(
+                hotel=hotel, created_at__date=chart_date, status='cancelled'
+            ).count(),
+        })
+
+    return {
+        'total_rooms': hotel.total_rooms,
+        'occupied_rooms': occupied_rooms,
+        'reserved_rooms': reserved_rooms,
+        'available_rooms': available_rooms,
+        'not_ready_rooms': not_ready_rooms,
+        'new_bookings_count': GuestRoomAssignment.objects.filter(hotel=hotel, created_at__date=today).count(),
+        'check_ins_today_count': GuestRoomAssignment.objects.filter(
+            hotel=hotel, check_in_time__date=today, status='checked_in'
+        ).count(),
+        'check_outs_today_count': GuestRoomAssignment.objects.filter(
+            hotel=hotel, check_out_time__date=today, status='checked_out'
+        ).count(),
+        'total_requests_count': GuestRequest.objects.filter(hotel=hotel).count(),
+        'reservations_chart_data': reservations_chart_data,
+    }
+
+
+class HomeStatsTests(TestCase):
+    """compute_home_stats must return exactly what the old per-count queries returned."""
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(42)
+        cls.now = timezone.localtime(timezone.now()).replace(hour=13, minute=30, second=0, microsecond=0)
+        today_start = local_day_start(cls.now.date())
+
+        cls.hotel = Hotel.objects.create(name='Seeded Hotel', total_rooms=60)
+        other_hotel = Hotel.objects.create(name='Other Hotel', total_rooms=10)
+
+        statuses = [value for value, _label in Room.ROOM_STATUS_CHOICES]
+        for n in range(40):
+            Room.objects.create(hotel=cls.hotel, room_number=str(100 + n), status=rng.choice(statuses))
+        Room.objects.create(hotel=other_hotel, room_number='1', status='cleaning')
+
+        assignment_statuses = [value for value, _label in GuestRoomAssignment.STATUS_CHOICES]
+        # Offsets include exact local-midnight boundaries so half-open ranges are exercised.
+        boundary_offsets = [timedelta(0), timedelta(microseconds=-1), timedelta(days=1), timedelta(days=-6)]
+        for n in range(400):
+            hotel = cls.hotel if n % 10 else other_hotel
+            if n < len(boundary_offsets) * 10:
+                check_in = today_start + boundary_offsets[n % len(boundary_offsets)]
+            else:
+                check_in = today_start + timedelta(minutes=rng.randint(-20 * 24 * 60, 20 * 24 * 60))
+            check_out = check_in + timedelta(hours=rng.randint(1, 24 * 5))
+            assignment = GuestRoomAssignment.objects.create(
+                hotel=hotel, room_number=str(100 + n % 40), guest_names=f'Guest {n}',
+                check_in_time=check_in, check_out_time=check_out, status=rng.choice(assignment_statuses),
+            )
+            created_at = today_start + timedelta(minutes=rng.randint(-10 * 24 * 60, 24 * 60 - 1))
+            GuestRoomAssignment.objects.filter(pk=assignment.pk).update(created_at=created_at)
+
+        for n in range(25):
+            GuestRequest.objects.create(hotel=cls.hotel, room_number='101', raw_text=f'Request {n}')
+        GuestRequest.objects.create(hotel=other_hotel, room_number='1', raw_text='Elsewhere')
+
+    def test_matches_legacy_implementation(self):
+        self.assertEqual(compute_home_stats(self.hotel, now=self.now), legacy_home_stats(self.hotel, self.now))
+
+    def test_matches_legacy_implementation_across_days(self):
+        for days in (-3, 1, 8):
+            now = self.now + timedelta(days=days)
+            with self.subTest(now=now):
+                self.assertEqual(compute_home_stats(self.hotel, now=now), legacy_home_stats(self.hotel, now))
+
+    def test_uses_two_queries(self):
+        with self.assertNumQueries(2):
+            compute_home_stats(self.hotel, now=self.now)
+
+    def test_empty_hotel(self):
+        empty = Hotel.objects.create(name='Empty', total_rooms=5)
+        stats = compute_home_stats(empty, now=self.now)
+        self.assertEqual(stats, legacy_home_stats(empty, self.now))
+        self.assertEqual(stats['available_rooms'], 5)
+
+
+class HotelStatsMaintenanceTests(TestCase):
+    """Signal-maintained HotelStats rows must agree with a rebuild from the raw tables."""
+
+    def setUp(self):
+        self.hotel = Hotel.objects.create(name='Stats Hotel', total_rooms=20)
+        self.now = timezone.localtime(timezone.now())
+        self.room = Room.objects.create(hotel=self.hotel, room_number='101')
+        # Build today's row before any changes so the signals have something to update.
+        get_home_stats(self.hotel)
+
+    def assertStatsConsistent(self):
+        self.assertEqual(get_home_stats(self.hotel), compute_home_stats(self.hotel))
+        _stats, drift = refresh_hotel_stats(self.hotel)
+        self.assertEqual(drift, {})
+
+    def test_assignment_lifecycle(self):
+        assignment = GuestRoomAssignment.objects.create(
+            hotel=self.hotel, room_number='101', guest_names='A',
+            check_in_time=self.now - timedelta(hours=1), check_out_time=self.now + timedelta(days=2),
+        )
+        self.assertStatsConsistent()
+        assignment.status = 'checked_in'
+        assignment.save()
+        self.assertStatsConsistent()
+        assignment.check_in_time = self.now + timedelta(days=3)
+        assignment.check_out_time = self.now + timedelta(days=4)
+        assignment.status = 'confirmed'
+        assignment.save()
+        self.assertStatsConsistent()
+        assignment.status = 'cancelled'
+        assignment.save()
+        self.assertStatsConsistent()
+        assignment.delete()
+        self.assertStatsConsistent()
+
+    def test_room_status_and_requests(self):
+        self.room.status = 'cleaning'
+        self.room.save()
+        self.assertStatsConsistent()
+        self.room.status = 'maintenance'
+        self.room.save()
+        self.assertStatsConsistent()
+        request = GuestRequest.objects.create(hotel=self.hotel, room_number='101', raw_text='Towels')
+        self.assertStatsConsistent()
+        self.room.delete()
+        request.delete()
+        self.assertStatsConsistent()
+
+    def test_late_checkout_is_not_counted(self):
+        assignment = GuestRoomAssignment.objects.create(
+            hotel=self.hotel, room_number='101', guest_names='A', status='checked_in',
+            check_in_time=self.now - timedelta(days=1), check_out_time=self.now + timedelta(minutes=1),
+        )
+        self.assertEqual(get_home_stats(self.hotel)['occupied_rooms'], 1)
+        with mock.patch('django.utils.timezone.now', return_value=self.now + timedelta(minutes=30)):
+            # Past check-out but not checked out yet: no longer holding the room.
+            self.assertEqual(get_home_stats(self.hotel), compute_home_stats(self.hotel))
+            assignment.status = 'checked_out'
+            assignment.save()
+            stats = get_home_stats(self.hotel)
+            self.assertEqual(stats, compute_home_stats(self.hotel))
+            self.assertEqual(stats['occupied_rooms'], 0)
+
+    def test_home_tab_is_single_read(self):
+        with self.assertNumQueries(1):
+            get_home_stats(self.hotel)
+
+    def test_reconcile_repairs_drift(self):
+        HotelStats.objects.filter(hotel=self.hotel).update(occupied_rooms=99, total_requests_count=-3)
+        _stats, drift = refresh_hotel_stats(self.hotel)
+        self.assertEqual(drift, {'occupied_rooms': (99, 0), 'total_requests_count': (-3, 0)})
+        self.assertStatsConsistent()
+
+
+@override_settings(SHARED_CACHE=True, SESSION_ENGINE='django.contrib.sessions.backends.cached_db')
+class DashboardFragmentCacheTests(TestCase):
+    """Cached dashboard fragments are reused until their own models change."""
+
+    def setUp(self):
+        cache.clear()
+        self.hotel = Hotel.objects.create(name='Cache Hotel', total_rooms=5)
+        self.user = User.objects.create_user('frontdesk', password='pw')
+        self.user.profile.hotel = self.hotel
+        self.user.profile.save()
+        self.client.force_login(self.user)
+
+    def test_requests_fragment_reused_and_invalidated(self):
+        GuestRequest.objects.create(hotel=self.hotel, room_number='101', raw_text='Need towels')
+        self.client.get('/dashboard/requests/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            GuestRequest.objects.filter(hotel=self.hotel).update(raw_text='Edited without signals')
+        self.assertContains(self.client.get('/dashboard/requests/'), 'Need towels')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            GuestRequest.objects.create(hotel=self.hotel, room_number='102', raw_text='Need pillows')
+        response = self.client.get('/dashboard/requests/')
+        self.assertContains(response, 'Need pillows')
+        self.assertNotContains(response, 'Need towels')
+
+    def test_staff_list_invalidated_by_staff_changes_only(self):
+        self.client.get('/dashboard/amenities/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Room.objects.create(hotel=self.hotel, room_number='101')
+        with self.assertNumQueries(1):
+            # just the user: session, hotel context and every fragment come from cache
+            self.client.get('/dashboard/amenities/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            StaffMember.objects.create(user=User.objects.create_user('housekeeper'), hotel=self.hotel,
+                                       category='housekeeping')
+        self.assertContains(self.client.get('/dashboard/amenities/'), 'housekeeper (Housekeeping)', count=2)
+
+    @override_settings(SHARED_CACHE=False)
+    def test_stamps_live_in_the_database_without_a_shared_cache(self):
+        versions = fragment_versions(self.hotel.pk)
+        invalidate_fragments(self.hotel.pk, 'grouped_requests')
+        # Another worker has its own (empty) cache and still sees the bump.
+        cache.clear()
+        bumped = fragment_versions(self.hotel.pk)
+        self.assertNotEqual(bumped['grouped_requests'], versions['grouped_requests'])
+        self.assertEqual(bumped['kpi_header'], versions['kpi_header'])
+
+
+class DashboardJsonApiTests(TestCase):
+    """The JSON tab APIs return the same rows the server-rendered tabs show."""
+
+    def setUp(self):
+        cache.clear()
+        self.hotel = Hotel.objects.create(name='Api Hotel', total_rooms=5)
+        self.user = User.objects.create_user('api-frontdesk', password='pw')
+        self.user.profile.hotel = self.hotel
+        self.user.profile.save()
+        self.client.force_login(self.user)
+
+    def test_requests_tab(self):
+        Room.objects.create(hotel=self.hotel, room_number='101')
+        GuestRoomAssignment.objects.create(
+            hotel=self.hotel, room_number='101', guest_names='Ada',
+            check_in_time=timezone.now(), check_out_time=timezone.now() + timedelta(days=1),
+        )
+        active = GuestRequest.objects.create(hotel=self.hotel, room_number='101', raw_text='Towels',
+                                             request_type='housekeeping')
+        GuestRequest.objects.create(hotel=self.hotel, room_number='101', raw_text='Done', status='completed')
+
+        data = self.client.get('/api/dashboard/requests/active/').json()
+        self.assertTrue(data['success'])
+        self.assertEqual([group['request_type'] for group in data['groups']], ['housekeeping'])
+        item = data['groups'][0]['requests'][0]
+        self.assertEqual((item['id'], item['guest_names'], item['is_assigned']), (active.id, 'Ada', False))
+        self.assertIsNone(data['next_cursor'])
+
+        self.assertEqual(self.client.get('/api/dashboard/requests/bogus/').status_code, 400)
+
+    def test_assignments_tab_filters_and_pages(self):
+        for n in range(3):
+            GuestRoomAssignment.objects.create(
+                hotel=self.hotel, room_number=str(200 + n), guest_names=f'Guest {n}',
+                check_in_time=timezone.now() + timedelta(hours=n), check_out_time=timezone.now() + timedelta(days=2),
+            )
+        data = self.client.get('/api/dashboard/assignments/', {'room_number': '20'}).json()
+        self.assertEqual([row['room_number'] for row in data['assignments']], ['202', '201', '200'])
+        self.assertEqual(data['filter_params'], {'room_number': '20'})
+
+        data = self.client.get('/api/dashboard/assignments/', {'guest_names': 'Guest 1'}).json()
+        self.assertEqual([row['guest_names'] for row in data['assignments']], ['Guest 1'])
+
+    def test_save_returns_row(self):
+        now = timezone.localtime(timezone.now())
+        form_data = {
+            'room_number_input': '301', 'guest_names': 'Grace', 'status': 'confirmed',
+            'check_in_date': now.date().isoformat(), 'check_in_time_input': '14:00',
+            'check_out_date': (now + timedelta(days=2)).date().isoformat(), 'check_out_time_input': '11:00',
+            'total_bill_amount': '120', 'amount_paid': '20',
+        }
+        response = self.client.post('/dashboard/guests/', form_data)
+        self.assertEqual(response.status_code, 200, response.content)
+        assignment = response.json()['assignment']
+        self.assertEqual((assignment['guest_names'], assignment['amount_paid']), ('Grace', '20.00'))
+
+        # Edits post the same form with assignment_id and get the updated row back.
+        response = self.client.post('/dashboard/guests/', {**form_data, 'assignment_id': assignment['id'],
+                                                           'amount_paid': '120'})
+        self.assertEqual(response.json()['assignment']['amount_paid'], '120.00')
+        self.assertEqual(GuestRoomAssignment.objects.get().amount_paid, 120)
+
+    def test_edits_keep_charges_added_since(self):
+        now = timezone.localtime(timezone.now())
+        form_data = {
+            'room_number_input': '302', 'guest_names': 'Hana', 'status': 'confirmed',
+            'check_in_date': now.date().isoformat(), 'check_in_time_input': '14:00',
+            'check_out_date': (now + timedelta(days=2)).date().isoformat(), 'check_out_time_input': '11:00',
+            'total_bill_amount': '120', 'amount_paid': '0',
+        }
+        assignment_id = self.client.post('/dashboard/guests/', form_data).json()['assignment']['id']
+        add_charge(GuestRoomAssignment.objects.get(pk=assignment_id), Decimal('15.00'), 'Minibar')
+
+        # The edit form still shows (and posts) the total from before the charge.
+        response = self.client.post('/dashboard/guests/', {**form_data, 'assignment_id': assignment_id,
+                                                           'guest_names': 'Hana Ito', 'total_bill_amount': '1'})
+        self.assertEqual(response.json()['assignment']['total_bill_amount'], '135.00')
+        stay = GuestRoomAssignment.objects.get(pk=assignment_id)
+        self.assertEqual((stay.guest_names, stay.total_bill_amount), ('Hana Ito', Decimal('135.00')))
+
+
+class KeysetPaginationTests(TestCase):
+    """Keyset pages visit every row once, in order, and bad cursors are answered with a 400."""
+
+    def setUp(self):
+        cache.clear()
+        self.hotel = Hotel.objects.create(name='Paging Hotel', total_rooms=5)
+        self.user = User.objects.create_user('paging-frontdesk', password='pw')
+        self.user.profile.hotel = self.hotel
+        self.user.profile.save()
+        self.client.force_login(self.user)
+
+    def walk(self, url, key, params=None):
+        """Follows next_cursor through an API and returns the ids of every page, in order."""
+        ids, params = [], dict(params or {})
+        while True:
+            data = self.client.get(url, params).json()
+            ids += key(data)
+            if not data['next_cursor']:
+                return ids
+            params['cursor'] = data['next_cursor']
+
+    def test_tied_timestamps_across_page_boundaries(self):
+        moment = timezone.now() - timedelta(hours=1)
+        requests = [
+            GuestRequest.objects.create(hotel=self.hotel, room_number='101', raw_text=f'Request {n}', status='completed')
+            for n in range(9)
+        ]
+        # Five rows share a timestamp, so every page boundary falls inside the tie; one row is
+        # a microsecond later to check the cursor doesn't round.
+        GuestRequest.objects.filter(pk__in=[r.pk for r in requests[2:7]]).update(timestamp=moment)
+        GuestRequest.objects.filter(pk=requests[7].pk).update(timestamp=moment + timedelta(microseconds=1))
+        expected = list(GuestRequest.objects.order_by('-timestamp', 'id').values_list('id', flat=True))
+
+        ids, cursor = [], None
+        while True:
+            page, cursor = keyset_paginate(GuestRequest.objects.all(), REQUEST_PAGE_ORDERING, cursor, page_size=2)
+            ids += [row.pk for row in page]
+            if cursor is None:
+                break
+        self.assertEqual(ids, expected)
+
+    def test_all_tab_pages_through_every_request(self):
+        GuestRequest.objects.bulk_create([
+            GuestRequest(hotel=self.hotel, room_number='101', raw_text=f'Request {n}',
+                         request_type=('housekeeping', 'maintenance')[n % 2])
+            for n in range(DEFAULT_PAGE_SIZE + 12)
+        ])
+        GuestRequest.objects.filter(pk__in=GuestRequest.objects.values('pk')[:20]).update(timestamp=timezone.now())
+        ids = self.walk('/api/dashboard/requests/all/',
+                        lambda data: [item['id'] for group in data['groups'] for item in group['requests']])
+        self.assertEqual(sorted(ids), sorted(GuestRequest.objects.values_list('id', flat=True)))
+
+        first_page = self.client.get('/api/dashboard/requests/all/').json()
+        response = self.client.get('/dashboard/requests/all/', {'cursor': first_page['next_cursor']})
+        page = response.context['requests_page']
+        self.assertTrue(page['is_paginated_page'])
+        self.assertIsNone(page['next_page_query'])
+        self.assertEqual(sum(len(group['requests']) for group in page['groups']), 12)
+
+    def test_guest_management_pages_keep_filters(self):
+        check_in = timezone.now()
+        GuestRoomAssignment.objects.bulk_create([
+            GuestRoomAssignment(hotel=self.hotel, room_number=str(100 + n), guest_names=f'Guest {n}',
+                                status='checked_in' if n % 4 else 'confirmed',
+                                check_in_time=check_in + timedelta(days=n // 10),
+                                check_out_time=check_in + timedelta(days=n // 10 + 1))
+            for n in range(DEFAULT_PAGE_SIZE * 2 + 10)
+        ])
+        ids = self.walk('/api/dashboard/assignments/', lambda data: [row['id'] for row in data['assignments']])
+        self.assertEqual(ids, list(GuestRoomAssignment.objects.order_by('-check_in_time', 'id').values_list('id', flat=True)))
+
+        checked_in = GuestRoomAssignment.objects.filter(status='checked_in').order_by('-check_in_time', 'id')
+        ids = self.walk('/api/dashboard/assignments/', lambda data: [row['id'] for row in data['assignments']],
+                        {'status': 'checked_in'})
+        self.assertEqual(ids, list(checked_in.values_list('id', flat=True)))
+
+        # The server-rendered tab carries the filter into its "Older" link.
+        response = self.client.get('/dashboard/guests/', {'status': 'checked_in'})
+        next_page_query = response.context['next_page_query']
+        self.assertIn('status=checked_in', next_page_query)
+        response = self.client.get(f'/dashboard/guests/?{next_page_query}')
+        self.assertEqual([a.pk for a in response.context['all_assignments']], ids[DEFAULT_PAGE_SIZE:DEFAULT_PAGE_SIZE * 2])
+
+    def test_bad_cursors_are_rejected(self):
+        cursors = [
+            'not a cursor!',
+            encode_cursor([1]),
+            encode_cursor([None, None]),
+            encode_cursor([{}, 1]),
+            encode_cursor([timezone.now(), 'x']),
+            encode_cursor([timezone.now(), 10 ** 30]),
+        ]
+        urls = [
+            '/api/dashboard/requests/all/', '/api/dashboard/requests/archive/', '/api/dashboard/assignments/',
+            '/api/requests/search/?q=towels', '/dashboard/requests/all/', '/dashboard/requests/archive/',
+            '/dashboard/guests/',
+        ]
+        for url in urls:
+            for cursor in cursors:
+                with self.subTest(url=url, cursor=cursor), mock.patch('builtins.print'):
+                    response = self.client.get(url, {'cursor': cursor})
+                    self.assertEqual(response.status_code, 400)
+                    if url.startswith('/api/'):
+                        self.assertFalse(response.json()['success'])
+
+
+class AssignmentSearchTests(TestCase):
+    """Guest-management search goes through the text index and stays in sync with writes."""
+
+    def setUp(self):
+        self.hotel = Hotel.objects.create(name='Search Hotel', total_rooms=5)
+        self.other_hotel = Hotel.objects.create(name='Elsewhere', total_rooms=5)
+        now = timezone.now()
+        self.anna = self.make(self.hotel, '101', 'Anna Smith, Bob Smith', now)
+        self.annabel = self.make(self.hotel, '1010', 'Annabel Lee', now + timedelta(days=1))
+        self.make(self.other_hotel, '101', 'Anna Other', now)
+
+    def make(self, hotel, room_number, guest_names, check_in):
+        return GuestRoomAssignment.objects.create(
+            hotel=hotel, room_number=room_number, guest_names=guest_names,
+            check_in_time=check_in, check_out_time=check_in + timedelta(days=2),
+        )
+
+    def search(self, text):
+        return [assignment.pk for assignment in search_assignments(self.hotel, text)]
+
+    def test_ranked_prefix_search_is_hotel_scoped(self):
+        self.assertCountEqual(self.search('ann'), [self.anna.pk, self.annabel.pk])
+        self.assertEqual(self.search('smi ann'), [self.anna.pk])
+        self.assertEqual(self.search('1010'), [self.annabel.pk])
+        self.assertEqual(self.search('  '), [])
+        self.assertEqual(self.search('"ann* OR'), [])  # punctuation never reaches the FTS syntax
+
+    def test_field_filters(self):
+        queryset = GuestRoomAssignment.objects.filter(hotel=self.hotel)
+        self.assertCountEqual(filter_assignments_by_text(queryset, 'room_number', '101'), [self.anna, self.annabel])
+        self.assertEqual(list(filter_assignments_by_text(queryset, 'guest_names', 'lee')), [self.annabel])
+        self.assertEqual(list(filter_assignments_by_text(queryset, 'guest_names', '1010')), [])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.annabel.guest_names = 'Zoe Park'
+        self.annabel.save()
+        self.assertEqual(self.search('ann'), [self.anna.pk])
+        self.assertEqual(self.search('zoe'), [self.annabel.pk])
+        self.anna.delete()
+        self.assertEqual(self.search('smith'), [])
+
+    def test_rebuild_picks_up_writes_that_skip_signals(self):
+        GuestRoomAssignment.objects.filter(pk=self.anna.pk).update(guest_names='Carl Jones')
+        self.assertEqual(self.search('carl'), [])
+        self.assertEqual(rebuild_assignment_index(batch_size=2), 3)
+        self.assertEqual(self.search('carl'), [self.anna.pk])
+
+
+class RequestSearchTests(TestCase):
+    """The request search API is indexed, hotel/staff scoped, filterable and keyset paged."""
+
+    def setUp(self):
+        cache.clear()
+        self.hotel = Hotel.objects.create(name='Search Hotel', total_rooms=5)
+        self.user = User.objects.create_user('search-frontdesk', password='pw')
+        self.user.profile.hotel = self.hotel
+        self.user.profile.save()
+        self.client.force_login(self.user)
+
+        self.ac = GuestRequest.objects.create(
+            hotel=self.hotel, room_number='101', raw_text='The AC is not cooling', request_type='maintenance',
+        )
+        self.checkout = GuestRequest.objects.create(
+            hotel=self.hotel, room_number='102', raw_text='Can I stay longer?', status='completed',
+            staff_notes='Approved late checkout until 2pm',
+            chat_history=json.dumps([
+                {'role': 'user', 'parts': [{'text': 'Is a <late> checkout possible?'}]},
+                {'role': 'model', 'parts': [{'text': 'Let me check with the front desk.'}]},
+            ]),
+        )
+        elsewhere = Hotel.objects.create(name='Elsewhere', total_rooms=5)
+        GuestRequest.objects.create(hotel=elsewhere, room_number='101', raw_text='AC broken')
+
+    def search(self, **params):
+        return self.client.get('/api/requests/search/', params).json()
+
+    def test_searches_text_notes_and_chat(self):
+        self.assertEqual([r['id'] for r in self.search(q='ac')['results']], [self.ac.id])
+        self.assertEqual([r['id'] for r in self.search(q='late check')['results']], [self.checkout.id])
+        self.assertEqual([r['id'] for r in self.search(q='front desk')['results']], [self.checkout.id])
+        # Only the message texts of a chat are indexed, not its JSON keys and roles.
+        for structure in ('role', 'parts', 'text', 'user', 'model'):
+            self.assertEqual(self.search(q=structure)['results'], [])
+        self.assertEqual(self.client.get('/api/requests/search/', {'q': '!!'}).status_code, 400)
+
+    def test_snippets_are_highlighted_and_escaped(self):
+        snippet = self.search(q='possible')['results'][0]['snippet']
+        self.assertIn('<mark>possible</mark>', snippet)
+        self.assertIn('&lt;late&gt;', snippet)
+
+    def test_filters_and_paging(self):
+        self.assertEqual(self.search(q='ac', status='completed')['results'], [])
+        self.assertEqual(len(self.search(q='ac', request_type='maintenance')['results']), 1)
+        today = timezone.localdate()
+        self.assertEqual(len(self.search(q='ac', date_from=today.isoformat(), date_to=today.isoformat())['results']), 1)
+        self.assertEqual(self.search(q='ac', date_to=(today - timedelta(days=1)).isoformat())['results'], [])
+
+        for n in range(60):
+            GuestRequest.objects.create(hotel=self.hotel, room_number='103', raw_text=f'Towels please {n}')
+        first = self.search(q='towels')
+        second = self.search(q='towels', cursor=first['next_cursor'])
+        self.assertEqual(len(first['results']) + len(second['results']), 60)
+        self.assertIsNone(second['next_cursor'])
+
+    def test_rebuild_and_staff_scope(self):
+        GuestRequest.objects.filter(pk=self.ac.pk).update(staff_notes='Replaced compressor')
+        self.assertEqual(self.search(q='compressor')['results'], [])
+        self.assertEqual(rebuild_request_index(batch_size=2), 3)
+        self.assertEqual(len(self.search(q='compressor')['results']), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            StaffMember.objects.create(user=self.user, hotel=self.hotel, category='housekeeping')
+        self.assertEqual(self.search(q='compressor')['results'], [])
+
+
+class ExportTests(TestCase):
+    """Exports stream rows straight from values_list, with the dashboard's filters."""
+
+    def setUp(self):
+        cache.clear()
+        self.hotel = Hotel.objects.create(name='Export Hotel', total_rooms=5)
+        self.user = User.objects.create_user('finance', password='pw')
+        self.user.profile.hotel = self.hotel
+        self.user.profile.save()
+        self.client.force_login(self.user)
+        now = timezone.now()
+        for n in range(5):
+            GuestRoomAssignment.objects.create(
+                hotel=self.hotel, room_number=str(100 + n), guest_names=f'Guest, "{n}"',
+                check_in_time=now, check_out_time=now + timedelta(days=1), amount_paid='12.50',
+                status='checked_out' if n % 2 else 'confirmed',
+            )
+        GuestRequest.objects.create(hotel=self.hotel, room_number='100', raw_text='Late checkout please')
+        GuestRequest.objects.create(hotel=self.hotel, room_number='101', raw_text='Extra towels', status='completed')
+
+    def test_assignment_csv_streams_filtered_rows(self):
+        response = self.client.get('/api/export/assignments/', {'status': 'checked_out'})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(rows[0][:3], ['id', 'room_number', 'guest_names'])
+        self.assertEqual([row[1] for row in rows[1:]], ['101', '103'])
+        self.assertEqual(rows[1][2], 'Guest, "1"')
+        self.assertEqual(rows[1][rows[0].index('amount_paid')], '12.50')
+
+    def test_request_jsonl_and_command(self):
+        response = self.client.get('/api/export/requests/', {'format': 'jsonl', 'tab': 'archive'})
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([line['raw_text'] for line in lines], ['Extra towels'])
+
+        output = io.StringIO()
+        call_command('export_data', 'requests', hotel=self.hotel.pk, filters=['q=checkout'], stdout=output)
+        rows = list(csv.DictReader(output.getvalue().splitlines()))
+        self.assertEqual([row['raw_text'] for row in rows], ['Late checkout please'])
+
+        self.assertEqual(self.client.get('/api/export/rooms/').status_code, 400)
+
+
+class BookingImportTests(TestCase):
+    """Bulk import validates overlaps in memory and writes with a fixed number of queries."""
+
+    def setUp(self):
+        cache.clear()
+        self.hotel = Hotel.objects.create(name='Import Hotel', total_rooms=50)
+        self.day = local_day_start(timezone.localdate() + timedelta(days=10))
+        GuestRoomAssignment.objects.create(
+            hotel=self.hotel, room_number='101', guest_names='Existing',
+            check_in_time=self.day, check_out_time=self.day + timedelta(days=2),
+        )
+        Room.objects.create(hotel=self.hotel, room_number='101')
+
+    def booking(self, room, start_days, end_days, **extra):
+        return {
+            'room_number': room, 'guest_names': f'Guest {room}',
+            'check_in': (self.day + timedelta(days=start_days)).isoformat(),
+            'check_out': (self.day + timedelta(days=end_days)).isoformat(), **extra,
+        }
+
+    def test_reports_row_errors_and_imports_the_rest(self):
+        records = [
+            self.booking('101', 1, 3),                   # overlaps the stored stay
+            self.booking('101', 2, 4),                   # back-to-back with the stored stay: fine
+            self.booking('102', 0, 2),
+            self.booking('102', 1, 5),                   # overlaps row 3
+            self.booking('102', 2, 3),                   # starts when row 3 ends: fine
+            self.booking('103', 2, 1),                   # check-out before check-in
+            {'room_number': '104', 'guest_names': '', 'check_in': 'soon', 'status': 'lost'},
+        ]
+        report = import_bookings(self.hotel, records)
+
+        self.assertEqual(report['created'], 3)
+        self.assertEqual(report['rooms_created'], 1)
+        self.assertEqual([error['row'] for error in report['errors']], [1, 4, 6, 7])
+        self.assertIn('Overlaps row 3', report['errors'][1]['errors'][0])
+        self.assertEqual(len(report['errors'][3]['errors']), 4)
+        self.assertEqual(GuestRoomAssignment.objects.filter(hotel=self.hotel).count(), 4)
+        self.assertTrue(Room.objects.filter(hotel=self.hotel, room_number='102').exists())
+        self.assertEqual(len(search_assignments(self.hotel, 'guest 102')), 2)
+
+    def test_matches_form_overlap_rule(self):
+        rng = random.Random(7)
+        stored = [
+            GuestRoomAssignment.objects.create(
+                hotel=self.hotel, room_number=str(200 + n % 5), guest_names='Stored',
+                check_in_time=self.day + timedelta(hours=rng.randint(0, 400)),
+                check_out_time=self.day + timedelta(hours=rng.randint(401, 800)) if n % 3 == 0 else
+                self.day + timedelta(hours=rng.randint(0, 400) + 500),
+            )
+            for n in range(15)
+        ]
+        records = []
+        for n in range(200):
+            start = rng.randint(-100, 1000)
+            records.append({
+                'room_number': str(200 + n % 6), 'guest_names': 'New',
+                'check_in': (self.day + timedelta(hours=start)).isoformat(),
+                'check_out': (self.day + timedelta(hours=start + rng.randint(1, 60))).isoformat(),
+            })
+        bookings = [(row, clean_booking(record)[0]) for row, record in enumerate(records, start=1)]
+        expected = {
+            row for row, booking in bookings
+            if GuestRoomAssignment.objects.filter(
+                hotel=self.hotel, room_number=booking['room_number'],
+                check_in_time__lt=booking['check_out_time'], check_out_time__gt=booking['check_in_time'],
+            ).exists()
+        }
+        self.assertTrue(expected and stored)
+        self.assertEqual(find_stored_overlaps(self.hotel, bookings, batch_size=4), expected)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        get_home_stats(self.hotel)
+        query_counts = []
+        for rows in (30, 300):
+            records = [self.booking(f'{rows}-{n}', 0, 1) for n in range(rows)]
+            with CaptureQueriesContext(connection) as queries:
+                report = import_bookings(self.hotel, records, batch_size=1000)
+            self.assertEqual((report['created'], report['errors']), (rows, []))
+            # Only the number of multi-row INSERT batches depends on the row count.
+            query_counts.append(len([q for q in queries.captured_queries if not q['sql'].startswith('INSERT')]))
+        self.assertEqual(query_counts[0], query_counts[1])
+        self.assertLess(query_counts[1], 15)
+
+    def test_api_and_command(self):
+        user = User.objects.create_user('importer', password='pw')
+        user.profile.hotel = self.hotel
+        user.profile.save()
+        self.client.force_login(user)
+        response = self.client.post('/api/assignments/import/?dry_run=1', [self.booking('401', 0, 1)],
+                                    content_type='application/json')
+        self.assertEqual((response.json()['created'], GuestRoomAssignment.objects.count()), (1, 1))
+
+        upload = io.BytesIO(b'room_number,guest_names,check_in,check_out\n402,Ann,2030-01-01 14:00,2030-01-02 11:00\n')
+        upload.name = 'bookings.csv'
+        self.assertEqual(self.client.post('/api/assignments/import/', {'file': upload}).json()['created'], 1)
+        self.assertEqual(self.client.post('/api/assignments/import/', b'{}', content_type='application/json').status_code, 400)
+
+    def test_cancelled_stays_dont_block_imports(self):
+        GuestRoomAssignment.objects.update(status='cancelled')
+        report = import_bookings(self.hotel, [
+            self.booking('101', 0, 2),
+            self.booking('101', 1, 3, status='no_show'),   # overlaps row 1, but doesn't hold the room
+            self.booking('101', 1, 2),                     # overlaps row 1
+        ])
+        self.assertEqual((report['created'], [error['row'] for error in report['errors']]), (2, [3]))
+
+    def test_unreadable_files_and_late_overlaps_are_client_errors(self):
+        user = User.objects.create_user('importer', password='pw')
+        user.profile.hotel = self.hotel
+        user.profile.save()
+        self.client.force_login(user)
+
+        upload = io.BytesIO('room_number,guest_names,check_in,check_out\n402,Zoë,2030-01-01 14:00,2030-01-02 11:00\n'.encode('latin-1'))
+        upload.name = 'bookings.csv'
+        response = self.client.post('/api/assignments/import/', {'file': upload})
+        self.assertEqual((response.status_code, response.json()['error']), (400, 'Import files must be UTF-8 encoded.'))
+
+        # A stay saved after the overlap check trips the PostgreSQL exclusion constraint on insert.
+        violation = IntegrityError('conflicting key value violates exclusion constraint "gra_no_room_overlap"')
+        with mock.patch.object(GuestRoomAssignment.objects, 'bulk_create', side_effect=violation):
+            with self.assertRaises(BookingOverlapError):
+                import_bookings(self.hotel, [self.booking('403', 0, 1)])
+            response = self.client.post('/api/assignments/import/', [self.booking('403', 0, 1)],
+                                        content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Room.objects.filter(hotel=self.hotel, room_number='403').exists())
+
+
+class QueryPlanTests(TestCase):
+    """
+    The hot dashboard/guest queries must be answered from an index, not a full table scan.
+    Each check runs the real code (view helpers, keyset pages, views through the client),
+    captures its SELECTs and explains them: on SQLite every table access must be a SEARCH,
+    on PostgreSQL (with sequential scans disabled) no seq scan may remain.
+    """
+
+    HOTELS = 20
+    REQUESTS_PER_HOTEL = 250
+    ASSIGNMENTS_PER_HOTEL = 150
+    STAFF_PER_HOTEL = 10
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(35)
+        now = timezone.now()
+        cls.hotels = Hotel.objects.bulk_create([
+            Hotel(name=f'Plan Hotel {n}', total_rooms=100) for n in range(cls.HOTELS)
+        ])
+        cls.hotel = cls.hotels[0]
+        user = User.objects.create_user('plan-staff', password='pw')
+        cls.staff = StaffMember.objects.create(user=user, hotel=cls.hotel, category='housekeeping')
+
+        GuestRequest.objects.bulk_create([
+            GuestRequest(
+                hotel=hotel, room_number=str(100 + rng.randint(0, 99)), raw_text='Need towels',
+                request_type=rng.choice(['housekeeping', 'maintenance', 'casual_chat']),
+                status=rng.choice(['pending', 'in_progress', 'completed', 'cancelled']),
+                assigned_staff=cls.staff if hotel is cls.hotel and n % 5 == 0 else None,
+                timestamp=now - timedelta(minutes=rng.randint(0, 60 * 24 * 90)),
+            )
+            for hotel in cls.hotels for n in range(cls.REQUESTS_PER_HOTEL)
+        ], batch_size=500)
+        assignments = []
+        for hotel in cls.hotels:
+            for n in range(cls.ASSIGNMENTS_PER_HOTEL):
+                check_in = now + timedelta(hours=rng.randint(-24 * 90, 24 * 30))
+                assignments.append(GuestRoomAssignment(
+                    hotel=hotel, room_number=str(100 + rng.randint(0, 99)), guest_names=f'Guest {n}',
+                    check_in_time=check_in, check_out_time=check_in + timedelta(days=rng.randint(1, 5)),
+                    status=rng.choice(['confirmed', 'checked_in', 'checked_out', 'cancelled']),
+                ))
+        GuestRoomAssignment.objects.bulk_create(assignments, batch_size=500)
+        # Rooms 100-149 exist, so their rows go through the room FK; 150-199 only have room_number.
+        known_rooms = [str(number) for number in range(100, 150)]
+        Room.objects.bulk_create([Room(hotel=hotel, room_number=number) for hotel in cls.hotels for number in known_rooms])
+        for hotel in cls.hotels:
+            link_room_rows(hotel.pk, known_rooms)
+
+        # Realistically sized staff tables, so joins to them are planned as key lookups too.
+        users = User.objects.bulk_create([
+            User(username=f'plan-staff-{hotel.pk}-{n}') for hotel in cls.hotels for n in range(cls.STAFF_PER_HOTEL)
+        ])
+        UserProfile.objects.bulk_create([
+            UserProfile(user=u, hotel=cls.hotels[i // cls.STAFF_PER_HOTEL]) for i, u in enumerate(users)
+        ])
+        StaffMember.objects.bulk_create([
+            StaffMember(user=u, hotel=cls.hotels[i // cls.STAFF_PER_HOTEL], category='maintenance')
+            for i, u in enumerate(users)
+        ])
+
+        cls.admin = User.objects.create_user('plan-admin', password='pw')
+        cls.admin.profile.hotel = cls.hotel
+        cls.admin.profile.save()
+        user.profile.hotel = cls.hotel
+        user.profile.save()
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        cache.clear()
+        self.admin_client = Client()
+        self.admin_client.force_login(self.admin)
+        self.staff_client = Client()
+        self.staff_client.force_login(self.staff.user)
+
+    def plan(self, sql):
+        """The plan lines of one captured statement (PostgreSQL: with sequential scans disabled)."""
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SET enable_seqscan = off')
+                try:
+                    cursor.execute(f'EXPLAIN {sql}')
+                    return [row[0] for row in cursor.fetchall()]
+                finally:
+                    cursor.execute('SET enable_seqscan = on')
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+
+    def full_scans(self, plan):
+        if connection.vendor == 'postgresql':
+            return [line for line in plan if 'Seq Scan' in line]
+        # Only SEARCH seeks into an index: "SCAN t USING INDEX i" still reads the whole index.
+        return [line for line in plan if line.startswith('SCAN') and 'VIRTUAL TABLE' not in line]
+
+    def assertQueriesSearchIndexes(self, run):
+        """Runs `run` and checks that every SELECT it made is answered by index searches only."""
+        with CaptureQueriesContext(connection) as queries:
+            run()
+        selects = [query['sql'] for query in queries.captured_queries if query['sql'].startswith('SELECT')]
+        self.assertTrue(selects)
+        plans = {}
+        for sql in selects:
+            plans[sql] = plan = self.plan(sql)
+            self.assertEqual(self.full_scans(plan), [], '\n'.join([sql, *plan]))
+        return plans
+
+    def second_page(self, queryset, ordering):
+        _rows, cursor = keyset_paginate(queryset, ordering, page_size=25)
+        return keyset_paginate(queryset, ordering, cursor, page_size=25)
+
+    def test_guest_request_queries_use_indexes(self):
+        now = timezone.now()
+        first_archive_page = build_grouped_requests(self.hotel, None, 'archive')
+        first_all_page = build_grouped_requests(self.hotel, None, 'all')
+        searched, _filter_params = filter_requests(visible_requests(self.hotel, None), {
+            'status': 'completed', 'date_from': (now - timedelta(days=30)).date().isoformat(),
+            'date_to': now.date().isoformat(),
+        })
+        queries = {
+            'active tab': lambda: build_grouped_requests(self.hotel, None, 'active'),
+            'active tab for a staff member': lambda: build_grouped_requests(self.hotel, self.staff, 'active'),
+            'archive tab page': lambda: build_grouped_requests(self.hotel, None, 'archive', first_archive_page['next_cursor']),
+            'all tab page': lambda: build_grouped_requests(self.hotel, None, 'all', first_all_page['next_cursor']),
+            'filtered search page': lambda: self.second_page(searched, REQUEST_PAGE_ORDERING),
+            'new pending requests': lambda: self.admin_client.get('/api/check_new_requests/'),
+            'employee tasks': lambda: self.staff_client.get('/employee/dashboard/'),
+            'guest updates, known room': lambda: self.client.get(f'/api/guest/{self.hotel.pk}/room/120/check_updates/'),
+            'guest updates, unknown room': lambda: self.client.get(f'/api/guest/{self.hotel.pk}/room/180/check_updates/'),
+        }
+        for name, run in queries.items():
+            with self.subTest(name):
+                self.assertQueriesSearchIndexes(run)
+
+    def test_assignment_queries_use_indexes(self):
+        now = timezone.now()
+        assignments = GuestRoomAssignment.objects.filter(hotel=self.hotel)
+        confirmed, _filter_params = filter_assignments(assignments, {'status': 'confirmed'})
+        booking = {
+            'room_number': '120', 'check_in_time': now + timedelta(days=40), 'check_out_time': now + timedelta(days=42),
+            'status': 'confirmed',
+        }
+
+        def save_stay():
+            with transaction.atomic():
+                save_assignment(GuestRoomAssignment(
+                    hotel=self.hotel, room=Room.objects.get(hotel=self.hotel, room_number='120'),
+                    guest_names='Plan Guest', **booking,
+                ))
+                transaction.set_rollback(True)
+
+        queries = {
+            'guest tab page': lambda: self.second_page(filter_assignments(assignments, {})[0], ASSIGNMENT_PAGE_ORDERING),
+            'guest tab by status': lambda: self.second_page(confirmed, ASSIGNMENT_PAGE_ORDERING),
+            'overlap check': save_stay,
+            'import overlap check': lambda: find_stored_overlaps(self.hotel, [(1, booking)]),
+            'home stats': lambda: compute_home_stats(self.hotel, now),
+        }
+        for name, run in queries.items():
+            with self.subTest(name):
+                self.assertQueriesSearchIndexes(run)
+
+    def test_room_lookups_use_composite_indexes(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Index choice is only pinned for SQLite plans.')
+        plans = self.assertQueriesSearchIndexes(
+            lambda: self.client.get(f'/api/guest/{self.hotel.pk}/room/180/check_updates/')
+        )
+        self.assertIn('guestreq_hotel_room_ts_idx', '\n'.join(line for plan in plans.values() for line in plan))
+        now = timezone.now()
+        plans = self.assertQueriesSearchIndexes(lambda: find_stored_overlaps(self.hotel, [
+            (1, {'room_number': '180', 'check_in_time': now, 'check_out_time': now + timedelta(days=2), 'status': 'confirmed'}),
+        ]))
+        self.assertIn('gra_hotel_room_stay_idx', '\n'.join(line for plan in plans.values() for line in plan))
+
+
+class RoomForeignKeyTests(TestCase):
+    """Stays and requests join through the room FK; room_number strings are only for display."""
+
+    def setUp(self):
+        cache.clear()
+        self.hotel = Hotel.objects.create(name='Room Hotel', total_rooms=20)
+        self.user = User.objects.create_user('room-frontdesk', password='pw')
+        self.user.profile.hotel = self.hotel
+        self.user.profile.save()
+
+    def test_rows_are_linked_when_their_room_is_created(self):
+        early = GuestRequest.objects.create(hotel=self.hotel, room_number='301', raw_text='Hello')
+        self.assertIsNone(early.room_id)
+
+        room = Room.objects.create(hotel=self.hotel, room_number='301')
+        later = GuestRequest.objects.create(hotel=self.hotel, room_number='301', raw_text='Towels')
+        early.refresh_from_db()
+        self.assertEqual((early.room_id, later.room_id), (room.pk, room.pk))
+
+    def test_assignment_form_sets_room(self):
+        now = timezone.localtime()
+        form = GuestRoomAssignmentForm(hotel=self.hotel, data={
+            'room_number_input': '302', 'guest_names': 'Ada', 'status': 'confirmed',
+            'check_in_date': now.date(), 'check_in_time_input': '14:00',
+            'check_out_date': now.date() + timedelta(days=2), 'check_out_time_input': '11:00',
+            'total_bill_amount': '0', 'amount_paid': '0',
+        })
+        self.assertTrue(form.is_valid(), form.errors)
+        assignment = form.save()
+        self.assertEqual(assignment.room, Room.objects.get(hotel=self.hotel, room_number='302'))
+
+    def test_backfill_migration_resolves_strings(self):
+        backfill = importlib.import_module('main.migrations.0018_backfill_room_foreign_keys')
+        room = Room.objects.create(hotel=self.hotel, room_number='303')
+        request = GuestRequest.objects.create(hotel=self.hotel, room_number='303', raw_text='Hi')
+        orphan = GuestRequest.objects.create(hotel=self.hotel, room_number='999', raw_text='Hi')
+        legacy = GuestRoomAssignment.objects.create(
+            hotel=self.hotel, room_number='304', guest_names='Legacy',
+            check_in_time=timezone.now(), check_out_time=timezone.now() + timedelta(days=1),
+        )
+        GuestRequest.objects.update(room=None)
+        GuestRoomAssignment.objects.update(room=None)
+
+        backfill.backfill_rooms(django_apps, None)
+
+        request.refresh_from_db()
+        orphan.refresh_from_db()
+        legacy.refresh_from_db()
+        self.assertEqual(request.room_id, room.pk)
+        self.assertIsNone(orphan.room_id)
+        self.assertEqual(legacy.room.room_number, '304')
+
+    def test_request_grouping_uses_a_fixed_number_of_queries(self):
+        def seed(start, count):
+            for n in range(start, start + count):
+                room_number = str(400 + n)
+                Room.objects.create(hotel=self.hotel, room_number=room_number)
+                GuestRoomAssignment.objects.create(
+                    hotel=self.hotel, room_number=room_number, guest_names=f'Guest {n}',
+                    check_in_time=timezone.now(), check_out_time=timezone.now() + timedelta(days=1),
+                )
+                GuestRequest.objects.create(hotel=self.hotel, room_number=room_number, raw_text='Towels',
+                                            request_type='housekeeping')
+
+        def grouping_queries():
+            with CaptureQueriesContext(connection) as queries:
+                grouped = build_grouped_requests(self.hotel, None, 'active')
+            return len(queries), grouped
+
+        seed(0, 2)
+        small, _grouped = grouping_queries()
+        seed(2, 10)
+        large, grouped = grouping_queries()
+        self.assertEqual(small, large)
+        names = {item['assignment'].guest_names for item in grouped['groups'][0]['requests']}
+        self.assertEqual(len(names), 12)
+
+    def test_completed_amenity_request_bills_the_rooms_current_stay(self):
+        towel = Amenity.objects.create(name='Towel', price='4.50')
+        room = Room.objects.create(hotel=self.hotel, room_number='305')
+        stay = GuestRoomAssignment.objects.create(
+            hotel=self.hotel, room_number='305', guest_names='Ada', status='checked_in',
+            check_in_time=timezone.now() - timedelta(hours=1), check_out_time=timezone.now() + timedelta(days=1),
+        )
+        # Same room number in another hotel must not be billed.
+        other_hotel = Hotel.objects.create(name='Other Hotel', total_rooms=5)
+        GuestRoomAssignment.objects.create(
+            hotel=other_hotel, room_number='305', guest_names='Bob', status='checked_in',
+            check_in_time=timezone.now() - timedelta(hours=1), check_out_time=timezone.now() + timedelta(days=1),
+        )
+        req = GuestRequest.objects.create(
+            hotel=self.hotel, room_number='305', raw_text='Two towels', request_type='amenity_request',
+            amenity_requested=towel, amenity_quantity=2,
+        )
+        self.assertEqual(req.room, room)
+
+        http_request = RequestFactory().post('/', {'new_status': 'completed'})
+        http_request.user = self.user
+        response = update_request_status(http_request, req.pk)
+
+        self.assertTrue(json.loads(response.content)['success'])
+        stay.refresh_from_db()
+        req.refresh_from_db()
+        self.assertEqual(stay.total_bill_amount, Decimal('9.00'))
+        self.assertTrue(req.bill_added)
+
+
+class BookingOverlapTests(TransactionTestCase):
+    """
+    Double bookings are rejected atomically with the write (exclusion constraint on PostgreSQL,
+    the database write lock on SQLite), including under concurrent saves.
+    """
+
+    ROOMS = 3
+    DAYS = 6
+    THREADS = 8
+    ATTEMPTS_PER_THREAD = 12
+
+    def setUp(self):
+        self.hotel = Hotel.objects.create(name='Overlap Hotel', total_rooms=10)
+        self.rooms = [Room.objects.create(hotel=self.hotel, room_number=str(500 + n)) for n in range(self.ROOMS)]
+        self.first_day = timezone.localdate() + timedelta(days=30)
+
+    def form_data(self, room_number, day):
+        return {
+            'room_number_input': room_number, 'guest_names': 'Guest', 'status': 'confirmed',
+            'check_in_date': day, 'check_in_time_input': '14:00',
+            'check_out_date': day + timedelta(days=1), 'check_out_time_input': '11:00',
+            'total_bill_amount': '0', 'amount_paid': '0',
+        }
+
+    def test_form_reports_overlap_as_field_error(self):
+        GuestRoomAssignmentForm(self.form_data('500', self.first_day), hotel=self.hotel).save()
+        form = GuestRoomAssignmentForm(self.form_data('500', self.first_day), hotel=self.hotel)
+        self.assertTrue(form.is_valid(), form.errors)
+        with self.assertRaises(BookingOverlapError):
+            form.save()
+        self.assertEqual(form.errors['room_number_input'], [OVERLAP_ERROR_MESSAGE])
+
+        # Back-to-back stays and edits of the stay itself are fine.
+        stay = GuestRoomAssignmentForm(self.form_data('500', self.first_day + timedelta(days=1)), hotel=self.hotel).save()
+        edit = GuestRoomAssignmentForm(
+            self.form_data('500', self.first_day + timedelta(days=1)), instance=stay, hotel=self.hotel,
+        )
+        self.assertTrue(edit.is_valid(), edit.errors)
+        edit.save()
+        self.assertEqual(GuestRoomAssignment.objects.filter(hotel=self.hotel).count(), 2)
+
+    def test_cancelled_and_no_show_stays_dont_hold_the_room(self):
+        first = GuestRoomAssignmentForm(self.form_data('500', self.first_day), hotel=self.hotel).save()
+        cancel = GuestRoomAssignmentForm({**self.form_data('500', self.first_day), 'status': 'cancelled'},
+                                         instance=first, hotel=self.hotel)
+        self.assertTrue(cancel.is_valid(), cancel.errors)
+        cancel.save()
+
+        rebooked = GuestRoomAssignmentForm(self.form_data('500', self.first_day), hotel=self.hotel)
+        self.assertTrue(rebooked.is_valid(), rebooked.errors)
+        rebooked.save()
+        no_show = GuestRoomAssignmentForm({**self.form_data('500', self.first_day), 'status': 'no_show'}, hotel=self.hotel)
+        self.assertTrue(no_show.is_valid(), no_show.errors)
+        no_show.save()
+
+        # Reinstating the cancelled stay would double-book the room again.
+        first.refresh_from_db()
+        first.status = 'confirmed'
+        with self.assertRaises(BookingOverlapError):
+            save_assignment(first)
+
+    def test_migration_unlinks_existing_overlaps(self):
+        migration = importlib.import_module('main.migrations.0019_room_overlap_constraint')
+        room, other_room = self.rooms[0], self.rooms[1]
+        day = local_day_start(self.first_day)
+
+        def stay(room, start_hours, end_hours, status='confirmed'):
+            return GuestRoomAssignment(
+                hotel=self.hotel, room=room, room_number=room.room_number, guest_names='Legacy', status=status,
+                check_in_time=day + timedelta(hours=start_hours), check_out_time=day + timedelta(hours=end_hours),
+            )
+
+        # Saved before overlaps were enforced; bulk_create skips save_assignment.
+        kept, clash, after_clash, back_to_back, cancelled, elsewhere = GuestRoomAssignment.objects.bulk_create([
+            stay(room, 0, 48), stay(room, 24, 72), stay(room, 60, 80), stay(room, 48, 60),
+            stay(room, 0, 48, status='cancelled'), stay(other_room, 0, 48),
+        ])
+        with mock.patch('builtins.print') as printed:
+            migration.detach_overlapping_stays(django_apps, None)
+
+        linked = dict(GuestRoomAssignment.objects.values_list('pk', 'room_id'))
+        self.assertEqual(
+            {stay.pk for stay in (kept, clash, after_clash, back_to_back, cancelled, elsewhere) if linked[stay.pk] is None},
+            {clash.pk},
+        )
+        self.assertIn(f'stay {clash.pk} ', ''.join(str(call) for call in printed.call_args_list))
+
+    def test_concurrent_bookings_never_overlap(self):
+        attempts = [
+            [(rng.randrange(self.ROOMS), rng.randrange(self.DAYS)) for _n in range(self.ATTEMPTS_PER_THREAD)]
+            for rng in (random.Random(seed) for seed in range(self.THREADS))
+        ]
+        outcomes = []
+        unexpected = []
+        start = threading.Barrier(self.THREADS)
+
+        def book(slots):
+            try:
+                start.wait()
+                for room, day in slots:
+                    form = GuestRoomAssignmentForm(
+                        self.form_data(str(500 + room), self.first_day + timedelta(days=day)), hotel=self.hotel,
+                    )
+                    if not form.is_valid():
+                        unexpected.append(form.errors)
+                        continue
+                    try:
+                        form.save()
+                        outcomes.append('saved')
+                    except BookingOverlapError:
+                        outcomes.append('overlap')
+            except Exception as e:
+                unexpected.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=book, args=(slots,)) for slots in attempts]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=120)
+        elapsed = time.monotonic() - started
+
+        self.assertEqual(unexpected, [])
+        self.assertEqual(len(outcomes), self.THREADS * self.ATTEMPTS_PER_THREAD)
+        distinct_slots = {slot for slots in attempts for slot in slots}
+        self.assertEqual(outcomes.count('saved'), len(distinct_slots))
+
+        stays = list(GuestRoomAssignment.objects.filter(hotel=self.hotel).order_by('room_id', 'check_in_time'))
+        for earlier, later in zip(stays, stays[1:]):
+            if earlier.room_id == later.room_id:
+                self.assertLessEqual(earlier.check_out_time, later.check_in_time)
+        # Lock waits serialize writers but shouldn't stall them: well under a second per booking.
+        self.assertLess(elapsed, len(outcomes) * 0.25)
+
+
+class AvailabilityTests(TestCase):
+    """The availability index answers the same as scanning stays, and stays current after commits."""
+
+    def setUp(self):
+        cache.clear()
+        self.hotel = Hotel.objects.create(name='Availability Hotel', total_rooms=30)
+        self.user = User.objects.create_user('availability-frontdesk', password='pw')
+        self.user.profile.hotel = self.hotel
+        self.user.profile.save()
+        self.client.force_login(self.user)
+        self.day = local_day_start(timezone.localdate() + timedelta(days=3))
+
+        rng = random.Random(38)
+        statuses = ['available'] * 6 + ['maintenance', 'cleaning']
+        self.rooms = [
+            Room.objects.create(hotel=self.hotel, room_number=str(600 + n), room_type=rng.choice(['Standard', 'Suite']),
+                                status=rng.choice(statuses))
+            for n in range(20)
+        ]
+        for room in self.rooms:
+            check_in = self.day + timedelta(hours=rng.randint(-24 * 20, 0))
+            for _stay in range(rng.randint(0, 6)):
+                check_out = check_in + timedelta(hours=rng.randint(12, 24 * 4))
+                GuestRoomAssignment.objects.create(
+                    hotel=self.hotel, room_number=room.room_number, guest_names='Guest',
+                    check_in_time=check_in, check_out_time=check_out,
+                    status=rng.choice(['confirmed', 'checked_in', 'checked_out', 'cancelled']),
+                )
+                check_in = check_out + timedelta(hours=rng.randint(0, 48))
+
+    def scanned_free_rooms(self, check_in, check_out, room_type=None):
+        busy = set(GuestRoomAssignment.objects.filter(
+            hotel=self.hotel, check_in_time__lt=check_out, check_out_time__gt=check_in,
+        ).exclude(status__in=['cancelled', 'no_show']).values_list('room_id', flat=True))
+        return sorted(
+            room.room_number for room in self.rooms
+            if room.pk not in busy and room.status not in ('maintenance', 'out_of_service')
+            and (not room_type or room.room_type == room_type)
+        )
+
+    def test_free_rooms_match_a_scan(self):
+        index = availability_index(self.hotel.pk)
+        rng = random.Random(5)
+        for _query in range(40):
+            check_in = self.day + timedelta(hours=rng.randint(-24 * 20, 24 * 10))
+            check_out = check_in + timedelta(hours=rng.randint(1, 24 * 5))
+            room_type = rng.choice([None, 'Standard', 'Suite'])
+            self.assertEqual(
+                sorted(room['room_number'] for room in index.free_rooms(check_in, check_out, room_type)),
+                self.scanned_free_rooms(check_in, check_out, room_type),
+            )
+
+    def test_occupancy_matrix_matches_a_scan(self):
+        first_day = timezone.localdate() - timedelta(days=18)
+        days, occupied = availability_index(self.hotel.pk).occupancy_matrix(first_day, 30)
+        stays = list(GuestRoomAssignment.objects.filter(hotel=self.hotel).exclude(status__in=['cancelled', 'no_show']))
+        index_rooms = availability_index(self.hotel.pk).rooms
+        for row, room in enumerate(index_rooms):
+            for column, day in enumerate(days):
+                midnight = local_day_start(day + timedelta(days=1))
+                expected = any(
+                    stay.room_id == room['id'] and stay.check_in_time <= midnight < stay.check_out_time for stay in stays
+                )
+                self.assertEqual(bool(occupied[row, column]), expected, (room['room_number'], day))
+
+    def test_index_is_patched_on_commit(self):
+        index = availability_index(self.hotel.pk)
+        room = next(room for room in self.rooms if room.status == 'available')
+        check_in, check_out = self.day + timedelta(days=60), self.day + timedelta(days=62)
+        self.assertIn(room.room_number, [r['room_number'] for r in index.free_rooms(check_in, check_out)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            stay = GuestRoomAssignment.objects.create(
+                hotel=self.hotel, room_number=room.room_number, guest_names='New',
+                check_in_time=check_in, check_out_time=check_out,
+            )
+        with self.assertNumQueries(1):
+            # just the version stamp (no shared cache in tests)
+            patched = availability_index(self.hotel.pk)
+        self.assertEqual(len(patched), len(index) + 1)
+        self.assertNotIn(room.room_number, [r['room_number'] for r in patched.free_rooms(check_in, check_out)])
+        # The index a reader already holds is never changed under it.
+        self.assertIn(room.room_number, [r['room_number'] for r in index.free_rooms(check_in, check_out)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            stay.delete()
+        self.assertIn(room.room_number, [r['room_number'] for r in availability_index(self.hotel.pk).free_rooms(check_in, check_out)])
+
+    def test_other_workers_see_changes(self):
+        index = availability_index(self.hotel.pk)
+        # Another worker's commit bumps the stamp without touching this process's index or cache.
+        bump_version(f'availability_version:{self.hotel.pk}')
+        rebuilt = availability_index(self.hotel.pk)
+        self.assertIsNot(rebuilt, index)
+        self.assertIs(availability_index(self.hotel.pk), rebuilt)
+
+        with override_settings(SHARED_CACHE=True):
+            index = availability_index(self.hotel.pk)
+            with self.assertNumQueries(0):
+                self.assertIs(availability_index(self.hotel.pk), index)
+            bump_version(f'availability_version:{self.hotel.pk}')
+            self.assertIsNot(availability_index(self.hotel.pk), index)
+
+    def test_apis(self):
+        check_in = (self.day + timedelta(days=90)).strftime('%Y-%m-%d %H:%M')
+        check_out = (self.day + timedelta(days=91)).strftime('%Y-%m-%d %H:%M')
+        data = self.client.get('/api/availability/', {'check_in': check_in, 'check_out': check_out, 'room_type': 'Suite'}).json()
+        self.assertTrue(data['success'])
+        self.assertEqual(
+            [room['room_number'] for room in data['rooms']],
+            self.scanned_free_rooms(self.day + timedelta(days=90), self.day + timedelta(days=91), 'Suite'),
+        )
+        self.assertEqual(self.client.get('/api/availability/', {'check_in': check_out, 'check_out': check_in}).status_code, 400)
+
+        data = self.client.get('/api/availability/occupancy/', {'start': timezone.localdate().isoformat(), 'days': 7}).json()
+        self.assertEqual(len(data['days']), 7)
+        self.assertEqual(len(data['occupied']), len(self.rooms))
+        self.assertEqual(data['occupied_counts'], [sum(row[j] for row in data['occupied']) for j in range(7)])
+        self.assertEqual(self.client.get('/api/availability/occupancy/', {'days': 1000}).status_code, 400)
+
+    def test_years_of_history_answer_in_milliseconds(self):
+        rng = random.Random(1)
+        start = timezone.now() - timedelta(days=365 * 5)
+        rooms = [{'id': n, 'room_number': str(n), 'room_type': 'Standard', 'status': 'available'} for n in range(300)]
+        stays = []
+        for room in rooms:
+            moment = start
+            while moment < start + timedelta(days=365 * 5):
+                check_out = moment + timedelta(days=rng.randint(1, 7))
+                stays.append((len(stays), room['id'], moment, check_out, 'checked_out'))
+                moment = check_out + timedelta(days=rng.randint(0, 3))
+        index = AvailabilityIndex(rooms, stays)
+        self.assertGreater(len(index), 90000)
+
+        started = time.perf_counter()
+        index.free_rooms(start + timedelta(days=900), start + timedelta(days=903))
+        index.occupancy_matrix((start + timedelta(days=700)).date(), 365)
+        self.assertLess(time.perf_counter() - started, 0.5)
+
+
+class RequestArchiveTests(TestCase):
+    """Closed requests past retention move to the archive table and still show on the archive tab."""
+
+    def setUp(self):
+        cache.clear()
+        self.hotel = Hotel.objects.create(name='Archive Hotel', total_rooms=10, request_retention_days=30)
+        self.user = User.objects.create_user('archive-frontdesk', password='pw')
+        self.user.profile.hotel = self.hotel
+        self.user.profile.save()
+        self.client.force_login(self.user)
+
+    def make_request(self, days_old, status='completed', **extra):
+        guest_request = GuestRequest.objects.create(
+            hotel=self.hotel, room_number='701', raw_text=extra.pop('raw_text', 'Extra pillows please'),
+            status=status, request_type='housekeeping', **extra,
+        )
+        GuestRequest.objects.filter(pk=guest_request.pk).update(
+            timestamp=timezone.now() - timedelta(days=days_old, minutes=guest_request.pk),
+        )
+        return guest_request
+
+    def test_moves_only_closed_requests_past_retention(self):
+        old = [self.make_request(40) for _n in range(5)] + [self.make_request(45, status='cancelled')]
+        recent = self.make_request(10)
+        still_open = self.make_request(60, status='pending')
+        other_hotel = Hotel.objects.create(name='Default Retention', total_rooms=5)
+        GuestRequest.objects.create(hotel=other_hotel, room_number='1', raw_text='Hi', status='completed')
+        get_home_stats(self.hotel)
+
+        with CaptureQueriesContext(connection) as queries:
+            moved = archive_requests(self.hotel, batch_size=4)
+        self.assertEqual(moved, 6)
+        self.assertLess(len(queries), 15)
+
+        self.assertEqual(
+            sorted(ArchivedGuestRequest.objects.values_list('id', flat=True)), sorted(r.pk for r in old),
+        )
+        self.assertEqual(
+            sorted(GuestRequest.objects.filter(hotel=self.hotel).values_list('id', flat=True)),
+            sorted([recent.pk, still_open.pk]),
+        )
+        archived = ArchivedGuestRequest.objects.get(pk=old[0].pk)
+        self.assertEqual((archived.raw_text, archived.status, archived.room_id), (old[0].raw_text, 'completed', old[0].room_id))
+        self.assertEqual(archive_requests(other_hotel), 0)
+
+        # Archiving doesn't change the hotel's request total, and archived text stays searchable.
+        stats, drift = refresh_hotel_stats(self.hotel)
+        self.assertEqual((stats.total_requests_count, drift), (8, {}))
+        self.assertEqual(filter_requests_by_text(ArchivedGuestRequest.objects.all(), 'pillows').count(), 6)
+
+    def test_archive_tab_pages_through_both_tiers(self):
+        created = [self.make_request(days) for days in range(1, 71)]
+        archive_requests(self.hotel)
+        self.assertEqual(ArchivedGuestRequest.objects.count(), 41)
+
+        first = self.client.get('/api/dashboard/requests/archive/').json()
+        ids = [item['id'] for group in first['groups'] for item in group['requests']]
+        self.assertEqual(len(ids), 50)
+        second = self.client.get('/api/dashboard/requests/archive/', {'cursor': first['next_cursor']}).json()
+        ids += [item['id'] for group in second['groups'] for item in group['requests']]
+        self.assertIsNone(second['next_cursor'])
+        self.assertEqual(len(set(ids)), 70)
+        timestamps = {
+            pk: ts for pk, ts in list(GuestRequest.objects.values_list('id', 'timestamp'))
+            + list(ArchivedGuestRequest.objects.values_list('id', 'timestamp'))
+        }
+        self.assertEqual(ids, sorted(ids, key=lambda pk: timestamps[pk], reverse=True))
+
+        details = self.client.get(f'/api/requests/{created[-1].pk}/details/').json()
+        self.assertEqual(details['raw_text'], 'Extra pillows please')
+
+        self.make_request(1, status='pending')
+        first = self.client.get('/api/dashboard/requests/all/').json()
+        second = self.client.get('/api/dashboard/requests/all/', {'cursor': first['next_cursor']}).json()
+        self.assertIsNone(second['next_cursor'])
+        self.assertEqual(sum(len(group['requests']) for page in (first, second) for group in page['groups']), 71)
+
+    def test_search_and_export_include_archived_requests(self):
+        archived = self.make_request(40, raw_text='Lost my charger')
+        live = self.make_request(1, raw_text='Charger for the laptop please')
+        archive_requests(self.hotel)
+
+        results = self.client.get('/api/requests/search/', {'q': 'charger'}).json()['results']
+        self.assertEqual([r['id'] for r in results], [live.pk, archived.pk])
+
+        response = self.client.get('/api/export/requests/', {'format': 'jsonl'})
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([line['id'] for line in lines], [archived.pk, live.pk])
+
+        output = io.StringIO()
+        call_command('export_data', 'requests', hotel=self.hotel.pk, filters=['q=charger'], stdout=output)
+        rows = list(csv.DictReader(output.getvalue().splitlines()))
+        self.assertEqual([row['raw_text'] for row in rows], ['Lost my charger', 'Charger for the laptop please'])
+
+    def test_nothing_references_guest_requests(self):
+        # archive_batch deletes moved rows without Django's collector, which is only safe while
+        # no relation would need cascading.
+        self.assertEqual(GuestRequest._meta.related_objects, ())
+
+    def test_command(self):
+        self.make_request(40)
+        out = io.StringIO()
+        call_command('archive_requests', '--dry-run', stdout=out)
+        self.assertIn('Would archive 1 request(s).', out.getvalue())
+        call_command('archive_requests', stdout=out)
+        self.assertEqual(ArchivedGuestRequest.objects.count(), 1)
+
+
+@override_settings(SHARED_CACHE=True, SESSION_ENGINE='django.contrib.sessions.backends.cached_db')
+class HotelContextTests(TestCase):
+    """The hotel context is resolved once per user, served from cache, and dropped when it changes."""
+
+    def setUp(self):
+        cache.clear()
+        self.hotel = Hotel.objects.create(name='Context Hotel', total_rooms=5)
+        self.user = User.objects.create_user('context-frontdesk', password='pw')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.profile.hotel = self.hotel
+            self.user.profile.save()
+        self.middleware = HotelContextMiddleware(lambda request: request)
+
+    def resolve(self, user=None):
+        http_request = RequestFactory().get('/')
+        http_request.user = user or User.objects.get(pk=self.user.pk)
+        return self.middleware(http_request)
+
+    def test_cache_hit_needs_no_queries(self):
+        user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(1):
+            self.resolve(user)
+        user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            http_request = self.resolve(user)
+            self.assertEqual(http_request.hotel, self.hotel)
+            self.assertIsNone(http_request.staff_member)
+            self.assertEqual(http_request.user.profile.hotel.name, 'Context Hotel')
+            self.assertFalse(hasattr(http_request.user, 'staff_profile'))
+
+    @override_settings(SHARED_CACHE=False)
+    def test_not_cached_without_a_shared_cache(self):
+        # A per-process cache would keep serving a context other workers have changed.
+        self.resolve()
+        user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.resolve(user).hotel, self.hotel)
+        self.assertIsNone(cache.get(f'hotel_context:{self.user.pk}'))
+
+    def test_invalidated_by_profile_staff_and_hotel_changes(self):
+        self.resolve()
+        other_hotel = Hotel.objects.create(name='Other Hotel', total_rooms=5)
+        with self.captureOnCommitCallbacks(execute=True):
+            StaffMember.objects.create(user=self.user, hotel=self.hotel, category='concierge')
+        self.assertEqual(self.resolve().staff_member.category, 'concierge')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Hotel.objects.filter(pk=self.hotel.pk).update(name='Renamed')
+            Hotel.objects.get(pk=self.hotel.pk).save()
+        self.assertEqual(self.resolve().hotel.name, 'Renamed')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            profile = self.user.profile
+            profile.hotel = other_hotel
+            profile.save()
+        http_request = self.resolve()
+        self.assertEqual(http_request.hotel, other_hotel)
+        self.assertIsNone(http_request.staff_member)  # still staff at the first hotel only
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other_hotel.delete()
+        http_request = self.resolve()
+        self.assertIsNone(http_request.hotel)
+        self.assertIsNotNone(http_request.user_profile)
+
+    def test_bell_skips_profile_queries(self):
+        self.client.force_login(self.user)
+        self.client.get('/api/check_new_requests/')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/check_new_requests/')
+        self.assertTrue(response.json()['success'])
+        tables = ' '.join(query['sql'] for query in queries.captured_queries)
+        for table in ('django_session', 'main_userprofile', 'main_hotel', 'main_staffmember'):
+            self.assertNotIn(table, tables)
+        self.assertEqual(len(queries.captured_queries), 2)  # the user and the count
+
+
+class AutoAssignmentTests(TestCase):
+    """New requests go to the least-loaded matching staff member; loads are kept incrementally."""
+
+    def setUp(self):
+        self.hotel = Hotel.objects.create(name='Routing Hotel', total_rooms=20)
+        self.staff = {
+            name: StaffMember.objects.create(user=User.objects.create_user(name), hotel=self.hotel, category=category)
+            for name, category in [('hk1', 'housekeeping'), ('hk2', 'housekeeping'),
+                                   ('fixer', 'maintenance'), ('desk', 'general')]
+        }
+
+    def load(self, name):
+        return StaffMember.objects.get(pk=self.staff[name].pk).open_task_count
+
+    def make_request(self, request_type, **kwargs):
+        return GuestRequest.objects.create(
+            hotel=self.hotel, room_number='101', raw_text='Help', request_type=request_type,
+            assigned_staff=choose_staff(Hotel.objects.get(pk=self.hotel.pk), request_type), **kwargs,
+        )
+
+    def test_least_loaded_matching_staff_with_general_fallback(self):
+        first = self.make_request('housekeeping')
+        second = self.make_request('housekeeping')
+        self.assertEqual({first.assigned_staff_id, second.assigned_staff_id},
+                         {self.staff['hk1'].pk, self.staff['hk2'].pk})
+        self.assertEqual(self.make_request('repairs').assigned_staff_id, self.staff['fixer'].pk)
+        self.assertEqual(self.make_request('room_service').assigned_staff_id, self.staff['desk'].pk)
+        self.assertIsNone(choose_staff(self.hotel, 'casual_chat'))
+
+        StaffMember.objects.filter(category='housekeeping').update(accepts_auto_assignment=False)
+        self.assertEqual(self.make_request('housekeeping').assigned_staff_id, self.staff['desk'].pk)
+
+        self.hotel.auto_assign_requests = False
+        self.hotel.save()
+        self.assertIsNone(self.make_request('maintenance').assigned_staff)
+
+    def test_rules_and_caps(self):
+        AssignmentRule.objects.create(hotel=self.hotel, request_type='room_service', staff_category='housekeeping',
+                                      priority=1, max_open_tasks=1)
+        AssignmentRule.objects.create(hotel=self.hotel, request_type='room_service', staff_category='maintenance',
+                                      priority=2)
+        picks = [self.make_request('room_service').assigned_staff.user.username for _ in range(4)]
+        self.assertEqual(sorted(picks[:2]), ['hk1', 'hk2'])
+        self.assertEqual(picks[2:], ['fixer', 'fixer'])
+
+        with self.assertNumQueries(2):
+            choose_staff(self.hotel, 'room_service')
+
+    def test_load_counters_follow_changes(self):
+        req = GuestRequest.objects.create(hotel=self.hotel, room_number='101', raw_text='Towels',
+                                          request_type='housekeeping', assigned_staff=self.staff['hk1'])
+        self.assertEqual(self.load('hk1'), 1)
+        req.assigned_staff = self.staff['hk2']
+        req.status = 'in_progress'
+        req.save()
+        self.assertEqual((self.load('hk1'), self.load('hk2')), (0, 1))
+        req.status = 'completed'
+        req.save()
+        self.assertEqual(self.load('hk2'), 0)
+        req.status = 'pending'
+        req.save()
+        req.delete()
+        self.assertEqual(self.load('hk2'), 0)
+
+        GuestRequest.objects.create(hotel=self.hotel, room_number='102', raw_text='Leak',
+                                    request_type='maintenance', assigned_staff=self.staff['fixer'])
+        StaffMember.objects.filter(pk=self.staff['fixer'].pk).update(open_task_count=7)
+        self.assertEqual(recount_staff_load(self.hotel), {self.staff['fixer'].pk: (7, 1)})
+        self.assertEqual(self.load('fixer'), 1)
+        self.assertEqual(recount_staff_load(self.hotel), {})
+
+    def test_guest_command_is_assigned_on_arrival(self):
+        reply = {'intent': 'maintenance', 'entities': {'item': 'sink'}, 'conci_response': 'Sending someone up.'}
+        with mock.patch('main.views.call_gemini_api', mock.AsyncMock(return_value=reply)):
+            response = self.client.post('/api/process_command/', json.dumps({
+                'message': 'The sink is leaking', 'hotel_id': self.hotel.pk, 'room_number': '101',
+            }), content_type='application/json')
+        req = GuestRequest.objects.get(pk=response.json()['request_id'])
+        self.assertEqual(req.status, 'pending')
+        self.assertEqual(req.assigned_staff, self.staff['fixer'])
+        self.assertEqual(self.load('fixer'), 1)
+
+    def test_simulator_compares_with_history(self):
+        start = timezone.now() - timedelta(days=2)
+        for n in range(6):
+            req = GuestRequest.objects.create(hotel=self.hotel, room_number='101', raw_text=f'Towels {n}',
+                                              request_type='housekeeping', status='completed')
+            GuestRequest.objects.filter(pk=req.pk).update(
+                timestamp=start + timedelta(hours=n), updated_at=start + timedelta(hours=n, minutes=30),
+                assigned_staff=self.staff['hk1'] if n % 2 else None,
+            )
+        result = simulate_assignment(self.hotel, history_rows(self.hotel))
+        self.assertEqual(result['requests'], 6)
+        self.assertEqual(result['historical']['assigned'], 3)
+        self.assertEqual(result['historical']['median_seconds_to_assignment'], 1800.0)
+        self.assertEqual(result['simulated']['assigned'], 6)
+        self.assertEqual(result['simulated']['median_seconds_to_assignment'], 0.0)
+        # Each task closes before the next one arrives, so the lower id takes every one of them.
+        self.assertEqual(result['simulated']['peak_open_tasks_per_staff'], 1)
+        self.assertEqual(result['simulated']['most_tasks_per_staff'], 6)
+
+        out = io.StringIO()
+        call_command('simulate_assignment', '--json', stdout=out)
+        self.assertEqual(json.loads(out.getvalue())['simulated']['assigned'], 6)
+
+
+class WorkQueueTests(TransactionTestCase):
+    """Staff claim their next task atomically; concurrent claimers never take the same request."""
+
+    THREADS = 8
+    REQUESTS = 40
+
+    def setUp(self):
+        cache.clear()
+        self.hotel = Hotel.objects.create(name='Queue Hotel', total_rooms=20, auto_assign_requests=False)
+        self.staff = [
+            StaffMember.objects.create(user=User.objects.create_user(f'hk{n}'), hotel=self.hotel, category='housekeeping')
+            for n in range(self.THREADS)
+        ]
+
+    def make_request(self, request_type='housekeeping', minutes_ago=0, **kwargs):
+        req = GuestRequest.objects.create(hotel=self.hotel, room_number='101', raw_text='Towels',
+                                          request_type=request_type, **kwargs)
+        GuestRequest.objects.filter(pk=req.pk).update(timestamp=timezone.now() - timedelta(minutes=minutes_ago))
+        return req
+
+    def test_claims_own_then_oldest_eligible(self):
+        staff = self.staff[0]
+        oldest = self.make_request(minutes_ago=30)
+        self.make_request('maintenance', minutes_ago=60)
+        own = self.make_request(minutes_ago=5, assigned_staff=staff)
+        newer = self.make_request(minutes_ago=10)
+
+        self.assertEqual([claim_next_request(staff).pk for _ in range(3)], [own.pk, oldest.pk, newer.pk])
+        self.assertIsNone(claim_next_request(staff))
+        self.assertEqual(GuestRequest.objects.get(pk=oldest.pk).status, 'in_progress')
+        self.assertEqual(StaffMember.objects.get(pk=staff.pk).open_task_count, 3)
+
+        general = StaffMember.objects.create(user=User.objects.create_user('desk'), hotel=self.hotel, category='general')
+        self.client.force_login(general.user)
+        result = self.client.post('/api/employee/tasks/claim/').json()
+        self.assertEqual(result['task']['request_type'], 'maintenance')
+        self.assertIsNone(self.client.post('/api/employee/tasks/claim/').json()['task'])
+
+        outsider = User.objects.create_user('outsider')
+        self.client.force_login(outsider)
+        self.assertEqual(self.client.post('/api/employee/tasks/claim/').status_code, 403)
+
+    def test_concurrent_claims_are_unique(self):
+        for n in range(self.REQUESTS):
+            self.make_request(minutes_ago=self.REQUESTS - n)
+        claims = []
+        unexpected = []
+        start = threading.Barrier(self.THREADS)
+
+        def work(staff):
+            try:
+                start.wait()
+                while True:
+                    guest_request = claim_next_request(staff)
+                    if guest_request is None:
+                        break
+                    claims.append((guest_request.pk, staff.pk))
+            except Exception as e:
+                unexpected.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=work, args=(staff,)) for staff in self.staff]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=120)
+
+        self.assertEqual(unexpected, [])
+        self.assertEqual(len(claims), self.REQUESTS)
+        self.assertEqual(len({pk for pk, _staff in claims}), self.REQUESTS)
+        stored = dict(GuestRequest.objects.filter(hotel=self.hotel).values_list('pk', 'assigned_staff_id'))
+        self.assertEqual(stored, dict(claims))
+        self.assertEqual(recount_staff_load(self.hotel), {})
+
+
+class ChargeLedgerTests(TransactionTestCase):
+    """Amenity billing appends to the ledger and moves the stay total atomically, exactly once per request."""
+
+    THREADS = 8
+
+    def setUp(self):
+        self.hotel = Hotel.objects.create(name='Billing Hotel', total_rooms=5)
+        self.room = Room.objects.create(hotel=self.hotel, room_number='301')
+        self.stay = GuestRoomAssignment.objects.create(
+            hotel=self.hotel, room=self.room, room_number='301', guest_names='Ann', status='checked_in',
+            check_in_time=timezone.now() - timedelta(days=1), check_out_time=timezone.now() + timedelta(days=1),
+            total_bill_amount=Decimal('100.00'),
+        )
+        self.amenity = Amenity.objects.create(name='Bathrobe', price=Decimal('12.50'))
+        self.user = User.objects.create_user('billing-frontdesk', password='pw')
+        self.user.profile.hotel = self.hotel
+        self.user.profile.save()
+
+    def make_request(self, quantity=1):
+        return GuestRequest.objects.create(
+            hotel=self.hotel, room=self.room, room_number='301', raw_text='Robe please', request_type='amenity_request',
+            amenity_requested=self.amenity, amenity_quantity=quantity,
+        )
+
+    def run_threads(self, target, args_list):
+        unexpected = []
+        start = threading.Barrier(len(args_list))
+
+        def run(*args):
+            try:
+                start.wait()
+                target(*args)
+            except Exception as e:
+                unexpected.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=args) for args in args_list]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=120)
+        self.assertEqual(unexpected, [])
+
+    def test_status_change_bills_once(self):
+        req = self.make_request(quantity=2)
+        for _ in range(2):
+            http_request = RequestFactory().post('/', {'new_status': 'completed'})
+            http_request.user = User.objects.get(pk=self.user.pk)
+            self.assertTrue(json.loads(update_request_status(http_request, req.pk).content)['success'])
+        self.stay.refresh_from_db()
+        self.assertEqual(self.stay.total_bill_amount, Decimal('125.00'))
+        self.assertEqual(list(Charge.objects.values_list('guest_request_id', 'description', 'amount')),
+                         [(req.pk, '2x Bathrobe', Decimal('25.00'))])
+        self.assertTrue(GuestRequest.objects.get(pk=req.pk).bill_added)
+
+    def test_concurrent_completions_lose_no_charges(self):
+        requests = [self.make_request(quantity=n % 3 + 1) for n in range(self.THREADS)]
+
+        def complete(req):
+            with transaction.atomic():
+                bill_amenity_request(req)
+                req.status = 'completed'
+                req.save()
+
+        # Rows are loaded up front: the in-memory test database fails reads that hit another
+        # thread's write lock instead of waiting on it.
+        self.run_threads(complete, [
+            (req,) for req in GuestRequest.objects.select_related('amenity_requested').filter(hotel=self.hotel)
+        ])
+        expected = sum(Decimal('12.50') * req.amenity_quantity for req in requests)
+        self.stay.refresh_from_db()
+        self.assertEqual(self.stay.total_bill_amount, Decimal('100.00') + expected)
+        self.assertEqual(Charge.objects.count(), self.THREADS)
+
+    def test_same_request_completed_concurrently_bills_once(self):
+        req = self.make_request()
+
+        def complete(guest_request):
+            with transaction.atomic():
+                bill_amenity_request(guest_request)
+
+        self.run_threads(complete, [
+            (GuestRequest.objects.select_related('amenity_requested').get(pk=req.pk),) for _n in range(self.THREADS)
+        ])
+        self.stay.refresh_from_db()
+        self.assertEqual(self.stay.total_bill_amount, Decimal('112.50'))
+        self.assertEqual(Charge.objects.count(), 1)
+
+
+class AmenityCatalogTests(TestCase):
+    """The amenity catalog is served from a per-process snapshot until an amenity changes."""
+
+    def setUp(self):
+        cache.clear()
+        self.hotel = Hotel.objects.create(name='Catalog Hotel', total_rooms=5)
+        self.towel = Amenity.objects.create(name='Towel', price=Decimal('2.00'))
+        Amenity.objects.create(name='Umbrella', price=Decimal('5.00'), is_available=False)
+
+    def test_snapshot_reused_until_amenity_changes(self):
+        catalog = amenity_catalog()
+        self.assertEqual([amenity.name for amenity in catalog.amenities], ['Towel', 'Umbrella'])
+        self.assertEqual(catalog.prompt_data(), [{'name': 'Towel', 'price': Decimal('2.00')}])
+        self.assertEqual(catalog.find_available(' towel '), self.towel)
+        self.assertIsNone(catalog.find_available('Umbrella'))
+        with self.assertNumQueries(1):
+            # just the version stamp (no shared cache in tests)
+            self.assertIs(amenity_catalog(), catalog)
+        # Another worker's change bumps the stamp without touching this process's snapshot.
+        bump_version(CATALOG_VERSION_KEY)
+        self.assertIsNot(amenity_catalog(), catalog)
+        with override_settings(SHARED_CACHE=True):
+            catalog = amenity_catalog()
+            with self.assertNumQueries(0):
+                self.assertIs(amenity_catalog(), catalog)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.towel.price = Decimal('3.00')
+            self.towel.save()
+        self.assertEqual(amenity_catalog().prompt_data(), [{'name': 'Towel', 'price': Decimal('3.00')}])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.towel.delete()
+        self.assertEqual(amenity_catalog().available, ())
+
+    def test_guest_messages_make_no_catalog_queries(self):
+        reply = {'intent': 'amenity_request', 'entities': {'amenity_name': 'towel', 'quantity': 2},
+                 'conci_response': 'I will send them up right away.'}
+        amenity_catalog()
+        with mock.patch('main.views.call_gemini_api', mock.AsyncMock(return_value=reply)) as gemini, \
+                CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/process_command/', json.dumps({
+                'message': 'Two towels please', 'hotel_id': self.hotel.pk, 'room_number': '101',
+            }), content_type='application/json')
+        self.assertEqual(gemini.call_args.args[1], [{'name': 'Towel', 'price': Decimal('2.00')}])
+        req = GuestRequest.objects.get(pk=response.json()['request_id'])
+        self.assertEqual((req.amenity_requested, req.amenity_quantity), (self.towel, 2))
+        self.assertFalse([query for query in queries.captured_queries if 'main_amenity' in query['sql']])
+
+
+class HotelFaqTests(TestCase):
+    """Questions about a hotel's configuration are answered locally; requests still go to Gemini."""
+
+    def setUp(self):
+        cache.clear()
+        self.hotel = Hotel.objects.create(name='FAQ Hotel', total_rooms=5)
+        for key, value in (('wifi_password', 'sunrise42'), ('wifi_name', 'FAQ-Guest'),
+                           ('checkout_time', '11:00 AM'), ('shuttle_schedule', 'Every hour from 7 AM')):
+            HotelConfiguration.objects.create(hotel=self.hotel, key=key, value=value)
+
+    def test_answers(self):
+        faq = faq_index(self.hotel.pk)
+        self.assertEqual(faq.answer("What's the Wi-Fi password?"), 'The Wi-Fi password is sunrise42.')
+        self.assertEqual(faq.answer('When is check out?'), 'Check-out is at 11:00 AM.')
+        self.assertEqual(faq.answer('When does the shuttle run?'), 'Shuttle schedule: Every hour from 7 AM')
+        # Ambiguous between two facts, or asking for something to be done: left to Gemini.
+        self.assertIsNone(faq.answer('Is there wifi?'))
+        self.assertIsNone(faq.answer('Can I get a late checkout?'))
+        self.assertIsNone(faq.answer('Please bring towels'))
+        for request in ('towels for the pool please', 'Please give me a wake-up call at 7', 'Can you call me a taxi?',
+                        'I need to leave my luggage somewhere after I check out',
+                        'I forgot the code for my room safe password', "What's the password for the room safe?"):
+            self.assertIsNone(faq.answer(request), request)
+        self.assertEqual(faq.answer('What time do I need to check out tomorrow?'), 'Check-out is at 11:00 AM.')
+        self.assertEqual(faq.relevant_facts('Is there wifi?'), [('Wi-Fi network', 'FAQ-Guest'), ('Wi-Fi password', 'sunrise42')])
+        self.assertIsNone(FaqIndex([]).answer('wifi password'))
+
+        started = time.perf_counter()
+        for _ in range(1000):
+            faq.answer('What time do I need to check out tomorrow?')
+        self.assertLess((time.perf_counter() - started) / 1000, 0.001)
+
+    def test_index_reused_until_configuration_changes(self):
+        faq = faq_index(self.hotel.pk)
+        with self.assertNumQueries(1):
+            # just the version stamp (no shared cache in tests)
+            self.assertIs(faq_index(self.hotel.pk), faq)
+        with self.captureOnCommitCallbacks(execute=True):
+            HotelConfiguration.objects.filter(key='wifi_password').get().delete()
+            HotelConfiguration.objects.create(hotel=self.hotel, key='breakfast_hours', value='7-10 AM')
+        faq = faq_index(self.hotel.pk)
+        self.assertEqual(faq.answer('wifi password?'), 'The Wi-Fi network is called FAQ-Guest.')
+        self.assertEqual(faq.answer('Breakfast?'), 'Breakfast is served 7-10 AM.')
+
+    def test_guest_questions_skip_gemini(self):
+        reply = {'intent': 'maintenance', 'entities': {'query': 'x'}, 'conci_response': 'Sending someone now.'}
+        with mock.patch('main.views.call_gemini_api', mock.AsyncMock(return_value=reply)) as gemini:
+            response = self.client.post('/api/process_command/', json.dumps({
+                'message': 'What is the wifi password?', 'hotel_id': self.hotel.pk, 'room_number': '101',
+            }), content_type='application/json')
+            gemini.assert_not_called()
+            self.assertEqual(response.json()['conci_response'], 'The Wi-Fi password is sunrise42.')
+            self.assertEqual(GuestRequest.objects.get().status, 'completed')
+
+            self.client.post('/api/process_command/', json.dumps({
+                'message': 'The wifi is broken', 'hotel_id': self.hotel.pk, 'room_number': '101',
+            }), content_type='application/json')
+        self.assertEqual(gemini.call_args.args[2], [('Wi-Fi network', 'FAQ-Guest'), ('Wi-Fi password', 'sunrise42')])
+        self.assertTrue(GuestRequest.objects.filter(request_type='maintenance', status='pending').exists())
+
+
+class StaffProvisioningTests(TestCase):
+    """Staff accounts are created in bulk without the per-user profile signal."""
+
+    def setUp(self):
+        cache.clear()
+        Hotel.objects.create(name='Some Other Hotel', total_rooms=5)
+        self.hotel = Hotel.objects.create(name='Provision Hotel', total_rooms=5)
+        User.objects.create_user('taken', password='x')
+
+    def test_provision_staff(self):
+        records = [
+            {'username': f'staff{i}', 'password': f'Tide-pool-{i}!', 'category': 'housekeeping'} for i in range(8)
+        ] + [
+            {'username': 'nopass', 'category': 'maintenance', 'accepts_auto_assignment': 'no'},
+            {'username': 'staff0', 'password': 'Tide-pool-0!'},
+            {'username': 'taken', 'password': 'Tide-pool-9!'},
+            {'username': 'bad name', 'password': 'Tide-pool-9!', 'category': 'chef'},
+            {'username': 'weak', 'password': '123'},
+        ]
+        with mock.patch('builtins.print') as printed, self.assertNumQueries(6):
+            report = provision_staff(self.hotel, records, workers=2)
+        printed.assert_not_called()
+        self.assertEqual(report['created'], 9)
+        self.assertEqual([error['row'] for error in report['errors']], [10, 11, 12, 13])
+        self.assertEqual(report['errors'][0]['errors'], ['Duplicate of row 1.'])
+        self.assertEqual(len(report['errors'][2]['errors']), 2)
+
+        staff = StaffMember.objects.select_related('user__profile').get(user__username='staff3')
+        self.assertEqual((staff.hotel, staff.category, staff.user.profile.hotel), (self.hotel, 'housekeeping', self.hotel))
+        self.assertTrue(staff.user.check_password('Tide-pool-3!'))
+        nopass = StaffMember.objects.get(user__username='nopass')
+        self.assertFalse(nopass.accepts_auto_assignment)
+        self.assertFalse(nopass.user.has_usable_password())
+
+    def test_provision_api(self):
+        admin = User.objects.create_user('admin', password='x')
+        admin.profile.hotel = self.hotel
+        admin.profile.save()
+        self.client.force_login(admin)
+        body = json.dumps([{'username': 'newbie', 'password': 'Tide-pool-1!', 'category': 'concierge'}])
+        response = self.client.post('/api/staff/provision/?dry_run=1', body, content_type='application/json')
+        self.assertEqual(response.json(), {'success': True, 'created': 1, 'errors': []})
+        self.assertFalse(User.objects.filter(username='newbie').exists())
+
+        upload = io.BytesIO(b'username,password,category\nnewbie,Tide-pool-1!,concierge\n')
+        upload.name = 'staff.csv'
+        response = self.client.post('/api/staff/provision/', {'file': upload})
+        self.assertEqual(response.json()['created'], 1)
+        self.assertEqual(StaffMember.objects.get(user__username='newbie').hotel, self.hotel)
+
+        upload = io.BytesIO('username,password\nrené,Tide-pool-2!\n'.encode('latin-1'))
+        upload.name = 'staff.csv'
+        response = self.client.post('/api/staff/provision/', {'file': upload})
+        self.assertEqual((response.status_code, response.json()['error']), (400, 'Staff files must be UTF-8 encoded.'))
+
+        # Hashing stays in the request worker, and a username taken after the check is a conflict.
+        real_bulk_create = User.objects.bulk_create
+
+        def signup_wins(users, **kwargs):
+            User.objects.create_user('latecomer')
+            return real_bulk_create(users, **kwargs)
+
+        body = json.dumps([{'username': name, 'password': 'Tide-pool-3!'} for name in ['latecomer'] + [
+            f'crew{i}' for i in range(HASH_POOL_THRESHOLD)
+        ]])
+        with mock.patch('main.provisioning.ProcessPoolExecutor') as pool, \
+                mock.patch.object(User.objects, 'bulk_create', signup_wins):
+            response = self.client.post('/api/staff/provision/', body, content_type='application/json')
+        pool.assert_not_called()
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(StaffMember.objects.filter(user__username__in=['latecomer', 'crew0']).exists())
+
+        newbie = User.objects.get(username='newbie')
+        self.client.force_login(newbie)
+        response = self.client.post('/api/staff/provision/', body, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+
+
+class BenchmarkSeedTests(TestCase):
+    """The benchmark generator is deterministic and leaves derived data consistent."""
+
+    def snapshot(self, hotel):
+        stays = list(GuestRoomAssignment.objects.filter(hotel=hotel).order_by('check_in_time', 'room_number').values_list(
+            'room_number', 'guest_names', 'check_in_time', 'check_out_time', 'status', 'total_bill_amount', 'created_at',
+        ))
+        requests = list(GuestRequest.objects.filter(hotel=hotel).order_by('timestamp', 'pk').values_list(
+            'room_number', 'request_type', 'status', 'raw_text', 'chat_history', 'timestamp', 'updated_at',
+            'assigned_staff__category', 'amenity_requested__name',
+        ))
+        return stays, requests
+
+    def test_seed_is_deterministic_and_consistent(self):
+        as_of = timezone.localdate() - timedelta(days=1)
+        with mock.patch('builtins.print') as printed:
+            [(hotel, counts)] = seed_benchmark_data(rooms=12, staff=6, years=0.25, requests=400, seed=3, as_of=as_of)
+        printed.assert_not_called()
+        self.assertEqual((counts['rooms'], counts['staff'], counts['requests']), (12, 6, 400))
+        self.assertEqual(UserProfile.objects.filter(hotel=hotel).count(), 7)
+        self.assertEqual(recount_staff_load(hotel), {})
+        self.assertFalse(GuestRequest.objects.filter(hotel=hotel, timestamp__gt=timezone.now()).exists())
+        for stay in GuestRoomAssignment.objects.filter(hotel=hotel):
+            self.assertFalse(GuestRoomAssignment.objects.filter(
+                room=stay.room, check_in_time__lt=stay.check_out_time, check_out_time__gt=stay.check_in_time,
+            ).exclude(pk=stay.pk).exists())
+
+        self.assertFalse(User.objects.get(username=f'bench{hotel.pk}_admin').has_usable_password())
+
+        with self.assertRaisesMessage(CommandError, 'pass --force'):
+            call_command('seed_benchmark_data', rooms=12, stdout=io.StringIO())
+        call_command('seed_benchmark_data', rooms=12, staff=6, years=0.25, requests=400, seed=3,
+                     as_of=as_of.isoformat(), password='Tide-pool-7!', force=True, stdout=io.StringIO())
+        again = Hotel.objects.exclude(pk=hotel.pk).get(name=hotel.name)
+        self.assertEqual(self.snapshot(again), self.snapshot(hotel))
+        self.assertTrue(User.objects.get(username=f'bench{again.pk}_admin').check_password('Tide-pool-7!'))
+
+
+class BenchmarkSuiteTests(TestCase):
+    """Benchmark runs leave the dataset untouched and comparisons flag regressions."""
+
+    def test_run_and_compare(self):
+        cache.clear()
+        [(hotel, _counts)] = seed_benchmark_data(rooms=8, staff=4, years=0.1, requests=50, seed=1)
+        counts = (GuestRequest.objects.count(), GuestRoomAssignment.objects.count())
+        run = run_benchmarks([('small', hotel)], iterations=3, warmup=1)
+        self.assertEqual((GuestRequest.objects.count(), GuestRoomAssignment.objects.count()), counts)
+
+        dataset = run['datasets']['small']
+        self.assertEqual(dataset['requests'], 50)
+        self.assertEqual(set(dataset['scenarios']), {
+            'dashboard_home', 'dashboard_requests_active', 'dashboard_requests_archive', 'dashboard_requests_all',
+            'dashboard_guests', 'dashboard_amenities', 'request_details_api', 'check_new_requests',
+            'check_for_new_updates', 'process_guest_command', 'assignment_form_save',
+        })
+        result = dataset['scenarios']['process_guest_command']
+        self.assertEqual(result['iterations'], 3)
+        self.assertLessEqual(result['p50_ms'], result['p90_ms'])
+        self.assertGreater(result['queries'], 0)
+        json.dumps(run)
+
+        self.assertEqual(compare_runs(run, run), [])
+        slower = json.loads(json.dumps(run))
+        slower['datasets']['small']['scenarios']['request_details_api']['p90_ms'] += 50
+        slower['datasets']['small']['scenarios']['request_details_api']['queries'] += 1
+        self.assertEqual(
+            [(r['scenario'], r['metric']) for r in compare_runs(run, slower)],
+            [('request_details_api', 'p90_ms'), ('request_details_api', 'queries')],
+        )
+
+    def test_sizes_leave_nothing_behind(self):
+        hotels = Hotel.objects.count()
+        output = io.StringIO()
+        with mock.patch('main.management.commands.benchmark.seed_benchmark_data',
+                        partial(seed_benchmark_data, rooms=8, staff=4, years=0.1)):
+            call_command('benchmark', sizes='30', scenarios=['check_new_requests'], iterations=1, warmup=0,
+                         stdout=output)
+        self.assertIn('30_requests', output.getvalue())
+        self.assertEqual(Hotel.objects.count(), hotels)
+        self.assertFalse(User.objects.filter(username__startswith='bench').exists())
+
+
+@override_settings(REQUEST_TIMING_ENABLED=True)
+class RequestTimingTests(TestCase):
+    """The opt-in timing middleware reports queries, templates and Gemini time per request."""
+
+    def setUp(self):
+        cache.clear()
+        clear_samples()
+        self.hotel = Hotel.objects.create(name='Timing Hotel', total_rooms=5)
+        self.user = User.objects.create_user('timing_admin', password='x', is_staff=True)
+        self.user.profile.hotel = self.hotel
+        self.user.profile.save()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_server_timing_and_report(self):
+        response = self.client.get('/dashboard/requests/')
+        header = response['Server-Timing']
+        self.assertRegex(header, r'^total;dur=[0-9.]+, db;dur=[0-9.]+;desc="[1-9][0-9]* queries", db-slowest;dur=[0-9.]+;desc="main/')
+        self.assertIn('template;dur=', header)
+
+        reply = {'intent': 'maintenance', 'entities': {'query': 'x'}, 'conci_response': 'Sending someone.'}
+        with mock.patch('main.views.call_gemini_api', mock.AsyncMock(return_value=reply)):
+            response = self.client.post('/api/process_command/', json.dumps({
+                'message': 'The AC is broken', 'hotel_id': self.hotel.pk, 'room_number': '101',
+            }), content_type='application/json')
+        self.assertIn('gemini;dur=', response['Server-Timing'])
+        self.assertEqual([sample['endpoint'] for sample in recorded_samples()],
+                         ['main:guest_requests_dashboard', 'main:process_guest_command'])
+
+        response = self.client.get('/dashboard/timing/?format=json')
+        endpoints = {row['endpoint']: row for row in response.json()['endpoints']}
+        self.assertEqual(endpoints['main:process_guest_command']['requests'], 1)
+        self.assertGreater(endpoints['main:guest_requests_dashboard']['mean_template_ms'], 0)
+        self.assertContains(self.client.get('/dashboard/timing/'), 'main:process_guest_command')
+
+        self.user.is_staff = False
+        self.user.save()
+        self.assertEqual(self.client.get('/dashboard/timing/').status_code, 302)
+        # Query locations stay in the report for everyone else.
+        header = self.client.get('/dashboard/requests/')['Server-Timing']
+        self.assertRegex(header, r'db-slowest;dur=[0-9.]+(,|$)')
+        self.assertNotIn('main/', header)
+
+    def test_streamed_body_is_timed(self):
+        GuestRequest.objects.create(hotel=self.hotel, room_number='101', raw_text='Towels please', request_type='amenity')
+        response = self.client.get(reverse('main:export_data_api', args=['requests']))
+        before_body = int(re.search(r'"(\d+) queries"', response['Server-Timing']).group(1))
+        self.assertEqual(recorded_samples(), [])
+
+        self.assertIn(b'Towels please', b''.join(response.streaming_content))
+        [sample] = recorded_samples()
+        self.assertEqual(sample['endpoint'], 'main:export_data_api')
+        self.assertGreater(sample['queries'], before_body)
+
+    @override_settings(REQUEST_TIMING_ENABLED=False)
+    def test_off_by_default(self):
+        response = Client().get('/login/')
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(recorded_samples(), [])
+
+
+def _budget_amenity(c):
+    return Amenity.objects.create(name=f"Budget Amenity {c['hotel'].pk}", price=Decimal('1.00')).pk
+
+
+def _assigned_task(c):
+    """A pending request of the hotel assigned to the signed-in staff member."""
+    GuestRequest.objects.filter(pk=c['request_id']).update(assigned_staff=c['staff'], status='pending')
+    return c['request_id']
+
+
+def _request_form(c):
+    guest_request = GuestRequest.objects.get(pk=c['request_id'])
+    return {
+        'room_number': guest_request.room_number, 'raw_text': guest_request.raw_text, 'status': 'in_progress',
+        'request_type': guest_request.request_type, 'assigned_staff': c['staff'].pk, 'staff_notes': 'On it',
+        'amenity_quantity': guest_request.amenity_quantity,
+    }
+
+
+def _stay_form(c):
+    day = c['free_day']
+    return {
+        'room_number_input': c['room_number'], 'guest_names': 'Budget Guest',
+        'check_in_date': day.isoformat(), 'check_in_time_input': '15:00',
+        'check_out_date': (day + timedelta(days=2)).isoformat(), 'check_out_time_input': '11:00',
+        'total_bill_amount': '240.00', 'amount_paid': '0.00', 'status': 'confirmed',
+    }
+
+
+# Query budget of every URL in main/urls.py: name -> (max queries, signed in as, request builder).
+# Builders return (method, url, client kwargs) and may set up rows first (not counted).
+# Requests start with an empty cache, so budgets include filling the fragment, hotel context
+# and catalog caches, and the dashboard tabs read their fragment stamps from the database. Raise a budget only with a reason; never for a count that grows with rows.
+QUERY_BUDGETS = {
+    'home_dashboard': (6, 'admin', lambda c: ('get', reverse('main:home_dashboard'), {})),
+    'guest_requests_dashboard': (8, 'admin', lambda c: ('get', reverse('main:guest_requests_dashboard'), {})),
+    'active_requests': (8, 'admin', lambda c: ('get', reverse('main:active_requests'), {})),
+    'archive_requests': (9, 'admin', lambda c: ('get', reverse('main:archive_requests'), {})),
+    'all_requests': (9, 'admin', lambda c: ('get', reverse('main:all_requests'), {})),
+    'guest_management': (6, 'admin', lambda c: ('get', reverse('main:guest_management'), {})),
+    'amenity_management': (6, 'admin', lambda c: ('get', reverse('main:amenity_management'), {})),
+    'request_timing_report': (3, 'django_staff', lambda c: ('get', reverse('main:request_timing_report'), {})),
+    'check_new_requests': (4, 'admin', lambda c: ('get', reverse('main:check_new_requests'), {})),
+    'update_request_api': (13, 'admin', lambda c: (
+        'post', reverse('main:update_request_api', args=[c['request_id']]), {'data': _request_form(c)})),
+    'request_details_api': (8, 'admin', lambda c: (
+        'get', reverse('main:request_details_api', args=[c['request_id']]), {})),
+    'request_search_api': (6, 'admin', lambda c: ('get', reverse('main:request_search_api'), {'data': {'q': 'towel'}})),
+    'edit_assignment_api': (4, 'admin', lambda c: (
+        'get', reverse('main:edit_assignment_api', args=[c['assignment_id']]), {})),
+    'delete_assignment_api': (11, 'admin', lambda c: (
+        'post', reverse('main:delete_assignment_api', args=[c['assignment_id']]), {})),
+    'import_bookings_api': (15, 'admin', lambda c: (
+        'post', reverse('main:import_bookings_api'),
+        {'data': json.dumps([{'room_number': c['room_number'], 'guest_names': 'Imported Guest',
+                              'check_in': f"{c['free_day']}T15:00", 'check_out': f"{c['free_day'] + timedelta(days=1)}T11:00"}]),
+         'content_type': 'application/json'})),
+    'provision_staff_api': (9, 'admin', lambda c: (
+        'post', reverse('main:provision_staff_api'),
+        {'data': json.dumps([{'username': f"budget_staff_{c['hotel'].pk}", 'category': 'housekeeping'}]),
+         'content_type': 'application/json'})),
+    'amenity_detail_api': (4, 'admin', lambda c: ('get', reverse('main:amenity_detail_api', args=[_budget_amenity(c)]), {})),
+    'delete_amenity_api': (7, 'admin', lambda c: ('post', reverse('main:delete_amenity_api', args=[_budget_amenity(c)]), {})),
+    'save_or_update_amenity_api': (6, 'admin', lambda c: (
+        'post', reverse('main:save_or_update_amenity_api'),
+        {'data': {'name': f"Budget Robe {c['hotel'].pk}", 'price': '9.50', 'is_available': 'on'}})),
+    'dashboard_kpis_api': (4, 'admin', lambda c: ('get', reverse('main:dashboard_kpis_api'), {})),
+    'dashboard_requests_api': (7, 'admin', lambda c: ('get', reverse('main:dashboard_requests_api', args=['all']), {})),
+    'dashboard_assignments_api': (4, 'admin', lambda c: ('get', reverse('main:dashboard_assignments_api'), {})),
+    'assignment_search_api': (5, 'admin', lambda c: (
+        'get', reverse('main:assignment_search_api'), {'data': {'q': 'Sharma'}})),
+    'room_availability_api': (6, 'admin', lambda c: (
+        'get', reverse('main:room_availability_api'),
+        {'data': {'check_in': f"{c['free_day']}T15:00", 'check_out': f"{c['free_day'] + timedelta(days=2)}T11:00"}})),
+    'occupancy_matrix_api': (6, 'admin', lambda c: ('get', reverse('main:occupancy_matrix_api'), {})),
+    'dashboard_amenities_api': (4, 'admin', lambda c: ('get', reverse('main:dashboard_amenities_api'), {})),
+    'export_data_api': (5, 'admin', lambda c: ('get', reverse('main:export_data_api', args=['requests']), {})),
+    'guest_interface': (4, None, lambda c: (
+        'get', reverse('main:guest_interface', args=[c['hotel'].pk, c['guest_room']]), {})),
+    'process_guest_command': (12, None, lambda c: (
+        'post', reverse('main:process_guest_command'),
+        {'data': json.dumps({'message': 'Please bring two towels', 'hotel_id': c['hotel'].pk, 'room_number': c['guest_room']}),
+         'content_type': 'application/json'})),
+    'check_for_new_updates': (3, None, lambda c: (
+        'get', reverse('main:check_for_new_updates', args=[c['hotel'].pk, c['guest_room']]), {})),
+    'logout': (5, 'admin', lambda c: ('post', reverse('main:logout'), {})),
+    'login': (0, None, lambda c: ('get', reverse('main:login'), {})),
+    'employee_login': (0, None, lambda c: ('get', reverse('main:employee_login'), {})),
+    'employee_dashboard': (4, 'staff', lambda c: ('get', reverse('main:employee_dashboard'), {})),
+    'complete_employee_request_api': (10, 'staff', lambda c: (
+        'post', reverse('main:complete_employee_request_api', args=[_assigned_task(c)]), {})),
+    'claim_next_task_api': (14, 'staff', lambda c: ('post', reverse('main:claim_next_task_api'), {})),
+}
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Every URL makes the same number of queries against a small and a ten times larger hotel,
+    and no more than its QUERY_BUDGETS entry.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.contexts = []
+        for size, rooms in ((20, 6), (200, 60)):
+            [(hotel, _counts)] = seed_benchmark_data(rooms=rooms, staff=8, years=0.2, requests=size, seed=size)
+            # Open requests on both sizes, so no tab is empty in one and filled in the other.
+            latest = GuestRequest.objects.filter(hotel=hotel).order_by('-timestamp').values_list('pk', flat=True)[:5]
+            GuestRequest.objects.filter(pk__in=list(latest)).exclude(request_type='casual_chat').update(status='pending')
+            context = benchmark_context(hotel)
+            context['staff'] = StaffMember.objects.filter(hotel=hotel).select_related('user').order_by('pk').first()
+            # ...and one of them waiting for the staff member, so claiming takes the same path.
+            GuestRequest.objects.filter(pk=latest[0]).update(status='pending', assigned_staff=context['staff'])
+            recount_staff_load(hotel)
+            context['assignment_id'] = GuestRoomAssignment.objects.filter(hotel=hotel).order_by('-check_in_time').first().pk
+            context['django_staff'] = User.objects.create_user(f'budget_admin_{hotel.pk}', is_staff=True)
+            context['django_staff'].profile.hotel = hotel
+            context['django_staff'].profile.save()
+            # Version stamps are created on first use; a running site already has them.
+            availability_index(hotel.pk)
+            faq_index(hotel.pk)
+            fragment_versions(hotel.pk)
+            cls.contexts.append((size, context))
+        amenity_catalog()
+
+    def measure(self, name, context):
+        _budget, role, build = QUERY_BUDGETS[name]
+        client = Client()
+        if role:
+            user = context[role].user if role == 'staff' else context[role]
+            client.force_login(user)
+        # Each request's writes are rolled back so endpoints don't see each other's changes.
+        with transaction.atomic():
+            method, url, kwargs = build(context)
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries, \
+                    mock.patch('main.views.call_gemini_api', stub_gemini), mock.patch('builtins.print'):
+                response = getattr(client, method)(url, **kwargs)
+                if getattr(response, 'streaming', False):
+                    b''.join(response.streaming_content)
+            transaction.set_rollback(True)
+        self.assertLess(response.status_code, 400, f'{name}: {method.upper()} {url} returned {response.status_code}')
+        return [query['sql'] for query in queries.captured_queries]
+
+    def test_every_url_has_a_budget(self):
+        from . import urls
+        self.assertEqual(sorted(pattern.name for pattern in urls.urlpatterns), sorted(QUERY_BUDGETS))
+
+    def test_query_counts_are_constant_and_within_budget(self):
+        for name, (budget, _role, _build) in QUERY_BUDGETS.items():
+            with self.subTest(endpoint=name):
+                counts = {}
+                for size, context in self.contexts:
+                    sql = self.measure(name, context)
+                    counts[size] = len(sql)
+                    listing = '\n'.join(f'  {i}. {statement}' for i, statement in enumerate(sql, start=1))
+                    self.assertLessEqual(
+                        len(sql), budget,
+                        f'{name} made {len(sql)} queries (budget {budget}) with {size} requests:\n{listing}',
+                    )
+                self.assertEqual(len(set(counts.values())), 1,
+                                 f'{name} query count grows with the data: {counts}\n{listing}')
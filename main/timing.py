@@ -0,0 +1,203 @@
+# main/timing.py
+
+import contextvars
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque, defaultdict
+from contextlib import contextmanager
+
+import numpy as np
+from django.conf import settings
+
+# Per-request timing for main.middleware.RequestTimingMiddleware (opt-in with
+# REQUEST_TIMING_ENABLED). The request's RequestTiming lives in a context variable, so the
+# database execute wrapper, the template render hook and timed() blocks (e.g. around
+# call_gemini_api) can add to it from anywhere in the request, including the threads async
+# views run in. Finished requests are sampled into a per-process ring buffer that the
+# admin-only timing report aggregates.
+
+REQUEST_TIMING_BUFFER_SIZE = getattr(settings, 'REQUEST_TIMING_BUFFER_SIZE', 1000)
+REQUEST_TIMING_SAMPLE_RATE = getattr(settings, 'REQUEST_TIMING_SAMPLE_RATE', 1.0)
+
+_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+_PROJECT_DIR = os.path.dirname(_APP_DIR)
+_THIS_FILE = os.path.abspath(__file__)
+
+_current = contextvars.ContextVar('request_timing', default=None)
+_samples = deque(maxlen=REQUEST_TIMING_BUFFER_SIZE)
+_samples_lock = threading.Lock()
+_template_hook_lock = threading.Lock()
+_template_hook_installed = False
+
+
+class RequestTiming:
+    """What one request spent its time on. Durations are in seconds; spans maps name -> seconds."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.slowest_sql_time = 0.0
+        self.slowest_sql_location = None
+        self.spans = defaultdict(float)
+
+    def server_timing(self, total, include_location=False):
+        """
+        The Server-Timing header value (durations in milliseconds). The slowest query's source
+        location is only included with include_location (staff); the report always has it.
+        """
+        entries = [
+            f'total;dur={total * 1000:.1f}',
+            f'db;dur={self.sql_time * 1000:.1f};desc="{self.queries} queries"',
+        ]
+        if self.slowest_sql_location:
+            slowest = f'db-slowest;dur={self.slowest_sql_time * 1000:.1f}'
+            if include_location:
+                slowest += f';desc="{self.slowest_sql_location}"'
+            entries.append(slowest)
+        entries.extend(f'{name};dur={seconds * 1000:.1f}' for name, seconds in sorted(self.spans.items()))
+        return ', '.join(entries)
+
+
+def current_timing():
+    """The RequestTiming of the request being handled, or None if timing is off."""
+    return _current.get()
+
+
+@contextmanager
+def request_timing(timing=None):
+    """Makes `timing` (a new RequestTiming by default) the current one for the block."""
+    timing = timing or RequestTiming()
+    token = _current.set(timing)
+    try:
+        yield timing
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def timed(name):
+    """Adds the time spent in the block to the current request's `name` span, if it's being timed."""
+    timing = _current.get()
+    if timing is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.spans[name] += time.perf_counter() - started
+
+
+def _calling_line():
+    """'path:line in function' of the innermost project frame outside this module, or None."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if filename.startswith(_PROJECT_DIR) and filename != _THIS_FILE and 'site-packages' not in filename:
+            return f'{os.path.relpath(filename, _PROJECT_DIR)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return None
+
+
+def record_queries(execute, sql, params, many, context):
+    """connection.execute_wrapper hook counting and timing queries for the current request."""
+    timing = _current.get()
+    if timing is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        timing.queries += 1
+        timing.sql_time += elapsed
+        if elapsed >= timing.slowest_sql_time:
+            timing.slowest_sql_time = elapsed
+            timing.slowest_sql_location = _calling_line()
+
+
+def install_template_timer():
+    """Times top-level template renders (render(), render_to_string) into the 'template' span."""
+    global _template_hook_installed
+    from django.template.backends.django import Template
+
+    with _template_hook_lock:
+        if _template_hook_installed:
+            return
+        render = Template.render
+
+        def timed_render(self, context=None, request=None):
+            with timed('template'):
+                return render(self, context, request)
+
+        Template.render = timed_render
+        _template_hook_installed = True
+
+
+def should_sample():
+    return REQUEST_TIMING_SAMPLE_RATE >= 1 or random.random() < REQUEST_TIMING_SAMPLE_RATE
+
+
+def record_sample(request, response, timing, total):
+    match = getattr(request, 'resolver_match', None)
+    sample = {
+        'endpoint': match.view_name if match else request.path,
+        'method': request.method,
+        'status': response.status_code,
+        'total_ms': total * 1000,
+        'queries': timing.queries,
+        'sql_ms': timing.sql_time * 1000,
+        'slowest_sql_ms': timing.slowest_sql_time * 1000,
+        'slowest_sql_location': timing.slowest_sql_location,
+        'spans_ms': {name: seconds * 1000 for name, seconds in timing.spans.items()},
+        'at': time.time(),
+    }
+    with _samples_lock:
+        _samples.append(sample)
+
+
+def recorded_samples():
+    with _samples_lock:
+        return list(_samples)
+
+
+def clear_samples():
+    with _samples_lock:
+        _samples.clear()
+
+
+def endpoint_summary(samples=None):
+    """
+    Aggregates samples per (method, endpoint), worst p90 first: request count, total time
+    percentiles, mean/max queries, mean SQL/template/Gemini time and the slowest query seen
+    with its calling line.
+    """
+    grouped = defaultdict(list)
+    for sample in recorded_samples() if samples is None else samples:
+        grouped[(sample['method'], sample['endpoint'])].append(sample)
+
+    rows = []
+    for (method, endpoint), group in grouped.items():
+        totals = np.array([sample['total_ms'] for sample in group])
+        slowest = max(group, key=lambda sample: sample['slowest_sql_ms'])
+        rows.append({
+            'method': method,
+            'endpoint': endpoint,
+            'requests': len(group),
+            'p50_ms': float(np.percentile(totals, 50)),
+            'p90_ms': float(np.percentile(totals, 90)),
+            'max_ms': float(totals.max()),
+            'mean_queries': float(np.mean([sample['queries'] for sample in group])),
+            'max_queries': max(sample['queries'] for sample in group),
+            'mean_sql_ms': float(np.mean([sample['sql_ms'] for sample in group])),
+            'mean_template_ms': float(np.mean([sample['spans_ms'].get('template', 0.0) for sample in group])),
+            'mean_gemini_ms': float(np.mean([sample['spans_ms'].get('gemini', 0.0) for sample in group])),
+            'slowest_sql_ms': slowest['slowest_sql_ms'],
+            'slowest_sql_location': slowest['slowest_sql_location'],
+        })
+    rows.sort(key=lambda row: row['p90_ms'], reverse=True)
+    return rows
@@ -15,17 +15,33 @@ urlpatterns = [
     path('dashboard/requests/all/', views.staff_dashboard, {'main_tab': 'requests', 'sub_tab': 'all'}, name='all_requests'),
     path('dashboard/guests/', views.staff_dashboard, {'main_tab': 'guest_management'}, name='guest_management'),
     path('dashboard/amenities/', views.staff_dashboard, {'main_tab': 'amenities'}, name='amenity_management'),
+    path('dashboard/timing/', views.request_timing_report, name='request_timing_report'),
 
     # API Endpoints for Staff (Admin) Dashboard
     path('api/check_new_requests/', views.check_new_requests, name='check_new_requests'),
     path('api/requests/<int:request_id>/update/', views.update_request_api, name='update_request_api'),
     path('api/requests/<int:request_id>/details/', views.request_details_api, name='request_details_api'),
+    path('api/requests/search/', views.request_search_api, name='request_search_api'),
     path('api/assignments/<int:assignment_id>/edit/', views.edit_assignment_api, name='edit_assignment_api'),
     path('api/assignments/<int:assignment_id>/delete/', views.delete_assignment_api, name='delete_assignment_api'),
+    path('api/assignments/import/', views.import_bookings_api, name='import_bookings_api'),
+    path('api/staff/provision/', views.provision_staff_api, name='provision_staff_api'),
     path('api/amenities/<int:amenity_id>/', views.amenity_detail_api, name='amenity_detail_api'),
     path('api/amenities/<int:amenity_id>/delete/', views.delete_amenity, name='delete_amenity_api'),
     path('api/amenities/save_or_update/', views.save_or_update_amenity_api, name='save_or_update_amenity_api'),
 
+    # JSON tab data for client-side rendering of the staff dashboard
+    path('api/dashboard/kpis/', views.dashboard_kpis_api, name='dashboard_kpis_api'),
+    path('api/dashboard/requests/<str:sub_tab>/', views.dashboard_requests_api, name='dashboard_requests_api'),
+    path('api/dashboard/assignments/', views.dashboard_assignments_api, name='dashboard_assignments_api'),
+    path('api/dashboard/assignments/search/', views.assignment_search_api, name='assignment_search_api'),
+    path('api/availability/', views.room_availability_api, name='room_availability_api'),
+    path('api/availability/occupancy/', views.occupancy_matrix_api, name='occupancy_matrix_api'),
+    path('api/dashboard/amenities/', views.dashboard_amenities_api, name='dashboard_amenities_api'),
+
+    # Streaming CSV / JSON Lines exports
+    path('api/export/<str:dataset>/', views.export_data_api, name='export_data_api'),
+
     # Guest Interface URLs (assuming these views exist and are correct)
     path('guest/<int:hotel_id>/room/<str:room_number>/', views.guest_interface, name='guest_interface'),
     path('api/process_command/', views.process_guest_command, name='process_guest_command'),
@@ -39,4 +55,5 @@ urlpatterns = [
     path('employee/login/', views.employee_login_view, name='employee_login'),
     path('employee/dashboard/', views.employee_dashboard_view, name='employee_dashboard'),
     path('api/employee/requests/<int:request_id>/complete/', views.complete_employee_request_api, name='complete_employee_request_api'),
+    path('api/employee/tasks/claim/', views.claim_next_task_api, name='claim_next_task_api'),
 ]
@@ -0,0 +1,81 @@
+# main/versions.py
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+
+from .locking import lock_sqlite_database
+from .models import VersionStamp
+
+# Version stamps for the snapshots each process keeps in memory (availability index, amenity
+# catalog, FAQ index) and for the cached dashboard fragments (main/fragments.py). A process
+# reuses its snapshot while the stamp it was built at is still current; any process that
+# changes the underlying rows bumps the stamp after commit.
+#
+# With a shared cache (SHARED_CACHE, i.e. REDIS_URL) stamps live there: one cache round trip
+# per use. The default LocMemCache is per process, so a bump there would never reach the
+# other workers; without a shared cache the stamps live in the VersionStamp table instead,
+# at the cost of one primary-key read per use.
+
+
+def shared_cache():
+    return getattr(settings, 'SHARED_CACHE', False)
+
+
+def current_version(key):
+    """The key's current stamp."""
+    return current_versions([key])[key]
+
+
+def current_versions(keys):
+    """{key: current stamp} for several keys, in one cache round trip or query."""
+    keys = list(keys)
+    if shared_cache():
+        versions = cache.get_many(keys)
+        missing = {key: time.time_ns() for key in keys if key not in versions}
+        if missing:
+            cache.set_many(missing, timeout=None)
+            versions.update(missing)
+        return versions
+    versions = dict(VersionStamp.objects.filter(key__in=keys).values_list('key', 'version'))
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        # Like the cache stamps, start from the clock rather than 0, so a snapshot built against
+        # rows that are gone since (a restored database, a rolled-back test) isn't taken as current.
+        version = time.time_ns()
+        VersionStamp.objects.bulk_create([VersionStamp(key=key, version=version) for key in missing],
+                                         ignore_conflicts=True)
+        versions.update(VersionStamp.objects.filter(key__in=missing).values_list('key', 'version'))
+    return versions
+
+
+def bump_version(key):
+    """
+    Makes every snapshot of `key` stale. Returns (previous stamp, new stamp); when nothing
+    else bumped the key in between, a caller holding a snapshot at `previous` may patch it
+    and keep it as current at `new`. `previous` is None if that can't be known.
+    """
+    if shared_cache():
+        previous = cache.get(key)
+        version = time.time_ns()
+        cache.set(key, version, timeout=None)
+        return previous, version
+
+    with transaction.atomic():
+        if connection.vendor == 'sqlite':
+            lock_sqlite_database(VersionStamp._meta.db_table)
+        previous = VersionStamp.objects.filter(key=key).values_list('version', flat=True).first()
+        if previous is None:
+            try:
+                with transaction.atomic():
+                    VersionStamp.objects.create(key=key, version=time.time_ns())
+            except IntegrityError:
+                VersionStamp.objects.filter(key=key).update(version=F('version') + 1)
+        else:
+            VersionStamp.objects.filter(key=key).update(version=F('version') + 1)
+        version = VersionStamp.objects.filter(key=key).values_list('version', flat=True).get()
+    # Stamps only grow by one per bump, so a gap means another process bumped concurrently.
+    return (previous if previous is not None and version == previous + 1 else None), version
@@ -1,20 +1,46 @@
 # main/views.py
 
 from django.shortcuts import render, redirect, get_object_or_404
+from django.conf import settings
 from django.contrib.auth import logout, authenticate, login 
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse, HttpResponseBadRequest
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse, HttpResponseBadRequest, StreamingHttpResponse
 from django.views.decorators.http import require_POST, require_GET
 from django.utils import timezone
 import json
 from datetime import timedelta, date
+from django.db import transaction
 from django.db.models import Q
+from django.utils import dateformat
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.functional import SimpleLazyObject
+from django.utils.text import Truncator
 import requests
 from asgiref.sync import sync_to_async
 import os
 from dotenv import load_dotenv
-from .models import Hotel, UserProfile, GuestRoomAssignment, Room, GuestRequest, Amenity,  StaffMember 
+from .models import Hotel, UserProfile, GuestRoomAssignment, GuestRequest, Amenity,  StaffMember, ArchivedGuestRequest
 from .forms import AmenityForm, GuestRoomAssignmentForm, GuestRequestForm
+from .stats import get_home_stats, local_day_start
+from .fragments import fragment_versions, DASHBOARD_FRAGMENT_CACHE_TIMEOUT
+from .pagination import (
+    InvalidCursor, decode_cursor, keyset_paginate, keyset_paginate_tiers, page_querystring,
+    REQUEST_PAGE_ORDERING, ASSIGNMENT_PAGE_ORDERING,
+)
+from .availability import MAX_OCCUPANCY_DAYS, availability_index
+from .billing import bill_amenity_request
+from .bookings import BookingFileError, BookingOverlapError, import_bookings, read_booking_records
+from .catalog import amenity_catalog
+from .faq import faq_index
+from .exports import (
+    ASSIGNMENT_EXPORT_COLUMNS, EXPORT_FORMATS, REQUEST_EXPORT_COLUMNS, export_content_type, export_lines,
+)
+from .provisioning import StaffConflictError, StaffFileError, provision_staff, read_staff_records
+from .rooms import first_assignments_by_room, room_filter
+from .routing import choose_staff, claim_next_request
+from .search import filter_assignments_by_text, filter_requests_by_text, request_snippets, search_assignments, search_terms
+from .timing import REQUEST_TIMING_SAMPLE_RATE, endpoint_summary, recorded_samples, timed
 
 from django.contrib import messages # Import messages for feedback
 # Load environment variables from .env file
@@ -24,12 +50,13 @@ load_dotenv()
 GEMINI_API_KEY = os.getenv("GOOGLE_API_KEY")
 GEMINI_API_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent"
 
-async def call_gemini_api(prompt, available_amenities_data):
+async def call_gemini_api(prompt, available_amenities_data, hotel_facts=None):
     """
     Calls the Gemini API to get intent, entities, and a response.
     Args:
         prompt (str): The user's message.
         available_amenities_data (list): A list of dictionaries, each with 'name' and 'price' of available amenities.
+        hotel_facts (list): Optional (label, value) pairs of hotel information relevant to the message.
     Returns:
         dict: Parsed JSON response from Gemini, or an error structure.
     """
@@ -53,6 +80,11 @@ async def call_gemini_api(prompt, available_amenities_data):
     if not amenities_info_parts:
         amenities_info = "No specific amenities are currently listed as available."
 
+    # Hotel information the message seems to be about, so the AI can answer from it
+    hotel_info = ""
+    if hotel_facts:
+        hotel_info = "Hotel information: " + "; ".join(f"{label}: {value}" for label, value in hotel_facts) + "."
+
     # System instruction for the AI
     system_instruction_text = f"""
     You are an AI hotel concierge named Conci. Your primary goal is to assist guests with their requests.
@@ -68,6 +100,7 @@ async def call_gemini_api(prompt, available_amenities_data):
     - 'casual_chat': A greeting, farewell, or simple conversational filler that doesn't require an action (e.g., "Hi", "Thank you", "How are you?").
 
     {amenities_info}
+    {hotel_info}
 
     When an 'amenity_request' is identified, also extract the 'amenity_name' (must exactly match one of the available amenities if possible) and 'quantity' (default to 1 if not specified).
     
@@ -188,13 +221,21 @@ async def process_guest_command(request):
             return JsonResponse({'success': False, 'error': 'Missing message, hotel_id, or room_number.'}, status=400)
 
         hotel = await sync_to_async(get_object_or_404)(Hotel, id=hotel_id)
-
-        # Fetch available amenities with name and price
-        available_amenities_data = await sync_to_async(list)(
-            Amenity.objects.filter(is_available=True).values('name', 'price')
-        )
-        
-        gemini_response = await call_gemini_api(user_message, available_amenities_data)
+        room_rows = await sync_to_async(room_filter)(hotel, room_number)
+
+        # Available amenities with name and price, from this worker's catalog snapshot
+        catalog = await sync_to_async(amenity_catalog)()
+        available_amenities_data = catalog.prompt_data()
+
+        # Questions about hotel facts (Wi-Fi, check-out time...) are answered from the hotel's
+        # configuration without a Gemini round trip; anything else goes to Gemini with the facts it touches.
+        faq = await sync_to_async(faq_index)(hotel.pk)
+        faq_answer = faq.answer(user_message)
+        if faq_answer:
+            gemini_response = {'intent': 'casual_chat', 'entities': {'query': user_message}, 'conci_response': faq_answer}
+        else:
+            with timed('gemini'):
+                gemini_response = await call_gemini_api(user_message, available_amenities_data, faq.relevant_facts(user_message))
         
         request_type = gemini_response.get('intent', 'general_inquiry')
         conci_response = gemini_response.get('conci_response', "I apologize, I couldn't fully understand that. Can you please rephrase?")
@@ -208,7 +249,7 @@ async def process_guest_command(request):
         if request_type == 'amenity_request':
             amenity_name_from_ai = ai_entities.get('amenity_name')
             if amenity_name_from_ai:
-                amenity_obj = await sync_to_async(Amenity.objects.filter(name__iexact=amenity_name_from_ai, is_available=True).first)()
+                amenity_obj = catalog.find_available(amenity_name_from_ai)
                 if not amenity_obj:
                     request_type = 'general_inquiry'
                     conci_response = f"I'm sorry, '{amenity_name_from_ai}' is not currently available or recognized as an amenity. Can I help with something else?"
@@ -229,8 +270,7 @@ async def process_guest_command(request):
 
 
         latest_request_for_chat = await sync_to_async(GuestRequest.objects.filter(
-            hotel=hotel,
-            room_number=room_number
+            **room_rows
         ).order_by('-timestamp').first)()
 
         current_chat_history = []
@@ -256,6 +296,7 @@ async def process_guest_command(request):
             else:
                 dummy_request = await sync_to_async(GuestRequest.objects.create)(
                     hotel=hotel,
+                    room=room_rows.get('room'),
                     room_number=room_number,
                     raw_text=user_message,
                     conci_response_text=conci_response,
@@ -266,8 +307,11 @@ async def process_guest_command(request):
                 request_obj_id = dummy_request.id      # type: ignore
 
         else: # This is an actionable request (e.g., maintenance, housekeeping, or an actionable amenity_request)
+            # Routed straight to the least-loaded matching staff member unless the hotel opted out.
+            assigned_staff = await sync_to_async(choose_staff)(hotel, request_type)
             request_obj = await sync_to_async(GuestRequest.objects.create)(
                 hotel=hotel,
+                room=room_rows.get('room'),
                 room_number=room_number,
                 raw_text=user_message,
                 ai_intent=request_type,
@@ -275,6 +319,7 @@ async def process_guest_command(request):
                 conci_response_text=conci_response,
                 status='pending', # New actionable requests start as 'pending'
                 request_type=request_type,
+                assigned_staff=assigned_staff,
                 amenity_requested=amenity_obj,
                 amenity_quantity=amenity_qty,
                 bill_added=False,
@@ -296,6 +341,223 @@ async def process_guest_command(request):
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
 
+def _home_stats_context(user_hotel):
+    home_stats = get_home_stats(user_hotel)
+    home_stats['reservations_chart_data'] = json.dumps(home_stats['reservations_chart_data'])
+    return home_stats
+
+
+def requests_scope_key(staff_member):
+    """
+    Identifies which slice of a hotel's requests `staff_member` can see, for cache keys.
+    General and concierge staff (and non-staff admins) see everything.
+    """
+    if not staff_member or staff_member.category in ('general', 'concierge'):
+        return 'all'
+    return f"{staff_member.id}:{staff_member.category}"
+
+
+def visible_requests(user_hotel, logged_in_staff_member, model=GuestRequest):
+    """
+    Returns the hotel's requests that `logged_in_staff_member` may see: everything for general
+    and concierge staff (and non-staff admins), otherwise their own category and assignments.
+    Pass model=ArchivedGuestRequest for the archive tier.
+    """
+    requests_for_hotel = model.objects.filter(hotel=user_hotel)
+
+    if logged_in_staff_member:
+        if logged_in_staff_member.category == 'general' or logged_in_staff_member.category == 'concierge':
+            pass
+        else:
+            requests_for_hotel = requests_for_hotel.filter(
+                Q(assigned_staff=logged_in_staff_member) |
+                Q(request_type=logged_in_staff_member.category) |
+                Q(assigned_staff__isnull=True, request_type=logged_in_staff_member.category)
+            )
+    return requests_for_hotel
+
+
+def build_grouped_requests(user_hotel, logged_in_staff_member, sub_tab, cursor=None):
+    """
+    Builds the request list for a requests sub-tab, grouped by request type.
+    Returns a dict with 'groups', 'has_any_requests', 'is_paginated_page' and 'next_page_query'.
+    """
+    requests_for_hotel = visible_requests(user_hotel, logged_in_staff_member)
+
+    if sub_tab == 'active':
+        requests_for_hotel = requests_for_hotel.filter(status__in=['pending', 'in_progress']).exclude(request_type='casual_chat')
+    elif sub_tab == 'archive':
+        requests_for_hotel = requests_for_hotel.filter(status__in=['completed', 'cancelled'])
+    elif sub_tab == 'all':
+        pass
+
+    requests_for_hotel = requests_for_hotel.select_related('assigned_staff__user')
+
+    next_cursor = next_page_query = None
+    if sub_tab in ('archive', 'all'):
+        # History grows without bound, so page through it with a keyset cursor. Closed requests
+        # past the retention period live in the archive table (main/archive.py); page both tiers.
+        archived_requests = visible_requests(user_hotel, logged_in_staff_member, ArchivedGuestRequest)
+        requests_for_hotel, next_cursor = keyset_paginate_tiers(
+            [requests_for_hotel, archived_requests.select_related('assigned_staff__user')], REQUEST_PAGE_ORDERING, cursor,
+        )
+        next_page_query = page_querystring({}, next_cursor) if next_cursor else None
+    else:
+        requests_for_hotel = requests_for_hotel.order_by('-timestamp')
+
+    grouped_requests = {}
+    for choice_value, choice_label in GuestRequest.REQUEST_TYPE_CHOICES:
+        grouped_requests[choice_value] = {
+            'request_type': choice_value,
+            'display_name': choice_label,
+            'requests': []
+        }
+
+    requests_for_hotel = list(requests_for_hotel)
+    # One batched lookup by room FK instead of a room_number string query per card.
+    assignments_by_room = first_assignments_by_room(req.room_id for req in requests_for_hotel)
+
+    for req in requests_for_hotel:
+        assignment = assignments_by_room.get(req.room_id)
+
+        actual_request_type = req.request_type if req.request_type in [cv for cv, cl in GuestRequest.REQUEST_TYPE_CHOICES] else 'general_inquiry'
+
+        if sub_tab == 'active' and actual_request_type == 'casual_chat':
+            continue
+
+        grouped_requests[actual_request_type]['requests'].append({
+            'request': req,
+            'assignment': assignment,
+            'assigned_staff_name': req.assigned_staff.user.username if req.assigned_staff else None
+        })
+
+    ordered_grouped_requests = []
+    has_any_requests = False
+    for choice_value, choice_label in GuestRequest.REQUEST_TYPE_CHOICES:
+        if (sub_tab == 'active' and choice_value == 'casual_chat'):
+            continue
+
+        if grouped_requests[choice_value]['requests']:
+            ordered_grouped_requests.append(grouped_requests[choice_value])
+            has_any_requests = True
+
+    return {
+        'groups': ordered_grouped_requests,
+        'has_any_requests': has_any_requests,
+        'is_paginated_page': bool(cursor),
+        'next_cursor': next_cursor,
+        'next_page_query': next_page_query,
+    }
+
+
+def filter_assignments(all_assignments, params):
+    """
+    Applies the guest-management filter params (room number, guest names, status and
+    check-in/check-out date ranges) to an assignment queryset.
+    Returns (filtered queryset, dict of the filter params that were applied).
+    """
+    filter_params = {}
+
+    # Text filters go through the search index (main/search.py) instead of scanning with LIKE.
+    room_number_filter_val = params.get('room_number')
+    if room_number_filter_val:
+        all_assignments = filter_assignments_by_text(all_assignments, 'room_number', room_number_filter_val)
+        filter_params['room_number'] = room_number_filter_val
+
+    guest_names = params.get('guest_names')
+    if guest_names:
+        all_assignments = filter_assignments_by_text(all_assignments, 'guest_names', guest_names)
+        filter_params['guest_names'] = guest_names
+
+    status = params.get('status')
+    if status:
+        all_assignments = all_assignments.filter(status=status)
+        filter_params['status'] = status
+
+    check_in_date_from = params.get('check_in_date_from')
+    if check_in_date_from:
+        try:
+            from_date = timezone.datetime.strptime(check_in_date_from, '%Y-%m-%d').date()
+            all_assignments = all_assignments.filter(check_in_time__date__gte=from_date)
+            filter_params['check_in_date_from'] = check_in_date_from
+        except ValueError:
+            pass
+
+    check_in_date_to = params.get('check_in_date_to')
+    if check_in_date_to:
+        try:
+            to_date = timezone.datetime.strptime(check_in_date_to, '%Y-%m-%d').date()
+            all_assignments = all_assignments.filter(check_in_time__date__lte=to_date)
+            filter_params['check_in_date_to'] = check_in_date_to
+        except ValueError:
+            pass
+
+    check_out_date_from = params.get('check_out_date_from')
+    if check_out_date_from:
+        try:
+            from_date = timezone.datetime.strptime(check_out_date_from, '%Y-%m-%d').date()
+            all_assignments = all_assignments.filter(check_out_time__date__gte=from_date)
+            filter_params['check_out_date_from'] = check_out_date_from
+        except ValueError:
+            pass
+
+    check_out_date_to = params.get('check_out_date_to')
+    if check_out_date_to:
+        try:
+            to_date = timezone.datetime.strptime(check_out_date_to, '%Y-%m-%d').date()
+            all_assignments = all_assignments.filter(check_out_time__date__lte=to_date)
+            filter_params['check_out_date_to'] = check_out_date_to
+        except ValueError:
+            pass
+
+    return all_assignments, filter_params
+
+
+def filter_requests(requests_for_hotel, params):
+    """
+    Applies the request filter params (tab, full-text q, status, request type and a local
+    date range on the received time) to a GuestRequest queryset.
+    Returns (filtered queryset, dict of the filter params that were applied).
+    """
+    filter_params = {}
+
+    tab = params.get('tab')
+    if tab == 'active':
+        requests_for_hotel = requests_for_hotel.filter(status__in=['pending', 'in_progress']).exclude(request_type='casual_chat')
+        filter_params['tab'] = tab
+    elif tab == 'archive':
+        requests_for_hotel = requests_for_hotel.filter(status__in=['completed', 'cancelled'])
+        filter_params['tab'] = tab
+
+    query = (params.get('q') or '').strip()
+    if query:
+        requests_for_hotel = filter_requests_by_text(requests_for_hotel, query)
+        filter_params['q'] = query
+
+    status = params.get('status')
+    if status:
+        requests_for_hotel = requests_for_hotel.filter(status=status)
+        filter_params['status'] = status
+
+    request_type = params.get('request_type')
+    if request_type:
+        requests_for_hotel = requests_for_hotel.filter(request_type=request_type)
+        filter_params['request_type'] = request_type
+
+    # Whole local days, as half-open ranges on the indexed timestamp column.
+    for param, lookup, days in (('date_from', 'timestamp__gte', 0), ('date_to', 'timestamp__lt', 1)):
+        value = params.get(param)
+        if value:
+            try:
+                day = timezone.datetime.strptime(value, '%Y-%m-%d').date()
+                requests_for_hotel = requests_for_hotel.filter(**{lookup: local_day_start(day + timedelta(days=days))})
+                filter_params[param] = value
+            except ValueError:
+                pass
+
+    return requests_for_hotel, filter_params
+
+
 @login_required
 def staff_dashboard(request, main_tab='home', sub_tab=None):
     """
@@ -309,10 +571,7 @@ def staff_dashboard(request, main_tab='home', sub_tab=None):
     try:
         user_profile = request.user.profile
         user_hotel = user_profile.hotel
-        try:
-            logged_in_staff_member = StaffMember.objects.get(user=request.user, hotel=user_hotel)
-        except StaffMember.DoesNotExist:
-            logged_in_staff_member = None 
+        logged_in_staff_member = request.staff_member
     except UserProfile.DoesNotExist:
         logout(request)
         return redirect('login')
@@ -333,45 +592,15 @@ def staff_dashboard(request, main_tab='home', sub_tab=None):
 
     # NEW: Add all staff members for the current hotel to the context
     # This is needed for the "Assign Staff" dropdown in the requests modal
-    context['staff_members'] = StaffMember.objects.filter(hotel=user_hotel).order_by('user__username')
+    context['staff_members'] = StaffMember.objects.filter(hotel=user_hotel).select_related('user').order_by('user__username')
+    # Per-hotel version stamps for the cached template fragments (see main/fragments.py).
+    context['hotel_id'] = user_hotel.id
+    context['fragment_versions'] = fragment_versions(user_hotel.id)
+    context['fragment_cache_timeout'] = DASHBOARD_FRAGMENT_CACHE_TIMEOUT
     context['guest_request_status_choices'] = GuestRequest.STATUS_CHOICES
     context['guest_request_type_choices'] = GuestRequest.REQUEST_TYPE_CHOICES
     
 
-    today = timezone.localdate()
-    now = timezone.localtime(timezone.now())
-    total_rooms = user_hotel.total_rooms
-    
-    occupied_rooms = GuestRoomAssignment.objects.filter(
-        hotel=user_hotel,
-        check_in_time__lte=now,
-        check_out_time__gte=now,
-        status='checked_in'
-    ).count()
-
-    reserved_rooms = GuestRoomAssignment.objects.filter(
-        hotel=user_hotel,
-        check_in_time__date__gt=today,
-        status='confirmed'
-    ).count()
-
-    not_ready_rooms = Room.objects.filter(
-        hotel=user_hotel,
-        status__in=['cleaning', 'maintenance', 'out_of_service']
-    ).count()
-
-    available_rooms = total_rooms - occupied_rooms - reserved_rooms - not_ready_rooms
-    if available_rooms < 0:
-        available_rooms = 0
-
-    context.update({
-        'total_rooms': total_rooms,
-        'occupied_rooms': occupied_rooms,
-        'reserved_rooms': reserved_rooms,
-        'available_rooms': available_rooms,
-        'not_ready_rooms': not_ready_rooms,
-    })
-
     if request.method == 'POST':
         # --- Handle Guest Assignment Form Submission ---
         if 'guest_names' in request.POST and 'room_number_input' in request.POST:
@@ -385,18 +614,15 @@ def staff_dashboard(request, main_tab='home', sub_tab=None):
 
             if form.is_valid():
                 try:
-                    instance = form.save(commit=False)
-                    
-                    if not instance.pk and not instance.hotel_id: 
-                        instance.hotel = user_hotel
-                    
-                    instance.save() 
+                    instance = form.save()
                     
                     message = 'Guest assignment saved successfully.'
                     if form.new_room_created:
                         message += f" Room '{instance.room_number}' was created."
 
-                    return JsonResponse({'success': True, 'message': message})
+                    return JsonResponse({'success': True, 'message': message, 'assignment': serialize_assignment(instance)})
+                except BookingOverlapError:
+                    return JsonResponse({'success': False, 'error': 'Validation failed.', 'errors': form.errors.as_json()}, status=400)
                 except Exception as e:
                     print(f"!!! CRITICAL SERVER ERROR during Guest Assignment form.save(): {e}")
                     import traceback
@@ -412,54 +638,9 @@ def staff_dashboard(request, main_tab='home', sub_tab=None):
     if main_tab == 'home':
         context['page_title'] = 'Dashboard Overview'
 
-        new_bookings_count = GuestRoomAssignment.objects.filter(
-            hotel=user_hotel,
-            created_at__date=today
-        ).count()
-
-        check_ins_today_count = GuestRoomAssignment.objects.filter(
-            hotel=user_hotel,
-            check_in_time__date=today,
-            status='checked_in'
-        ).count()
-
-        check_outs_today_count = GuestRoomAssignment.objects.filter(
-            hotel=user_hotel,
-            check_out_time__date=today,
-            status='checked_out'
-        ).count()
-
-        total_requests_count = GuestRequest.objects.filter(hotel=user_hotel).count()
-
-        context.update({
-            'new_bookings_count': new_bookings_count,
-            'check_ins_today_count': check_ins_today_count,
-            'check_outs_today_count': check_outs_today_count,
-            'total_requests_count': total_requests_count,
-        })
-
-        reservations_chart_data = []
-        for i in range(7):
-            chart_date = today - timedelta(days=6 - i)
-            
-            booked_count = GuestRoomAssignment.objects.filter(
-                Q(created_at__date=chart_date) | Q(check_in_time__date=chart_date),
-                hotel=user_hotel,
-                status__in=['confirmed', 'checked_in']
-            ).count()
-
-            cancelled_count = GuestRoomAssignment.objects.filter(
-                hotel=user_hotel,
-                created_at__date=chart_date, 
-                status='cancelled'
-            ).count()
-            
-            reservations_chart_data.append({
-                "date": chart_date.strftime("%b %d"),
-                "booked": booked_count,
-                "cancelled": cancelled_count
-            })
-        context['reservations_chart_data'] = json.dumps(reservations_chart_data)
+        # KPIs and the 7-day chart are read from today's materialized HotelStats row (see main/stats.py),
+        # lazily so a cached KPI fragment skips the read entirely.
+        context['home_stats'] = SimpleLazyObject(lambda: _home_stats_context(user_hotel))
 
         booking_platform_data = json.dumps([
             {"platform": "Direct Booking", "value": 61},
@@ -477,145 +658,479 @@ def staff_dashboard(request, main_tab='home', sub_tab=None):
         
         context['guest_request_form'] = GuestRequestForm(hotel=user_hotel)
 
-        requests_for_hotel = GuestRequest.objects.filter(hotel=user_hotel)
-
-        if logged_in_staff_member:
-            if logged_in_staff_member.category == 'general' or logged_in_staff_member.category == 'concierge':
-                pass
-            else:
-                requests_for_hotel = requests_for_hotel.filter(
-                    Q(assigned_staff=logged_in_staff_member) |
-                    Q(request_type=logged_in_staff_member.category) |
-                    Q(assigned_staff__isnull=True, request_type=logged_in_staff_member.category)
-                )
-        else:
-            pass
-
         if sub_tab is None:
             sub_tab = 'active'
             context['current_sub_tab'] = 'active'
 
-        if sub_tab == 'active':
-            requests_for_hotel = requests_for_hotel.filter(status__in=['pending', 'in_progress']).exclude(request_type='casual_chat')
-        elif sub_tab == 'archive':
-            requests_for_hotel = requests_for_hotel.filter(status__in=['completed', 'cancelled'])
-        elif sub_tab == 'all':
-            pass
-
-        requests_for_hotel = requests_for_hotel.order_by('-timestamp')
-
-        grouped_requests = {}
-        for choice_value, choice_label in GuestRequest.REQUEST_TYPE_CHOICES:
-            grouped_requests[choice_value] = {
-                'display_name': choice_label,
-                'requests': []
-            }
-        
-        for req in requests_for_hotel:
-            assignment = GuestRoomAssignment.objects.filter(hotel=user_hotel, room_number=req.room_number).first()
-            
-            actual_request_type = req.request_type if req.request_type in [cv for cv, cl in GuestRequest.REQUEST_TYPE_CHOICES] else 'general_inquiry'
-
-            if sub_tab == 'active' and actual_request_type == 'casual_chat':
-                continue
-            
-            grouped_requests[actual_request_type]['requests'].append({
-                'request': req,
-                'assignment': assignment,
-                'assigned_staff_name': req.assigned_staff.user.username if req.assigned_staff else None
-            })
-
-        ordered_grouped_requests = []
-        has_any_requests = False
-        for choice_value, choice_label in GuestRequest.REQUEST_TYPE_CHOICES:
-            if (sub_tab == 'active' and choice_value == 'casual_chat'):
-                continue
-            
-            if grouped_requests[choice_value]['requests']:
-                ordered_grouped_requests.append(grouped_requests[choice_value])
-                has_any_requests = True
+        # The page itself is built lazily, so check the cursor of the paged tabs up front.
+        if sub_tab in ('archive', 'all') and request.GET.get('cursor'):
+            try:
+                decode_cursor(request.GET['cursor'], GuestRequest, REQUEST_PAGE_ORDERING)
+            except InvalidCursor as e:
+                return HttpResponseBadRequest(str(e))
 
-        context['grouped_requests'] = ordered_grouped_requests
-        context['has_any_requests'] = has_any_requests
+        # Built lazily so nothing is queried when the grouped-requests fragment is served from cache.
+        context['requests_page'] = SimpleLazyObject(
+            lambda: build_grouped_requests(user_hotel, logged_in_staff_member, sub_tab, request.GET.get('cursor'))
+        )
+        context['requests_scope'] = requests_scope_key(logged_in_staff_member)
 
     elif main_tab == 'guest_management':
         context['page_title'] = 'Guest Management'
         
         form = GuestRoomAssignmentForm(hotel=user_hotel) 
 
-        all_assignments = GuestRoomAssignment.objects.filter(hotel=user_hotel)
-
-        filter_params = {}
-
-        room_number_filter_val = request.GET.get('room_number')
-        if room_number_filter_val:
-            all_assignments = all_assignments.filter(room_number__icontains=room_number_filter_val)
-            filter_params['room_number'] = room_number_filter_val
-
-        guest_names = request.GET.get('guest_names')
-        if guest_names:
-            all_assignments = all_assignments.filter(guest_names__icontains=guest_names)
-            filter_params['guest_names'] = guest_names
-
-        status = request.GET.get('status')
-        if status:
-            all_assignments = all_assignments.filter(status=status)
-            filter_params['status'] = status
-
-        check_in_date_from = request.GET.get('check_in_date_from')
-        if check_in_date_from:
-            try:
-                from_date = timezone.datetime.strptime(check_in_date_from, '%Y-%m-%d').date()
-                all_assignments = all_assignments.filter(check_in_time__date__gte=from_date)
-                filter_params['check_in_date_from'] = check_in_date_from
-            except ValueError:
-                pass
-
-        check_in_date_to = request.GET.get('check_in_date_to')
-        if check_in_date_to:
-            try:
-                to_date = timezone.datetime.strptime(check_in_date_to, '%Y-%m-%d').date()
-                all_assignments = all_assignments.filter(check_in_time__date__lte=to_date)
-                filter_params['check_in_date_to'] = check_in_date_to
-            except ValueError:
-                pass
-
-        check_out_date_from = request.GET.get('check_out_date_from')
-        if check_out_date_from:
-            try:
-                from_date = timezone.datetime.strptime(check_out_date_from, '%Y-%m-%d').date()
-                all_assignments = all_assignments.filter(check_out_time__date__gte=from_date)
-                filter_params['check_out_date_from'] = check_out_date_from
-            except ValueError:
-                pass
-
-        check_out_date_to = request.GET.get('check_out_date_to')
-        if check_out_date_to:
-            try:
-                to_date = timezone.datetime.strptime(check_out_date_to, '%Y-%m-%d').date()
-                all_assignments = all_assignments.filter(check_out_time__date__lte=to_date)
-                filter_params['check_out_date_to'] = check_out_date_to
-            except ValueError:
-                pass
+        all_assignments, filter_params = filter_assignments(
+            GuestRoomAssignment.objects.filter(hotel=user_hotel), request.GET
+        )
 
-        all_assignments = all_assignments.order_by('-check_in_time')
+        try:
+            all_assignments, next_cursor = keyset_paginate(
+                all_assignments, ASSIGNMENT_PAGE_ORDERING, request.GET.get('cursor')
+            )
+        except InvalidCursor as e:
+            return HttpResponseBadRequest(str(e))
 
         context.update({
             'form': form,
             'all_assignments': all_assignments,
             'assignment_status_choices': GuestRoomAssignment.STATUS_CHOICES,
             'filter_params': filter_params,
+            'is_paginated_page': bool(request.GET.get('cursor')),
+            'first_page_query': page_querystring(filter_params, None),
+            'next_cursor': next_cursor,
+            'next_page_query': page_querystring(filter_params, next_cursor) if next_cursor else None,
         })
             
     elif main_tab == 'amenities':
         context['page_title'] = 'Amenity Management'
         context['form'] = AmenityForm() 
-        context['amenities'] = Amenity.objects.all().order_by('name') 
+        context['amenities'] = amenity_catalog().amenities
 
 
     return render(request, 'main/staff_dashboard.html', context)
 
 
+
+# --- Staff Dashboard JSON tab APIs ---
+# Compact tab data for client-side rendering, so navigating between sub-tabs, paging and
+# saving don't re-render the whole dashboard. Display strings are formatted here exactly
+# as the template formats them, so server- and client-rendered rows look the same.
+
+def _display_datetime(value):
+    return dateformat.format(timezone.localtime(value), "M d, Y H:i") if value else ''
+
+
+def serialize_request_item(item):
+    """Serializes one grouped-requests entry ({'request', 'assignment', 'assigned_staff_name'})."""
+    req = item['request']
+    return {
+        'id': req.id,
+        'room_number': req.room_number,
+        'guest_names': item['assignment'].guest_names if item['assignment'] else None,
+        'raw_text': Truncator(req.raw_text).chars(70),
+        'request_type': req.request_type,
+        'status': req.status,
+        'status_display': req.get_status_display(),
+        'assigned_staff_name': item['assigned_staff_name'],
+        'is_assigned': req.assigned_staff_id is not None,
+        'received_at': _display_datetime(req.timestamp),
+    }
+
+
+def serialize_assignment(assignment):
+    return {
+        'id': assignment.id,
+        'room_number': assignment.room_number,
+        'guest_names': assignment.guest_names,
+        'check_in': _display_datetime(assignment.check_in_time),
+        'check_out': _display_datetime(assignment.check_out_time),
+        'status': assignment.status,
+        'status_display': assignment.get_status_display(),
+        'total_bill_amount': f"{assignment.total_bill_amount:.2f}",
+        'amount_paid': f"{assignment.amount_paid:.2f}",
+    }
+
+
+def serialize_amenity(amenity):
+    return {
+        'id': amenity.id,
+        'name': amenity.name,
+        'description': amenity.description,
+        'price': f"{amenity.price:.2f}",
+        'is_available': amenity.is_available,
+    }
+
+
+def _serialize_single_request(guest_request, user_hotel):
+    assignment = first_assignments_by_room([guest_request.room_id]).get(guest_request.room_id)
+    return serialize_request_item({
+        'request': guest_request,
+        'assignment': assignment,
+        'assigned_staff_name': guest_request.assigned_staff.user.username if guest_request.assigned_staff else None,
+    })
+
+
+@login_required
+@require_GET
+def dashboard_kpis_api(request):
+    """
+    Returns the home tab KPIs and 7-day reservations chart as JSON.
+    Matches URL: /api/dashboard/kpis/
+    """
+    try:
+        user_hotel = request.user.profile.hotel
+        if not user_hotel:
+            return JsonResponse({'success': False, 'error': 'User profile not linked.'}, status=403)
+        return JsonResponse({'success': True, 'kpis': get_home_stats(user_hotel)})
+    except UserProfile.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'User profile not found.'}, status=403)
+
+
+@login_required
+@require_GET
+def dashboard_requests_api(request, sub_tab):
+    """
+    Returns one page of a requests sub-tab (active/archive/all), grouped by request type.
+    Matches URL: /api/dashboard/requests/<sub_tab>/?cursor=...
+    """
+    if sub_tab not in ('active', 'archive', 'all'):
+        return JsonResponse({'success': False, 'error': 'Unknown requests tab.'}, status=400)
+    try:
+        user_hotel = request.user.profile.hotel
+        if not user_hotel:
+            return JsonResponse({'success': False, 'error': 'User profile not linked.'}, status=403)
+        logged_in_staff_member = request.staff_member
+
+        page = build_grouped_requests(user_hotel, logged_in_staff_member, sub_tab, request.GET.get('cursor'))
+        return JsonResponse({
+            'success': True,
+            'sub_tab': sub_tab,
+            'groups': [
+                {
+                    'request_type': group['request_type'],
+                    'display_name': group['display_name'],
+                    'requests': [serialize_request_item(item) for item in group['requests']],
+                }
+                for group in page['groups']
+            ],
+            'is_paginated_page': page['is_paginated_page'],
+            'next_cursor': page['next_cursor'],
+        })
+    except InvalidCursor as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    except UserProfile.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'User profile not found.'}, status=403)
+
+
+@login_required
+@require_GET
+def dashboard_assignments_api(request):
+    """
+    Returns one page of guest assignments, using the same filter params as the guest management tab.
+    Matches URL: /api/dashboard/assignments/?room_number=...&cursor=...
+    """
+    try:
+        user_hotel = request.user.profile.hotel
+        if not user_hotel:
+            return JsonResponse({'success': False, 'error': 'User profile not linked.'}, status=403)
+
+        all_assignments, filter_params = filter_assignments(
+            GuestRoomAssignment.objects.filter(hotel=user_hotel), request.GET
+        )
+        page, next_cursor = keyset_paginate(all_assignments, ASSIGNMENT_PAGE_ORDERING, request.GET.get('cursor'))
+        return JsonResponse({
+            'success': True,
+            'assignments': [serialize_assignment(assignment) for assignment in page],
+            'filter_params': filter_params,
+            'is_paginated_page': bool(request.GET.get('cursor')),
+            'next_cursor': next_cursor,
+        })
+    except InvalidCursor as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    except UserProfile.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'User profile not found.'}, status=403)
+
+
+@login_required
+@require_GET
+def assignment_search_api(request):
+    """
+    Ranked prefix search over guest names and room numbers (e.g. for a search-as-you-type box).
+    Matches URL: /api/dashboard/assignments/search/?q=...
+    """
+    try:
+        user_hotel = request.user.profile.hotel
+        if not user_hotel:
+            return JsonResponse({'success': False, 'error': 'User profile not linked.'}, status=403)
+        assignments = search_assignments(user_hotel, request.GET.get('q', ''))
+        return JsonResponse({'success': True, 'assignments': [serialize_assignment(a) for a in assignments]})
+    except UserProfile.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'User profile not found.'}, status=403)
+
+
+def _parse_local_moment(value):
+    """Parses 'YYYY-MM-DD HH:MM' (or ISO 8601) as local time, or a bare date as the start of that local day."""
+    value = (value or '').strip()
+    try:
+        moment = parse_datetime(value)
+        if moment is None:
+            day = parse_date(value)
+            return local_day_start(day) if day else None
+    except ValueError:
+        return None
+    return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+
+@login_required
+@require_GET
+def room_availability_api(request):
+    """
+    Lists the rooms that can be booked for [check_in, check_out), optionally of one room type.
+    Used by the booking form to suggest room numbers.
+    Matches URL: /api/availability/?check_in=2025-06-01 14:00&check_out=2025-06-03 11:00&room_type=Suite
+    """
+    try:
+        user_hotel = request.user.profile.hotel
+        if not user_hotel:
+            return JsonResponse({'success': False, 'error': 'User profile not linked.'}, status=403)
+    except UserProfile.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'User profile not found.'}, status=403)
+
+    check_in = _parse_local_moment(request.GET.get('check_in'))
+    check_out = _parse_local_moment(request.GET.get('check_out'))
+    if not check_in or not check_out:
+        return JsonResponse({'success': False, 'error': 'check_in and check_out must be dates or date-times.'}, status=400)
+    if check_out <= check_in:
+        return JsonResponse({'success': False, 'error': 'Check-out time must be after check-in time.'}, status=400)
+
+    rooms = availability_index(user_hotel.pk).free_rooms(check_in, check_out, request.GET.get('room_type') or None)
+    return JsonResponse({
+        'success': True,
+        'check_in': check_in.isoformat(),
+        'check_out': check_out.isoformat(),
+        'rooms': [
+            {'id': room['id'], 'room_number': room['room_number'], 'room_type': room['room_type'], 'status': room['status']}
+            for room in sorted(rooms, key=lambda room: room['room_number'])
+        ],
+    })
+
+
+@login_required
+@require_GET
+def occupancy_matrix_api(request):
+    """
+    Day-by-day occupancy per room: occupied[i][j] is 1 if rooms[i] is occupied on the night of days[j].
+    Matches URL: /api/availability/occupancy/?start=2025-06-01&days=30
+    """
+    try:
+        user_hotel = request.user.profile.hotel
+        if not user_hotel:
+            return JsonResponse({'success': False, 'error': 'User profile not linked.'}, status=403)
+    except UserProfile.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'User profile not found.'}, status=403)
+
+    try:
+        first_day = parse_date(request.GET.get('start', '')) or timezone.localdate()
+        days = int(request.GET.get('days', 14))
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'start must be YYYY-MM-DD and days a number.'}, status=400)
+    if not 1 <= days <= MAX_OCCUPANCY_DAYS:
+        return JsonResponse({'success': False, 'error': f'days must be between 1 and {MAX_OCCUPANCY_DAYS}.'}, status=400)
+
+    index = availability_index(user_hotel.pk)
+    day_list, occupied = index.occupancy_matrix(first_day, days)
+    return JsonResponse({
+        'success': True,
+        'days': [day.isoformat() for day in day_list],
+        'rooms': [{'id': room['id'], 'room_number': room['room_number'], 'room_type': room['room_type']} for room in index.rooms],
+        'occupied': occupied.astype(int).tolist(),
+        'occupied_counts': occupied.sum(axis=0).tolist(),
+    })
+
+
+@login_required
+@require_GET
+def request_search_api(request):
+    """
+    Full-text search over request text, staff notes, Conci responses and chat transcripts.
+    Results are newest first with highlighted snippets, one keyset page at a time.
+    Matches URL: /api/requests/search/?q=...&status=...&request_type=...&date_from=...&date_to=...&cursor=...
+    """
+    query = request.GET.get('q', '').strip()
+    if not search_terms(query):
+        return JsonResponse({'success': False, 'error': 'Enter something to search for.'}, status=400)
+    try:
+        user_hotel = request.user.profile.hotel
+        if not user_hotel:
+            return JsonResponse({'success': False, 'error': 'User profile not linked.'}, status=403)
+        logged_in_staff_member = request.staff_member
+
+        matches, filter_params = filter_requests(visible_requests(user_hotel, logged_in_staff_member), request.GET)
+        archived_matches, _filter_params = filter_requests(
+            visible_requests(user_hotel, logged_in_staff_member, ArchivedGuestRequest), request.GET
+        )
+
+        page, next_cursor = keyset_paginate_tiers(
+            [matches, archived_matches], REQUEST_PAGE_ORDERING, request.GET.get('cursor'),
+        )
+        snippets = request_snippets([req.id for req in page], query)
+        return JsonResponse({
+            'success': True,
+            'results': [
+                {
+                    'id': req.id,
+                    'room_number': req.room_number,
+                    'request_type': req.request_type,
+                    'request_type_display': req.get_request_type_display(),
+                    'status': req.status,
+                    'status_display': req.get_status_display(),
+                    'received_at': _display_datetime(req.timestamp),
+                    'snippet': snippets.get(req.id, ''),
+                }
+                for req in page
+            ],
+            'filter_params': filter_params,
+            'next_cursor': next_cursor,
+            'next_page_query': page_querystring(filter_params, next_cursor) if next_cursor else None,
+        })
+    except InvalidCursor as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    except UserProfile.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'User profile not found.'}, status=403)
+
+
+@login_required
+@require_GET
+def dashboard_amenities_api(request):
+    """
+    Returns the amenity catalog as JSON.
+    Matches URL: /api/dashboard/amenities/
+    """
+    amenities = amenity_catalog().amenities
+    return JsonResponse({'success': True, 'amenities': [serialize_amenity(amenity) for amenity in amenities]})
+
+
+@login_required
+@require_POST
+def import_bookings_api(request):
+    """
+    Bulk-imports bookings from an uploaded CSV/JSON file ('file') or a JSON request body.
+    Valid rows are created; invalid or overlapping rows are reported per row.
+    Matches URL: /api/assignments/import/?dry_run=1
+    """
+    try:
+        user_hotel = request.user.profile.hotel
+        if not user_hotel:
+            return JsonResponse({'success': False, 'error': 'User profile not linked.'}, status=403)
+
+        upload = request.FILES.get('file')
+        if upload:
+            file_format = 'json' if upload.name.lower().endswith('.json') else 'csv'
+            records = read_booking_records(upload.read(), file_format)
+        else:
+            records = read_booking_records(request.body, 'json')
+
+        report = import_bookings(user_hotel, records, dry_run=request.GET.get('dry_run') == '1')
+        return JsonResponse({'success': True, **report})
+    except BookingFileError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    except BookingOverlapError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=409)
+    except UserProfile.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'User profile not found.'}, status=403)
+
+
+@login_required
+@require_POST
+def provision_staff_api(request):
+    """
+    Bulk-creates staff accounts at the user's hotel from an uploaded CSV/JSON file ('file') or a
+    JSON request body. Only hotel admins and general staff may provision.
+    Matches URL: /api/staff/provision/?dry_run=1
+    """
+    try:
+        user_hotel = request.hotel
+        if not user_hotel:
+            return JsonResponse({'success': False, 'error': 'User profile not linked.'}, status=403)
+        if request.staff_member and request.staff_member.category != 'general':
+            return JsonResponse({'success': False, 'error': 'Not allowed to add staff.'}, status=403)
+
+        upload = request.FILES.get('file')
+        if upload:
+            file_format = 'json' if upload.name.lower().endswith('.json') else 'csv'
+            records = read_staff_records(upload.read(), file_format)
+        else:
+            records = read_staff_records(request.body, 'json')
+
+        # Hash in this worker: a process pool per web request would fork the server process.
+        report = provision_staff(user_hotel, records, dry_run=request.GET.get('dry_run') == '1', workers=1)
+        return JsonResponse({'success': True, **report})
+    except StaffFileError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    except StaffConflictError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=409)
+
+
+@staff_member_required
+@require_GET
+def request_timing_report(request):
+    """
+    Admin-only report of this process's sampled request timings (RequestTimingMiddleware),
+    worst endpoints first. ?format=json returns the rows as JSON.
+    Matches URL: /dashboard/timing/
+    """
+    rows = endpoint_summary()
+    if request.GET.get('format') == 'json':
+        return JsonResponse({'success': True, 'endpoints': rows})
+    return render(request, 'main/request_timing.html', {
+        'page_title': 'Request Timing',
+        'enabled': getattr(settings, 'REQUEST_TIMING_ENABLED', False),
+        'sample_rate': REQUEST_TIMING_SAMPLE_RATE,
+        'sample_count': len(recorded_samples()),
+        'endpoints': rows,
+    })
+
+
+@login_required
+@require_GET
+def export_data_api(request, dataset):
+    """
+    Streams guest requests or guest assignments as CSV or JSON Lines for finance exports.
+    Takes the same filter params as the dashboard (see filter_requests / filter_assignments).
+    Matches URL: /api/export/<requests|assignments>/?format=csv|jsonl&...
+    """
+    export_format = request.GET.get('format', 'csv')
+    if dataset not in ('requests', 'assignments') or export_format not in EXPORT_FORMATS:
+        return JsonResponse({'success': False, 'error': 'Unknown export.'}, status=400)
+    try:
+        user_hotel = request.user.profile.hotel
+        if not user_hotel:
+            return JsonResponse({'success': False, 'error': 'User profile not linked.'}, status=403)
+
+        if dataset == 'requests':
+            logged_in_staff_member = request.staff_member
+            # Live and archived requests, merged by id.
+            querysets = [
+                filter_requests(visible_requests(user_hotel, logged_in_staff_member, model), request.GET)[0]
+                for model in (GuestRequest, ArchivedGuestRequest)
+            ]
+            columns = REQUEST_EXPORT_COLUMNS
+        else:
+            querysets, _filter_params = filter_assignments(
+                GuestRoomAssignment.objects.filter(hotel=user_hotel), request.GET
+            )
+            columns = ASSIGNMENT_EXPORT_COLUMNS
+
+        response = StreamingHttpResponse(export_lines(querysets, columns, export_format),
+                                         content_type=export_content_type(export_format))
+        filename = f"{dataset}-{timezone.localdate().isoformat()}.{export_format}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+    except UserProfile.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'User profile not found.'}, status=403)
+
+
 @login_required
 @require_POST
 def save_or_update_amenity_api(request):
@@ -632,8 +1147,8 @@ def save_or_update_amenity_api(request):
 
     if form.is_valid():
         try:
-            form.save()
-            return JsonResponse({'success': True, 'message': 'Amenity saved successfully.'})
+            amenity = form.save()
+            return JsonResponse({'success': True, 'message': 'Amenity saved successfully.', 'amenity': serialize_amenity(amenity)})
         except Exception as e:
             print(f"!!! CRITICAL SERVER ERROR during Amenity form.save(): {e}")
             import traceback
@@ -652,7 +1167,11 @@ def request_details_api(request, request_id):
     """
     try:
         user_hotel = request.user.profile.hotel
-        guest_request = get_object_or_404(GuestRequest, id=request_id, hotel=user_hotel)
+        guest_request = (
+            GuestRequest.objects.select_related('amenity_requested').filter(id=request_id, hotel=user_hotel).first()
+            or get_object_or_404(ArchivedGuestRequest.objects.select_related('amenity_requested'), id=request_id, hotel=user_hotel)
+        )
+        assignment = first_assignments_by_room([guest_request.room_id]).get(guest_request.room_id)
 
         amenity_details = None
         if guest_request.request_type == 'amenity_request' and guest_request.amenity_requested:
@@ -687,7 +1206,7 @@ def request_details_api(request, request_id):
         return JsonResponse({
             'success': True,
             'room_number': guest_request.room_number,
-            'guest_names': GuestRoomAssignment.objects.filter(hotel=user_hotel, room_number=guest_request.room_number).first().guest_names if GuestRoomAssignment.objects.filter(hotel=user_hotel, room_number=guest_request.room_number).exists() else 'N/A',
+            'guest_names': assignment.guest_names if assignment else 'N/A',
             'status': guest_request.get_status_display(), # Display value
             'request_type': guest_request.get_request_type_display(), # Display value
             'timestamp': guest_request.timestamp.isoformat(),
@@ -730,8 +1249,12 @@ def update_request_api(request, request_id):
             form = GuestRequestForm(request.POST, instance=guest_request, hotel=user_hotel)
 
             if form.is_valid():
-                form.save() # Saves the updated status, assigned_staff, staff_notes, request_type
-                return JsonResponse({'success': True, 'message': 'Request updated successfully!'})
+                guest_request = form.save() # Saves the updated status, assigned_staff, staff_notes, request_type
+                return JsonResponse({
+                    'success': True,
+                    'message': 'Request updated successfully!',
+                    'request': _serialize_single_request(guest_request, user_hotel),
+                })
             else:
                 print("Update Request Form is NOT VALID. Errors:", form.errors)
                 return JsonResponse({'success': False, 'error': 'Validation failed.', 'errors': form.errors.as_json()}, status=400)
@@ -752,7 +1275,9 @@ def check_new_requests(request):
     API endpoint to check for new guest requests since the last check.
     """
     try:
-        user_hotel = request.user.profile.hotel
+        if request.user_profile is None:
+            raise UserProfile.DoesNotExist
+        user_hotel = request.hotel
         last_check_str = request.GET.get('last_check')
         
         if last_check_str:
@@ -869,7 +1394,7 @@ def amenity_management(request):
         logout(request)
         return redirect('login')
 
-    amenities = Amenity.objects.all().order_by('name') # Get all amenities
+    amenities = amenity_catalog().amenities # Get all amenities
 
     if request.method == 'POST':
         amenity_id = request.POST.get('amenity_id')
@@ -979,39 +1504,29 @@ def update_request_status(request, request_id):
         try:
             # Ensure the user has a hotel profile and access to this request
             user_hotel = request.user.profile.hotel
-            req = get_object_or_404(GuestRequest, id=request_id, hotel=user_hotel)
+            req = get_object_or_404(GuestRequest.objects.select_related('amenity_requested'), id=request_id, hotel=user_hotel)
             new_status = request.POST.get('new_status')
             
             # Print for debugging: what status is being received?
             print(f"Attempting to update request {request_id} to status: {new_status}")
 
             if new_status in dict(req.STATUS_CHOICES):
-                # Special handling for 'amenity_request' when status changes to 'completed'
-                if req.request_type == 'amenity_request' and new_status == 'completed' and not req.bill_added:
-                    # Find the guest's current assignment for this room
-                    guest_assignment = GuestRoomAssignment.objects.filter(
-                        hotel=req.hotel,
-                        room_number=req.room_number,
-                        check_in_time__lte=timezone.localtime(timezone.now()),
-                        check_out_time__gte=timezone.localtime(timezone.now()),
-                        status='checked_in' # Only add to bill if guest is checked in
-                    ).first()
-
-                    if guest_assignment:
-                        if req.amenity_requested and req.amenity_quantity > 0:
-                            amenity_cost = req.amenity_requested.price * req.amenity_quantity
-                            guest_assignment.total_bill_amount += amenity_cost
-                            guest_assignment.save()
-                            req.bill_added = True # Mark as billed
-                            print(f"Added ${amenity_cost:.2f} for {req.amenity_quantity}x {req.amenity_requested.name} to Room {req.room_number}'s bill. New total: ${guest_assignment.total_bill_amount:.2f}")
-                        else:
+                with transaction.atomic():
+                    # Completing an amenity request bills it to the guest's current stay, once,
+                    # in the same transaction as the status change (main/billing.py).
+                    if req.request_type == 'amenity_request' and new_status == 'completed' and not req.bill_added:
+                        if not req.amenity_requested or req.amenity_quantity <= 0:
                             print(f"Warning: Amenity request {req.id} completed but amenity_requested or quantity missing. Bill not updated.")
-                    else:
-                        print(f"Warning: Amenity request {req.id} completed but no active guest assignment found for Room {req.room_number}. Bill not updated.")
+                        else:
+                            charge = bill_amenity_request(req)
+                            if charge:
+                                print(f"Added ${charge.amount:.2f} for {charge.description} to Room {req.room_number}'s bill.")
+                            elif not req.bill_added:
+                                print(f"Warning: Amenity request {req.id} completed but no active guest assignment found for Room {req.room_number}. Bill not updated.")
+
+                    req.status = new_status
+                    req.save()
 
-                req.status = new_status
-                req.save()
-                
                 # *** CRITICAL CHANGE: Return JSON response instead of redirect ***
                 return JsonResponse({'success': True, 'message': 'Status updated successfully!'})
             else:
@@ -1039,7 +1554,7 @@ def get_request_details(request, request_id):
     try:
         req = get_object_or_404(GuestRequest, id=request_id, hotel=request.user.profile.hotel)
         
-        assignment = GuestRoomAssignment.objects.filter(hotel=request.user.profile.hotel, room_number=req.room_number).first()
+        assignment = first_assignments_by_room([req.room_id]).get(req.room_id)
         guest_names = assignment.guest_names if assignment else "N/A"
 
         ai_entities_data = {}
@@ -1145,6 +1660,8 @@ def edit_guest_assignment(request, assignment_id):
             try:
                 form.save()
                 return JsonResponse({'success': True, 'message': 'Assignment updated successfully.'})
+            except BookingOverlapError:
+                return JsonResponse({'success': False, 'errors': form.errors.as_json()}, status=400)
             except Exception as e:
                 print(f"Server error saving guest assignment (edit): {e}")
                 import traceback
@@ -1191,11 +1708,11 @@ async def guest_interface(request, hotel_id, room_number):
     """
     # Use sync_to_async for get_object_or_404
     hotel = await sync_to_async(get_object_or_404)(Hotel, id=hotel_id)
+    room_rows = await sync_to_async(room_filter)(hotel, room_number)
     
     # Use sync_to_async for ORM query
     current_assignment = await sync_to_async(GuestRoomAssignment.objects.filter(
-        hotel=hotel,
-        room_number=room_number,
+        **room_rows,
         check_in_time__lte=timezone.localtime(timezone.now()),
         check_out_time__gte=timezone.localtime(timezone.now())
     ).first)()
@@ -1203,8 +1720,7 @@ async def guest_interface(request, hotel_id, room_number):
     # Get the latest request (any status) for chat history display
     # Use sync_to_async for ORM query
     latest_request_for_chat = await sync_to_async(GuestRequest.objects.filter(
-        hotel=hotel,
-        room_number=room_number
+        **room_rows
     ).order_by('-timestamp').first)()
 
     chat_history = []
@@ -1239,12 +1755,12 @@ async def check_for_new_updates(request, hotel_id, room_number):
     
     # Use sync_to_async for get_object_or_404
     hotel = await sync_to_async(get_object_or_404)(Hotel, id=hotel_id)
+    room_rows = await sync_to_async(room_filter)(hotel, room_number)
     
     # Get the latest request for this room, regardless of status
     # Use sync_to_async for ORM query
     latest_request = await sync_to_async(GuestRequest.objects.filter(
-        hotel=hotel,
-        room_number=room_number
+        **room_rows
     ).order_by('-timestamp').first)()
 
     new_messages = []
@@ -1300,14 +1816,9 @@ def employee_dashboard_view(request):
     """
     Renders the employee-specific dashboard, showing only assigned tasks.
     """
-    user_hotel = None
-    logged_in_staff_member = None
-
-    try:
-        user_profile = request.user.profile
-        user_hotel = user_profile.hotel
-        logged_in_staff_member = StaffMember.objects.get(user=request.user, hotel=user_hotel)
-    except (UserProfile.DoesNotExist, StaffMember.DoesNotExist, AttributeError):
+    # Set by HotelContextMiddleware only for a StaffMember at the user's profile hotel.
+    logged_in_staff_member = request.staff_member
+    if logged_in_staff_member is None:
         messages.error(request, 'Access denied. You must be a registered staff member to view this dashboard.')
         logout(request)
         return redirect('main:employee_login') # Redirect to employee login if not staff
@@ -1326,6 +1837,40 @@ def employee_dashboard_view(request):
     }
     return render(request, 'main/employee_dashboard.html', context)
 
+@login_required
+@require_POST
+def claim_next_task_api(request):
+    """
+    Work-queue endpoint for staff: atomically claims the caller's next task (their oldest
+    pending assigned request, else the oldest unassigned one for their category) and marks it
+    in progress. Safe for many staff pulling work at once (see main/routing.py).
+    Matches URL: /api/employee/tasks/claim/
+    """
+    logged_in_staff_member = request.staff_member
+    if logged_in_staff_member is None:
+        return JsonResponse({'success': False, 'error': 'Authentication error or staff profile not found.'}, status=403)
+    try:
+        guest_request = claim_next_request(logged_in_staff_member)
+        if guest_request is None:
+            return JsonResponse({'success': True, 'task': None, 'message': 'No tasks are waiting.'})
+        return JsonResponse({
+            'success': True,
+            'message': f'Claimed request #{guest_request.id} (Room {guest_request.room_number}).',
+            'task': {
+                'id': guest_request.id,
+                'room_number': guest_request.room_number,
+                'raw_text': guest_request.raw_text,
+                'request_type': guest_request.request_type,
+                'request_type_display': guest_request.get_request_type_display(),
+                'status': guest_request.status,
+                'received_at': timezone.localtime(guest_request.timestamp).isoformat(),
+            },
+        })
+    except Exception as e:
+        print(f"Error claiming next task: {e}")
+        return JsonResponse({'success': False, 'error': f'An error occurred: {str(e)}'}, status=500)
+
+
 @login_required
 @require_POST
 def complete_employee_request_api(request, request_id):
@@ -1334,7 +1879,9 @@ def complete_employee_request_api(request, request_id):
     """
     try:
         user_hotel = request.user.profile.hotel
-        logged_in_staff_member = StaffMember.objects.get(user=request.user, hotel=user_hotel)
+        logged_in_staff_member = request.staff_member
+        if logged_in_staff_member is None:
+            raise StaffMember.DoesNotExist
         
         guest_request = get_object_or_404(GuestRequest, id=request_id, hotel=user_hotel)
 